@@ -0,0 +1,66 @@
+import functools
+import inspect
+
+from fastapi import APIRouter, Depends
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import get_async_session
+
+
+# Les routes sont écrites une seule fois, en synchrone (def + Session).
+# En mode async, chaque route est enveloppée dans une coroutine qui reçoit une AsyncSession
+# et exécute le code d'origine avec AsyncSession.run_sync() : SQLAlchemy fournit à la
+# fonction une Session synchrone dont les entrées/sorties passent par le driver async.
+# La requête n'occupe donc plus de thread du threadpool pendant l'aller-retour en base.
+def run_on_async_session(endpoint):
+    signature = inspect.signature(endpoint)
+    parameters = [
+        param.replace(annotation=AsyncSession, default=Depends(get_async_session))
+        if param.name == "session"
+        else param
+        for param in signature.parameters.values()
+    ]
+
+    @functools.wraps(endpoint)
+    async def wrapper(**kwargs):
+        session: AsyncSession = kwargs.pop("session")
+        return await session.run_sync(lambda sync_session: endpoint(session=sync_session, **kwargs))
+
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper
+
+
+def copy_router(router: APIRouter, wrap_endpoint) -> APIRouter:
+    """Copy router, replacing every endpoint with wrap_endpoint(endpoint)."""
+    copy = APIRouter()
+    for route in router.routes:
+        if not isinstance(route, APIRoute):
+            copy.routes.append(route)
+            continue
+
+        copy.add_api_route(
+            route.path,
+            wrap_endpoint(route.endpoint),
+            response_model=route.response_model,
+            status_code=route.status_code,
+            tags=route.tags,
+            summary=route.summary,
+            description=route.description,
+            methods=route.methods,
+            name=route.name,
+            response_class=route.response_class,
+            openapi_extra=route.openapi_extra,
+        )
+    return copy
+
+
+def to_async_router(router: APIRouter) -> APIRouter:
+    """Copy router, running every endpoint that takes a session on the async engine."""
+
+    def wrap(endpoint):
+        if "session" in inspect.signature(endpoint).parameters:
+            return run_on_async_session(endpoint)
+        return endpoint
+
+    return copy_router(router, wrap)
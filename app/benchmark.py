@@ -0,0 +1,237 @@
+"""Benchmark raw SQL, Core column selects and full ORM loading on a seeded database.
+
+Usage :
+    python -m app.benchmark --database-url sqlite:///bench.db --scales 1000,100000 --output report.json
+
+Each scale recreates the schema, seeds `scale` books with app.seed (authors, publishers, tags),
+then measures every query strategy directly on a Session and every GET endpoint through
+the ASGI app. The JSON report can be kept and compared across commits.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def strategies(limit: int) -> dict[str, Callable]:
+    """Same result (a page of books with their author or tags) loaded in different ways."""
+    from sqlalchemy import select, text
+    from sqlalchemy.orm import joinedload, lazyload, selectinload
+
+    from app.models import Author, Book, BookTag
+    from app.orm_book_tag import books_with_tags_json
+    from app.pagination import KeysetParams
+
+    def raw_text(session):
+        return session.execute(
+            text(
+                "SELECT b.id, b.title, b.pages, a.name AS author_name "
+                "FROM books b JOIN authors a ON a.id = b.author_id ORDER BY b.id LIMIT :limit"
+            ),
+            {"limit": limit},
+        ).all()
+
+    def core_columns(session):
+        return session.execute(
+            select(Book.id, Book.title, Book.pages, Author.name.label("author_name"))
+            .join(Author)
+            .order_by(Book.id)
+            .limit(limit)
+        ).all()
+
+    def orm_author(option):
+        def run(session):
+            books = session.scalars(select(Book).options(option(Book.author)).order_by(Book.id).limit(limit)).all()
+            # On lit les attributs comme le ferait la sérialisation de la réponse
+            return [(book.id, book.title, book.author.name) for book in books]
+        return run
+
+    def tags_selectinload(session):
+        books = session.scalars(
+            select(Book).options(selectinload(Book.book_tags).joinedload(BookTag.tag)).order_by(Book.id).limit(limit)
+        ).all()
+        return [(book.id, [bt.tag.name for bt in book.book_tags]) for book in books]
+
+    def tags_joinedload(session):
+        # LIMIT s'applique aux lignes jointes : SQLAlchemy enveloppe la requête dans une sous-requête
+        books = session.scalars(
+            select(Book).options(joinedload(Book.book_tags).joinedload(BookTag.tag)).order_by(Book.id).limit(limit)
+        ).unique().all()
+        return [(book.id, [bt.tag.name for bt in book.book_tags]) for book in books]
+
+    def tags_json_agg(session):
+        content, _ = books_with_tags_json(session, KeysetParams(limit=limit, after=None, stream=False))
+        return content
+
+    return {
+        "authors.raw_text": raw_text,
+        "authors.core_columns": core_columns,
+        "authors.orm_joinedload": orm_author(joinedload),
+        "authors.orm_selectinload": orm_author(selectinload),
+        "authors.orm_lazyload": orm_author(lazyload),
+        "tags.orm_selectinload": tags_selectinload,
+        "tags.orm_joinedload": tags_joinedload,
+        "tags.sql_json_agg": tags_json_agg,
+    }
+
+
+def endpoints(limit: int) -> dict[str, str]:
+    page = f"limit={limit}"
+    return {
+        "GET /raw/books": f"/raw/books?{page}",
+        "GET /orm/books": f"/orm/books?{page}",
+        "GET /orm/books load=orm": f"/orm/books?{page}&load=orm",
+        "GET /orm/authors": f"/orm/authors?{page}",
+        "GET /orm/books-with-authors": f"/orm/books-with-authors?{page}",
+        "GET /orm/books-with-authors render=trusted": f"/orm/books-with-authors?{page}&render=trusted",
+        "GET /orm/books-with-author-object": f"/orm/books-with-author-object?{page}",
+        "GET /orm/books-with-publisher": f"/orm/books-with-publisher?{page}",
+        "GET /orm/books-with-tags": f"/orm/books-with-tags?{page}",
+        "GET /orm/books-with-tags render=adapter": f"/orm/books-with-tags?{page}&render=adapter",
+        "GET /orm/books-with-tags aggregate=sql": f"/orm/books-with-tags?{page}&aggregate=sql",
+        "GET /orm/books-by-tag/tag-1": f"/orm/books-by-tag/tag-1?{page}",
+    }
+
+
+def measure(run: Callable[[], object], iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        run()
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    # tracemalloc ralentit beaucoup l'exécution : pic mémoire mesuré sur un passage séparé
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "latency_ms": {
+            "p50": percentile(latencies, 0.50) * 1000,
+            "p95": percentile(latencies, 0.95) * 1000,
+            "p99": percentile(latencies, 0.99) * 1000,
+            "mean": statistics.fmean(latencies) * 1000,
+            "max": latencies[-1] * 1000,
+        },
+        "throughput_per_s": iterations / elapsed if elapsed else None,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def run_scale(scale: int, args) -> list[dict]:
+    from fastapi.testclient import TestClient
+
+    from app.db import SessionLocal, engine
+    from app.main import CACHED_ROUTES, app
+    from app.response_cache import RESPONSE_CACHE_ENABLED, response_cache
+    from app.seed import SeedConfig, seed_synthetic
+
+    print(f"seeding {scale} books...", file=sys.stderr)
+    t0 = time.perf_counter()
+    seed_synthetic(engine, SeedConfig.for_books(scale, tags_per_book=args.tags_per_book), reset=True)
+    print(f"  seeded in {time.perf_counter() - t0:.1f}s", file=sys.stderr)
+
+    results = []
+    for name, strategy in strategies(args.limit).items():
+        def run():
+            with SessionLocal() as session:
+                strategy(session)
+        results.append({"scale": scale, "kind": "strategy", "name": name, **measure(run, args.iterations, args.warmup)})
+        print(f"  {name}: p50 {results[-1]['latency_ms']['p50']:.2f} ms", file=sys.stderr)
+
+    # Sans "with", le démarrage (init_db) n'est pas lancé : la base vient d'être remplie
+    client = TestClient(app)
+    for name, url in endpoints(args.limit).items():
+        def run():
+            response = client.get(url)
+            response.raise_for_status()
+
+        # kind "endpoint" : la route fait tout le travail (SQL, objets, JSON) à chaque appel.
+        # Les routes gardées par app/response_cache.py sont aussi mesurées cache activé
+        # (kind "endpoint_cached") : après le warmup, chaque appel est un HIT.
+        cached_route = urlsplit(url).path in CACHED_ROUTES
+        for kind, enabled in (("endpoint", False), ("endpoint_cached", True)):
+            if enabled and not cached_route:
+                continue
+            response_cache.enabled = enabled
+            response_cache.backend.clear()
+            try:
+                stats = measure(run, args.iterations, args.warmup)
+            finally:
+                response_cache.enabled = RESPONSE_CACHE_ENABLED
+            results.append({"scale": scale, "kind": kind, "name": name, **stats})
+            label = f"{name} (cached)" if enabled else name
+            print(f"  {label}: p50 {stats['latency_ms']['p50']:.2f} ms", file=sys.stderr)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL", "sqlite:///bench.db"))
+    parser.add_argument("--scales", default="1000", help="Comma separated book counts, e.g. 1000,100000,1000000")
+    parser.add_argument("--tags-per-book", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=1000, help="Page size of every measured query")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--output", default="benchmark-report.json")
+    args = parser.parse_args(argv)
+
+    # Le moteur de app.db est créé à l'import : l'URL doit être fixée avant
+    os.environ["DATABASE_URL"] = args.database_url
+    from app.db import engine
+
+    results = []
+    for scale in (int(value) for value in args.scales.split(",")):
+        results.extend(run_scale(scale, args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "limit": args.limit,
+            "iterations": args.iterations,
+            "tags_per_book": args.tags_per_book,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
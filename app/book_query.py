@@ -0,0 +1,277 @@
+import base64
+import binascii
+import inspect
+import json
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from datetime import date
+from enum import Enum
+
+from fastapi import HTTPException, Query, Response
+from pydantic import BaseModel
+from sqlalchemy import and_, distinct, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.fast_json import OrjsonResponse
+from app.models import Author, Book, BookTag, Publisher, Tag
+from app.pagination import NEXT_CURSOR_HEADER, KeysetParams, ndjson_response
+
+NEXT_SORT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Colonnes que les clients peuvent demander (fields=) : le nom public est le nom du champ
+# dans app/schemas.py, la valeur la colonne SQL correspondante
+COLUMNS = {
+    "id": Book.id,
+    "title": Book.title,
+    "pages": Book.pages,
+    "author_id": Book.author_id,
+    "author_name": Author.name,
+    "publisher_id": Book.publisher_id,
+    "publisher_name": Publisher.name,
+}
+
+# Clés de tri possibles : colonnes jamais NULL, pour que la pagination keyset reste exacte
+SORT_KEYS = {"id", "title", "pages", "author_id", "author_name"}
+
+
+class TagMatch(str, Enum):
+    # Le livre a au moins un des tags demandés
+    any = "any"
+    # Le livre a tous les tags demandés
+    all = "all"
+
+
+@dataclass
+class BookQuery:
+    fields: list[str]
+    sort: list[tuple[str, bool]]
+    cursor: list | None
+    author_id: list[int]
+    publisher_id: list[int]
+    tags: list[str]
+    tag_match: TagMatch
+    min_pages: int | None
+    max_pages: int | None
+    tagged_after: date | None
+    tagged_before: date | None
+    # True quand le client n'a rien demandé de plus : la route garde son chemin habituel
+    is_default: bool
+
+
+def _split(value: str | None) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()] if value else []
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, sort: list[tuple[str, bool]]) -> list:
+    """Values of an X-Next-Cursor, checked against the sort keys it must continue (400 if invalid)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not sort:
+        # Sans tri le curseur n'est pas utilisé (pagination par after=id)
+        return values
+    keys = _with_id(sort)
+    if len(values) != len(keys):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort")
+    # Le curseur vient du client : une valeur du mauvais type (["x"] pour un id) ferait
+    # échouer la comparaison en SQL (500 sur PostgreSQL) ou comparerait n'importe quoi (SQLite)
+    for (key, _), value in zip(keys, values):
+        python_type = COLUMNS[key].type.python_type
+        if not isinstance(value, python_type) or isinstance(value, bool):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def book_query_params(schema: type[BaseModel], *, projection: bool = True) -> Callable[..., BookQuery]:
+    """Dependency parsing the filter / sort / fields query parameters of a book route.
+
+    fields and sort keys are limited to the fields of schema, the response model of the route.
+    projection=False: no fields parameter, for routes returning whole objects (nested tags...).
+    """
+    allowed = [name for name in schema.model_fields if name in COLUMNS]
+
+    def dependency(
+        fields: str | None = Query(None, description=f"Comma separated subset of: {','.join(allowed)}"),
+        sort: str | None = Query(None, description="Comma separated sort keys, '-' prefix for descending"),
+        cursor: str | None = Query(None, description="Opaque keyset cursor returned in X-Next-Cursor"),
+        author_id: list[int] = Query([], description="Keep books of these authors"),
+        publisher_id: list[int] = Query([], description="Keep books of these publishers"),
+        tag: list[str] = Query([], description="Tag names"),
+        tag_match: TagMatch = Query(TagMatch.any, description="Book has any / all of the tags"),
+        min_pages: int | None = Query(None, ge=0),
+        max_pages: int | None = Query(None, ge=0),
+        tagged_after: date | None = Query(None, description="Tagged on or after this date"),
+        tagged_before: date | None = Query(None, description="Tagged on or before this date"),
+    ) -> BookQuery:
+        selected = _split(fields) or allowed
+        unknown = [name for name in selected if name not in allowed]
+        if unknown:
+            raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+
+        sort_keys = [(key.removeprefix("-"), key.startswith("-")) for key in _split(sort)]
+        invalid = [key for key, _ in sort_keys if key not in SORT_KEYS or key not in allowed]
+        if invalid:
+            raise HTTPException(status_code=422, detail=f"Cannot sort by: {', '.join(invalid)}")
+
+        filters = (author_id, publisher_id, tag, min_pages, max_pages, tagged_after, tagged_before)
+        return BookQuery(
+            fields=selected,
+            sort=sort_keys,
+            cursor=decode_cursor(cursor, sort_keys) if cursor else None,
+            author_id=author_id,
+            publisher_id=publisher_id,
+            tags=tag,
+            tag_match=tag_match,
+            min_pages=min_pages,
+            max_pages=max_pages,
+            tagged_after=tagged_after,
+            tagged_before=tagged_before,
+            is_default=not fields and not sort and not cursor and not any(
+                value not in (None, []) for value in filters
+            ),
+        )
+
+    if projection:
+        return dependency
+
+    # Même dépendance sans le paramètre fields : FastAPI lit la signature pour documenter
+    # et valider les paramètres (comme run_on_async_session dans app/async_router.py)
+    def without_fields(**params) -> BookQuery:
+        return dependency(fields=None, **params)
+
+    signature = inspect.signature(dependency)
+    without_fields.__signature__ = signature.replace(
+        parameters=[param for name, param in signature.parameters.items() if name != "fields"]
+    )
+    return without_fields
+
+
+def _tag_condition(query: BookQuery):
+    # Sous-requête sur la table de jointure : pas de JOIN dans la requête principale,
+    # donc pas de livre dupliqué quand il a plusieurs tags
+    book_ids = select(BookTag.book_id)
+    if query.tagged_after is not None:
+        book_ids = book_ids.where(BookTag.tagged_at >= query.tagged_after)
+    if query.tagged_before is not None:
+        book_ids = book_ids.where(BookTag.tagged_at <= query.tagged_before)
+    if query.tags:
+        book_ids = book_ids.join(Tag, Tag.id == BookTag.tag_id).where(Tag.name.in_(query.tags))
+        if query.tag_match is TagMatch.all:
+            # Tous les tags : le livre doit apparaître avec autant de tags distincts que demandés
+            book_ids = book_ids.group_by(BookTag.book_id).having(
+                func.count(distinct(BookTag.tag_id)) == len(set(query.tags))
+            )
+    return Book.id.in_(book_ids)
+
+
+def _keyset_condition(keys: list[tuple[str, bool]], values: list):
+    # (k1, k2, id) > (v1, v2, last_id) écrit à la main, car chaque clé a son propre sens de tri :
+    # k1 > v1 OR (k1 = v1 AND k2 > v2) OR (k1 = v1 AND k2 = v2 AND id > last_id)
+    # (valeurs déjà vérifiées par decode_cursor : une par clé, du type de la colonne)
+    clauses = []
+    for i, (key, descending) in enumerate(keys):
+        column = COLUMNS[key]
+        equal = [COLUMNS[previous] == values[j] for j, (previous, _) in enumerate(keys[:i])]
+        clauses.append(and_(*equal, column < values[i] if descending else column > values[i]))
+    return or_(*clauses)
+
+
+def _with_id(sort: list[tuple[str, bool]]) -> list[tuple[str, bool]]:
+    # id termine toujours le tri : l'ordre est total, le curseur désigne une position unique
+    if any(key == "id" for key, _ in sort):
+        return sort
+    return [*sort, ("id", False)]
+
+
+def _full_sort(query: BookQuery) -> list[tuple[str, bool]]:
+    return _with_id(query.sort)
+
+
+def filter_books(stmt, query: BookQuery):
+    """Add the filters of query to a SELECT reading the books table."""
+    if query.author_id:
+        stmt = stmt.where(Book.author_id.in_(query.author_id))
+    if query.publisher_id:
+        stmt = stmt.where(Book.publisher_id.in_(query.publisher_id))
+    if query.min_pages is not None:
+        stmt = stmt.where(Book.pages >= query.min_pages)
+    if query.max_pages is not None:
+        stmt = stmt.where(Book.pages <= query.max_pages)
+    if query.tags or query.tagged_after is not None or query.tagged_before is not None:
+        stmt = stmt.where(_tag_condition(query))
+    return stmt
+
+
+def order_books(stmt, query: BookQuery, page: KeysetParams, *, limit: bool = True):
+    """Sort stmt by the sort keys of query and start after the cursor (or after=id without sort)."""
+    sort = _full_sort(query)
+    # Sans tri demandé on garde le curseur habituel (after=id) ; sinon curseur opaque
+    if query.sort:
+        if page.after is not None:
+            raise HTTPException(status_code=422, detail="Use cursor instead of after with sort")
+        if query.cursor is not None:
+            stmt = stmt.where(_keyset_condition(sort, query.cursor))
+    elif page.after is not None:
+        stmt = stmt.where(Book.id > page.after)
+
+    stmt = stmt.order_by(*(COLUMNS[key].desc() if descending else COLUMNS[key] for key, descending in sort))
+    if limit:
+        stmt = stmt.limit(page.limit)
+    return stmt
+
+
+def book_select(query: BookQuery, page: KeysetParams, *, limit: bool = True):
+    """Compile query into one SELECT of only the requested columns (plus the sort keys)."""
+    names = list(dict.fromkeys([*query.fields, *(key for key, _ in _full_sort(query))]))
+
+    stmt = select(*(COLUMNS[name].label(name) for name in names)).select_from(Book)
+    # Jointure seulement si une colonne de la table est réellement lue
+    if "author_name" in names:
+        stmt = stmt.join(Author, Author.id == Book.author_id)
+    if "publisher_name" in names:
+        stmt = stmt.join(Publisher, Publisher.id == Book.publisher_id, isouter=True)
+    return order_books(filter_books(stmt, query), query, page, limit=limit)
+
+
+def set_query_cursor(response: Response, rows: list, query: BookQuery, page: KeysetParams) -> None:
+    """Next page header of a full page: X-Next-Cursor with a sort, else X-Next-After."""
+    if len(rows) != page.limit:
+        return
+    last = rows[-1]
+    if query.sort:
+        response.headers[NEXT_SORT_CURSOR_HEADER] = encode_cursor([getattr(last, key) for key, _ in _full_sort(query)])
+    else:
+        response.headers[NEXT_CURSOR_HEADER] = str(last.id)
+
+
+def book_query_response(session: Session, query: BookQuery, page: KeysetParams) -> Response:
+    """Run book_select and return the rows as JSON objects holding only the requested fields."""
+
+    def to_item(row) -> dict:
+        return {name: getattr(row, name) for name in query.fields}
+
+    if page.stream:
+        return ndjson_response(book_select(query, page, limit=False), to_item)
+
+    rows = session.execute(book_select(query, page)).all()
+    response = OrjsonResponse([to_item(row) for row in rows])
+    set_query_cursor(response, rows, query, page)
+    return response
+
+
+# Pour app/response_cache.py : un filtre sur les tags lit aussi book_tags et tags
+def tables_read(base: Iterable[str]) -> Callable[[list[tuple[str, str]]], set[str]]:
+    def tables(params: list[tuple[str, str]]) -> set[str]:
+        names = {name for name, _ in params}
+        if names & {"tag", "tagged_after", "tagged_before"}:
+            return {*base, "book_tags", "tags"}
+        return set(base)
+
+    return tables
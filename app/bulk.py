@@ -0,0 +1,88 @@
+import json
+import os
+from collections.abc import Iterator
+from typing import Any
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel, ValidationError
+
+from app.schemas import BookTagRowResult, BulkRowResult
+
+BULK_MAX_ROWS = int(os.getenv("BULK_MAX_ROWS", "100000"))
+
+# Taille des lots : nombre de lignes par INSERT multi-valeurs et d'ids par clause IN (...)
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+
+
+async def bulk_rows(request: Request) -> list[Any]:
+    """Read a JSON array or an NDJSON body (one JSON object per line)."""
+    invalid_body = HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    try:
+        # JSON est toujours en UTF-8 ; utf-8-sig accepte aussi un BOM en tête, comme json.loads(bytes)
+        body = (await request.body()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise invalid_body
+    content_type = request.headers.get("content-type", "")
+
+    if "ndjson" in content_type:
+        rows: list[Any] = []
+        # split("\n") et non splitlines() : une chaîne JSON peut contenir U+2028, qui n'est pas une fin de ligne
+        for line in body.split("\n"):
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError as exc:
+                # Une ligne illisible devient une erreur de ligne, pas un échec de tout l'import
+                rows.append(exc)
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise invalid_body
+        if not isinstance(rows, list):
+            raise invalid_body
+
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MAX_ROWS} rows per request")
+    return rows
+
+
+def validate_rows(
+    rows: list[Any], schema: type[BaseModel], results: list[BulkRowResult] | list[BookTagRowResult]
+) -> list[tuple[int, BaseModel]]:
+    """Validate every row with schema; invalid rows are reported in results."""
+    valid = []
+    for index, row in enumerate(rows):
+        if isinstance(row, Exception):
+            results[index].error = f"Invalid JSON: {row}"
+            continue
+        try:
+            valid.append((index, schema.model_validate(row)))
+        except ValidationError as exc:
+            results[index].error = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in exc.errors()
+            )
+    return valid
+
+
+def chunked(items: list, size: int = BULK_CHUNK_SIZE) -> Iterator[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bulk_request_body(schema: type[BaseModel]) -> dict:
+    # Le corps est lu à la main (JSON ou NDJSON) : on le décrit pour Swagger UI.
+    # Schéma recopié plutôt que référencé : un modèle utilisé seulement ici n'est pas
+    # ajouté aux components de l'OpenAPI par FastAPI.
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": schema.model_json_schema()},
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    }
@@ -1,135 +1,159 @@
 import os
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
+from app.pool_metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool, instrument_pool
+from app.replicas import ReplicaSet, reads_from_replica
+
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql+psycopg://postgres:postgres@db:5432/orm_demo",
 )
 
-engine = create_engine(DATABASE_URL)
+# "sync" : routes def + Session (threadpool de Starlette)
+# "async" : routes async def + AsyncSession (boucle d'événements, pas de thread par requête)
+DB_MODE = os.getenv("DB_MODE", "sync")
+
+# psycopg 3 fournit aussi un driver async : la même URL postgresql+psycopg:// fonctionne
+# avec create_async_engine. Pour SQLite, il faut un driver async (sqlite+aiosqlite://).
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL)
+
+# Répliques en lecture (séparées par des virgules), vide = tout passe par DATABASE_URL.
+# Les requêtes GET lisent sur une réplique, les écritures restent sur le primaire (app/replicas.py).
+DATABASE_REPLICA_URLS = [url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+ASYNC_DATABASE_REPLICA_URLS = [
+    url for url in os.getenv("ASYNC_DATABASE_REPLICA_URLS", ",".join(DATABASE_REPLICA_URLS)).split(",") if url.strip()
+]
+
+# "init" : chaque worker applique les migrations et insère les données de démo au démarrage
+# "warm" : aucun travail de schéma (fait une fois par python -m app.migrate --seed-demo),
+#          le worker ouvre ses connexions et prépare les requêtes fréquentes
+STARTUP_MODE = os.getenv("STARTUP_MODE", "init")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+# Réglages du pool de connexions (QueuePool). Valeurs par défaut = celles de SQLAlchemy.
+#   pool_size      : connexions gardées ouvertes en permanence
+#   max_overflow   : connexions supplémentaires autorisées pendant un pic
+#   pool_timeout   : secondes d'attente d'une connexion libre avant TimeoutError
+#   pool_recycle   : âge max (secondes) d'une connexion avant reconnexion, -1 = jamais
+#   pool_pre_ping  : teste la connexion (SELECT 1) avant de la donner à la session
+#   pool_use_lifo  : réutilise la dernière connexion rendue, les autres peuvent expirer
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "-1")),
+    "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", False),
+    "pool_use_lifo": _env_bool("DB_POOL_USE_LIFO", False),
+}
+
+# Cache de compilation de SQLAlchemy : nombre de requêtes compilées gardées par moteur
+QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "500"))
+
+# psycopg prépare une requête côté serveur (PREPARE, plan réutilisé) quand la même requête
+# a été exécutée prepare_threshold fois sur la même connexion. 0 = dès la 1re exécution,
+# "none" = jamais (nécessaire derrière PgBouncer en mode transaction).
+PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD", "5")
+
+
+def _connect_args(url: str) -> dict:
+    if make_url(url).get_driver_name() != "psycopg":
+        return {}
+    threshold = None if PREPARE_THRESHOLD.lower() == "none" else int(PREPARE_THRESHOLD)
+    return {"prepare_threshold": threshold}
+
+
+def _create_engine(url: str, pool_name: str):
+    engine = create_engine(
+        url,
+        poolclass=TimedQueuePool,
+        query_cache_size=QUERY_CACHE_SIZE,
+        connect_args=_connect_args(url),
+        **POOL_OPTIONS,
+    )
+    instrument_pool(engine.pool, pool_name)
+    return engine
+
+
+engine = _create_engine(DATABASE_URL, "sync")
+replicas = ReplicaSet([_create_engine(url, f"sync-replica-{i}") for i, url in enumerate(DATABASE_REPLICA_URLS)])
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Le moteur async n'est créé que s'il est utilisé (le driver async peut ne pas être installé)
+def _create_async_engine(url: str, pool_name: str):
+    engine = create_async_engine(
+        url,
+        poolclass=TimedAsyncAdaptedQueuePool,
+        query_cache_size=QUERY_CACHE_SIZE,
+        connect_args=_connect_args(url),
+        **POOL_OPTIONS,
+    )
+    instrument_pool(engine.sync_engine.pool, pool_name)
+    return engine
+
+
+async_engine = None
+async_replicas = ReplicaSet([])
+if DB_MODE == "async":
+    async_engine = _create_async_engine(ASYNC_DATABASE_URL, "async")
+    async_replicas = ReplicaSet(
+        [_create_async_engine(url, f"async-replica-{i}") for i, url in enumerate(ASYNC_DATABASE_REPLICA_URLS)]
+    )
+
+# expire_on_commit=False : après un commit, les attributs restent lisibles sans nouvelle
+# requête. En async, un chargement implicite (lazy) hors de la session lève une erreur.
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+def has_replicas() -> bool:
+    return bool(replicas or async_replicas)
+
+
+def uses_replica() -> bool:
+    """True when the sessions of the current request read from a replica."""
+    return has_replicas() and reads_from_replica()
+
+
+def read_session():
+    """New Session on a replica for a GET request (see ReplicaRoutingMiddleware), else on the primary."""
+    if replicas and reads_from_replica():
+        return SessionLocal(bind=replicas.pick())
+    return SessionLocal()
+
 
 def get_session():
-    session = SessionLocal()
+    session = read_session()
     try:
         yield session
     finally:
         session.close()
 
 
+async def get_async_session():
+    bind = async_replicas.pick() if async_replicas and reads_from_replica() else async_engine
+    async with AsyncSessionLocal(bind=bind) as session:
+        yield session
+
+
 def init_db() -> None:
-    from datetime import date
-
-    from app.models import Base, Author, Book, Tag, BookTag, Publisher
-    from sqlalchemy import func, select
-
-    Base.metadata.create_all(bind=engine) # Create tables if they don't exist
-
-    with SessionLocal() as session:
-        author_count = session.scalar(select(func.count(Author.id)))
-        if author_count:
-            return
-
-        publishers = [
-            Publisher(name="Gallimard"),          # 0
-            Publisher(name="Addison-Wesley"),      # 1
-            Publisher(name="Allen & Unwin"),       # 2
-            Publisher(name="Cambridge UP"),        # 3
-        ]
-        session.add_all(publishers)
-        session.flush()
-
-        authors = [
-            # Informatique
-            Author(name="Ada Lovelace"),        # 0
-            Author(name="Grace Hopper"),         # 1
-            Author(name="Alan Turing"),          # 2
-            Author(name="Donald Knuth"),         # 3
-            Author(name="Linus Torvalds"),       # 4
-            # Littérature classique
-            Author(name="Marcel Proust"),        # 5
-            Author(name="J.R.R. Tolkien"),       # 6
-            Author(name="Victor Hugo"),          # 7
-            Author(name="Albert Camus"),         # 8
-        ]
-        session.add_all(authors)
-        session.flush()
-
-        books = [
-            # Informatique
-            Book(title="Notes on the Analytical Engine", pages=120, author_id=authors[0].id, publisher_id=publishers[3].id),
-            Book(title="Compilers and Cobol", pages=220, author_id=authors[1].id, publisher_id=publishers[1].id),
-            Book(title="Computing Machinery and Intelligence", pages=90, author_id=authors[2].id, publisher_id=publishers[3].id),
-            Book(title="The Art of Computer Programming Vol. 1", pages=672, author_id=authors[3].id, publisher_id=publishers[1].id),
-            Book(title="The Art of Computer Programming Vol. 2", pages=784, author_id=authors[3].id, publisher_id=publishers[1].id),
-            Book(title="Just for Fun", pages=280, author_id=authors[4].id),
-            # Proust — À la recherche du temps perdu
-            Book(title="Du côté de chez Swann", pages=531, author_id=authors[5].id, publisher_id=publishers[0].id),
-            Book(title="À l'ombre des jeunes filles en fleurs", pages=619, author_id=authors[5].id, publisher_id=publishers[0].id),
-            Book(title="Le Temps retrouvé", pages=524, author_id=authors[5].id, publisher_id=publishers[0].id),
-            # Tolkien
-            Book(title="The Fellowship of the Ring", pages=423, author_id=authors[6].id, publisher_id=publishers[2].id),
-            Book(title="The Two Towers", pages=352, author_id=authors[6].id, publisher_id=publishers[2].id),
-            Book(title="The Return of the King", pages=416, author_id=authors[6].id, publisher_id=publishers[2].id),
-            # Autres classiques
-            Book(title="Les Misérables", pages=1900, author_id=authors[7].id, publisher_id=publishers[0].id),
-            Book(title="L'Étranger", pages=186, author_id=authors[8].id, publisher_id=publishers[0].id),
-        ]
-        session.add_all(books)
-        session.flush()
-
-        tags = [
-            Tag(name="algorithms"),         # 0
-            Tag(name="history"),            # 1
-            Tag(name="ai"),                 # 2
-            Tag(name="compilers"),          # 3
-            Tag(name="operating-systems"),  # 4
-            Tag(name="mathematics"),        # 5
-            Tag(name="classic"),            # 6
-            Tag(name="fantasy"),            # 7
-            Tag(name="fiction"),            # 8
-            Tag(name="french-literature"),  # 9
-        ]
-        session.add_all(tags)
-        session.flush()
-
-        book_tags = [
-            # Informatique
-            BookTag(book_id=books[0].id, tag_id=tags[1].id, tagged_at=date(2024, 1, 10)),
-            BookTag(book_id=books[0].id, tag_id=tags[5].id, tagged_at=date(2024, 1, 10)),
-            BookTag(book_id=books[1].id, tag_id=tags[3].id, tagged_at=date(2024, 2, 15)),
-            BookTag(book_id=books[2].id, tag_id=tags[2].id, tagged_at=date(2024, 3, 5)),
-            BookTag(book_id=books[2].id, tag_id=tags[1].id, tagged_at=date(2024, 3, 5)),
-            BookTag(book_id=books[3].id, tag_id=tags[0].id, tagged_at=date(2024, 4, 20)),
-            BookTag(book_id=books[3].id, tag_id=tags[5].id, tagged_at=date(2024, 4, 20)),
-            BookTag(book_id=books[4].id, tag_id=tags[0].id, tagged_at=date(2024, 4, 21)),
-            BookTag(book_id=books[5].id, tag_id=tags[4].id, tagged_at=date(2024, 5, 1)),
-            BookTag(book_id=books[5].id, tag_id=tags[1].id, tagged_at=date(2024, 5, 1)),
-            # Proust
-            BookTag(book_id=books[6].id, tag_id=tags[6].id, tagged_at=date(2024, 6, 1)),
-            BookTag(book_id=books[6].id, tag_id=tags[9].id, tagged_at=date(2024, 6, 1)),
-            BookTag(book_id=books[6].id, tag_id=tags[8].id, tagged_at=date(2024, 6, 1)),
-            BookTag(book_id=books[7].id, tag_id=tags[6].id, tagged_at=date(2024, 6, 2)),
-            BookTag(book_id=books[7].id, tag_id=tags[9].id, tagged_at=date(2024, 6, 2)),
-            BookTag(book_id=books[8].id, tag_id=tags[6].id, tagged_at=date(2024, 6, 3)),
-            BookTag(book_id=books[8].id, tag_id=tags[9].id, tagged_at=date(2024, 6, 3)),
-            # Tolkien
-            BookTag(book_id=books[9].id,  tag_id=tags[7].id, tagged_at=date(2024, 7, 10)),
-            BookTag(book_id=books[9].id,  tag_id=tags[8].id, tagged_at=date(2024, 7, 10)),
-            BookTag(book_id=books[10].id, tag_id=tags[7].id, tagged_at=date(2024, 7, 11)),
-            BookTag(book_id=books[10].id, tag_id=tags[8].id, tagged_at=date(2024, 7, 11)),
-            BookTag(book_id=books[11].id, tag_id=tags[7].id, tagged_at=date(2024, 7, 12)),
-            BookTag(book_id=books[11].id, tag_id=tags[8].id, tagged_at=date(2024, 7, 12)),
-            # Autres classiques
-            BookTag(book_id=books[12].id, tag_id=tags[6].id, tagged_at=date(2024, 8, 1)),
-            BookTag(book_id=books[12].id, tag_id=tags[9].id, tagged_at=date(2024, 8, 1)),
-            BookTag(book_id=books[13].id, tag_id=tags[6].id, tagged_at=date(2024, 8, 5)),
-            BookTag(book_id=books[13].id, tag_id=tags[9].id, tagged_at=date(2024, 8, 5)),
-            BookTag(book_id=books[13].id, tag_id=tags[8].id, tagged_at=date(2024, 8, 5)),
-        ]
-        session.add_all(book_tags)
-        session.commit()
+    from app.migrate import migrate, migration_lock
+    from app.seed import seed_demo_if_empty
+
+    # Un seul processus à la fois (verrou consultatif PostgreSQL) : les autres attendent
+    # puis constatent que le schéma et les données sont déjà là
+    with migration_lock(engine):
+        # Crée les tables si la base est vide, sinon applique les migrations en attente
+        # (create_all seul ne modifie jamais une table existante, voir app/migrate.py)
+        migrate(engine)
+
+        # Petit jeu de données de démonstration (voir app/seed.py).
+        # Pour un gros volume : python -m app.seed --authors 10000 ...
+        with SessionLocal() as session:
+            seed_demo_if_empty(session)
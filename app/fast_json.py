@@ -0,0 +1,67 @@
+import functools
+from enum import Enum
+from typing import Any
+
+import orjson
+from fastapi import Query, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+from app.tracing import span
+
+
+class RenderMode(str, Enum):
+    # Par défaut : un modèle Pydantic par ligne, puis FastAPI revalide la liste avec response_model
+    pydantic = "pydantic"
+    # TypeAdapter(list[Schema]) : validation de toute la liste en un seul appel (pydantic-core)
+    # et JSON produit directement en Rust, sans second passage response_model
+    adapter = "adapter"
+    # Lignes ORM de confiance (types garantis par la base) : aucune validation, orjson
+    trusted = "trusted"
+
+
+def render_mode(
+    render: RenderMode = Query(RenderMode.pydantic, description="Response serialization path"),
+) -> RenderMode:
+    return render
+
+
+class OrjsonResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        # orjson sait encoder date/datetime nativement, au même format ISO que Pydantic
+        with span("response.encode", encoder="orjson"):
+            return orjson.dumps(content)
+
+
+@functools.cache
+def list_adapter(schema: type[BaseModel]) -> TypeAdapter:
+    # Construire un TypeAdapter a un coût : un seul par schéma pour toute la durée du processus
+    return TypeAdapter(list[schema])
+
+
+@functools.cache
+def _nested_schemas(schema: type[BaseModel]) -> dict[str, type[BaseModel] | None]:
+    return {
+        name: field.annotation if isinstance(field.annotation, type) and issubclass(field.annotation, BaseModel) else None
+        for name, field in schema.model_fields.items()
+    }
+
+
+def plain_dict(schema: type[BaseModel], obj: Any) -> dict:
+    """Read the fields of schema from obj (ORM object or row) without building a model."""
+    # Les noms et l'ordre des champs viennent du schéma : app/schemas.py reste la référence
+    return {
+        name: plain_dict(nested, getattr(obj, name)) if nested else getattr(obj, name)
+        for name, nested in _nested_schemas(schema).items()
+    }
+
+
+def fast_response(rows: list[dict], schema: type[BaseModel], mode: RenderMode) -> Response:
+    if mode is RenderMode.adapter:
+        adapter = list_adapter(schema)
+        with span("response.validate", schema=schema.__name__):
+            items = adapter.validate_python(rows)
+        with span("response.encode", encoder="pydantic"):
+            content = adapter.dump_json(items)
+        return Response(content, media_type="application/json")
+    return OrjsonResponse(rows)
@@ -0,0 +1,356 @@
+"""Load test the whole application with a mix of concurrent reads and writes.
+
+Usage :
+    python -m app.loadtest --clients 1,8,32,64 --duration 10 \\
+        --mix books-with-tags=80,books-by-tag=15,create-book=2.5,update-author=2.5
+
+Without --url, the ASGI app of app.main runs in this process (database from DATABASE_URL);
+with --url http://localhost:8000, requests go to a running server (uvicorn, gunicorn...).
+Each step runs `clients` concurrent clients for `duration` seconds, each one sending its next
+request as soon as the previous one answered. The report gives, per step, throughput,
+p50/p95/p99 latencies, errors, optimistic locking conflicts (412) and the connection pools
+read from /metrics.
+Write scenarios modify the database: run against a test or seeded database.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+from app.benchmark import git_commit, percentile
+
+DEFAULT_MIX = "books-with-tags=80,books-by-tag=15,create-book=2.5,update-author=2.5"
+
+
+@dataclass
+class Targets:
+    """Ids and names read from the API before the test, used to build realistic requests."""
+
+    author_ids: list[int]
+    author_names: dict[int, str]
+    book_ids: list[int]
+    tag_names: list[str]
+    # Quelques auteurs modifiés en boucle : les PATCH se disputent les mêmes lignes
+    hot_author_ids: list[int] = field(default_factory=list)
+
+
+async def discover(client, hot_authors: int) -> Targets:
+    authors = (await client.get("/orm/authors", params={"limit": 1000})).raise_for_status().json()
+    books = (await client.get("/orm/books", params={"limit": 1000, "fields": "id"})).raise_for_status().json()
+    tags = (await client.get("/stats/tags", params={"limit": 1000})).raise_for_status().json()["items"]
+    if not authors or not books:
+        raise SystemExit("The database is empty: seed it first (python -m app.seed)")
+    author_ids = [author["id"] for author in authors]
+    return Targets(
+        author_ids=author_ids,
+        author_names={author["id"]: author["name"] for author in authors},
+        book_ids=[book["id"] for book in books],
+        tag_names=[tag["tag_name"] for tag in tags] or ["history"],
+        hot_author_ids=author_ids[:hot_authors],
+    )
+
+
+Scenario = Callable[..., Awaitable]
+
+# Compteur global : chaque PATCH donne un nom encore jamais utilisé (name est unique)
+_rename_counter = itertools.count()
+
+
+def _page_after(rng: random.Random, targets: Targets) -> dict:
+    # Page au hasard : sinon le cache de réponses servirait toujours la même
+    return {"limit": 50, "after": rng.choice(targets.book_ids) - 1}
+
+
+def scenarios() -> dict[str, Scenario]:
+    """Name → async function(client, rng, targets) sending one request."""
+
+    async def books(client, rng, targets):
+        return await client.get("/orm/books", params=_page_after(rng, targets))
+
+    async def books_with_authors(client, rng, targets):
+        return await client.get("/orm/books-with-authors", params=_page_after(rng, targets))
+
+    async def books_with_tags(client, rng, targets):
+        return await client.get("/orm/books-with-tags", params=_page_after(rng, targets))
+
+    async def books_by_tag(client, rng, targets):
+        return await client.get(f"/orm/books-by-tag/{rng.choice(targets.tag_names)}", params={"limit": 50})
+
+    async def search(client, rng, targets):
+        name = targets.author_names[rng.choice(targets.author_ids)]
+        return await client.get("/search", params={"q": name[:4]})
+
+    async def create_book(client, rng, targets):
+        payload = {
+            "title": f"Load test book {rng.randrange(10**9)}",
+            "pages": rng.randint(50, 900),
+            "author_id": rng.choice(targets.author_ids),
+        }
+        return await client.post("/orm/books", json=payload)
+
+    async def update_author(client, rng, targets):
+        # Lecture puis modification de la version lue, comme un vrai client : si un autre
+        # client modifie l'auteur entre les deux, le PATCH répond 412 (compté dans conflicts)
+        author_id = rng.choice(targets.hot_author_ids or targets.author_ids)
+        read = await client.get(f"/orm/authors/{author_id}")
+        if read.status_code != 200:
+            return read
+        base = read.json()["name"].rsplit(" #", 1)[0][:80]
+        return await client.patch(
+            f"/orm/authors/{author_id}",
+            json={"name": f"{base} #{next(_rename_counter)}"},
+            headers={"If-Match": read.headers["ETag"]},
+        )
+
+    return {
+        "books": books,
+        "books-with-authors": books_with_authors,
+        "books-with-tags": books_with_tags,
+        "books-by-tag": books_by_tag,
+        "search": search,
+        "create-book": create_book,
+        "update-author": update_author,
+    }
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """"books-with-tags=80,books-by-tag=15,update-author=5" → weights by scenario name."""
+    known = scenarios()
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in known:
+            raise argparse.ArgumentTypeError(f"Unknown scenario {name!r}, expected one of: {', '.join(known)}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Invalid weight for {name}: {weight!r}")
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("The scenario weights must not all be zero")
+    return mix
+
+
+@dataclass
+class StepStats:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: Counter = field(default_factory=Counter)
+    # 412 Precondition Failed : verrouillage optimiste, résultat attendu sous contention
+    conflicts: Counter = field(default_factory=Counter)
+    # Requêtes sans réponse (délai dépassé, connexion refusée...) : pas de latence mesurée
+    failures: int = 0
+
+
+async def client_loop(new_client, mix: dict[str, float], targets: Targets, stats: StepStats, deadline: float, seed: int):
+    rng = random.Random(seed)
+    known = scenarios()
+    names, weights = list(mix), list(mix.values())
+    # Un client HTTP par utilisateur simulé : ses propres connexions et cookies
+    # (le cookie posé après une écriture renvoie ses lectures vers le primaire, voir app/replicas.py)
+    async with new_client() as client:
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                response = await known[name](client, rng, targets)
+            except Exception as exc:
+                stats.failures += 1
+                stats.errors[f"{name}: {type(exc).__name__}"] += 1
+                continue
+            stats.latencies[name].append(time.perf_counter() - start)
+            if response.status_code == 412:
+                stats.conflicts[name] += 1
+            elif response.status_code >= 400:
+                stats.errors[f"{name}: HTTP {response.status_code}"] += 1
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50": percentile(latencies, 0.50) * 1000,
+        "p95": percentile(latencies, 0.95) * 1000,
+        "p99": percentile(latencies, 0.99) * 1000,
+        "max": (latencies[-1] if latencies else 0.0) * 1000,
+    }
+
+
+def histogram_percentile(bounds: list[float], counts: list[int], p: float) -> float | None:
+    """Upper bound (ms) of the bucket holding the p-th value; None beyond the last bound."""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    seen = 0
+    for bound, count in zip([*bounds, None], counts):
+        seen += count
+        if seen >= p * total:
+            return bound
+    return None
+
+
+def wait_deltas(before: dict, after: dict) -> dict:
+    # Fenêtre des percentiles de /metrics = 1024 dernières attentes depuis le démarrage :
+    # on repart de l'histogramme cumulé pour ne garder que les attentes de l'étape
+    bounds = after["bounds_ms"]
+    previous_counts = before.get("counts", [0] * len(after["counts"]))
+    counts = [count - previous for count, previous in zip(after["counts"], previous_counts)]
+    waits = sum(counts)
+    total_ms = after["total_ms"] - before.get("total_ms", 0.0)
+    return {
+        "count": waits,
+        "mean": total_ms / waits if waits else 0.0,
+        # Valeurs approchées : borne haute du seau de l'histogramme
+        "p50": histogram_percentile(bounds, counts, 0.50),
+        "p95": histogram_percentile(bounds, counts, 0.95),
+        "p99": histogram_percentile(bounds, counts, 0.99),
+    }
+
+
+def pool_deltas(before: dict, after: dict, samples: list[dict]) -> dict:
+    # Les compteurs de /metrics sont cumulés depuis le démarrage : on garde l'écart sur l'étape.
+    # in_use / idle sont des jauges : relevées pendant l'étape (samples), à la fin elles sont au repos.
+    counters = ("checkouts", "connects", "invalidations", "timeouts")
+    deltas = {}
+    for name, pool in after.items():
+        previous = before.get(name, {})
+        in_use = [sample[name]["in_use"] for sample in samples if sample.get(name, {}).get("in_use") is not None]
+        idle = [sample[name]["idle"] for sample in samples if sample.get(name, {}).get("idle") is not None]
+        deltas[name] = {
+            **{counter: pool[counter] - previous.get(counter, 0) for counter in counters},
+            "size": pool["size"],
+            "overflow": pool["overflow"],
+            "in_use": {"max": max(in_use), "mean": sum(in_use) / len(in_use)} if in_use else None,
+            "idle": {"min": min(idle)} if idle else None,
+            "checkout_wait_ms": wait_deltas(
+                previous.get("checkout_wait_histogram", {}), pool["checkout_wait_histogram"]
+            ),
+        }
+    return deltas
+
+
+async def sample_pools(client, deadline: float, interval: float) -> list[dict]:
+    """Read the pools of /metrics every interval seconds until deadline."""
+    samples = []
+    while time.perf_counter() < deadline:
+        samples.append((await client.get("/metrics")).json()["pools"])
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def run_step(client, new_client, clients: int, args, targets: Targets) -> dict:
+    before = (await client.get("/metrics")).json()["pools"]
+    stats = StepStats()
+    start = time.perf_counter()
+    deadline = start + args.duration
+    samples, *_ = await asyncio.gather(
+        sample_pools(client, deadline, args.sample_interval),
+        *(
+            client_loop(new_client, args.mix, targets, stats, deadline, seed=args.seed * 10_000 + clients * 100 + index)
+            for index in range(clients)
+        ),
+    )
+    elapsed = time.perf_counter() - start
+    after = (await client.get("/metrics")).json()["pools"]
+
+    everything = [latency for values in stats.latencies.values() for latency in values]
+    errors = sum(stats.errors.values())
+    return {
+        "clients": clients,
+        "requests": len(everything) + stats.failures,
+        "throughput_per_s": len(everything) / elapsed if elapsed else None,
+        "latency_ms": latency_summary(everything),
+        "errors": errors,
+        "errors_by_kind": dict(stats.errors),
+        "conflicts": dict(stats.conflicts),
+        "scenarios": {
+            name: {"requests": len(values), **latency_summary(values)}
+            for name, values in sorted(stats.latencies.items())
+        },
+        "pools": pool_deltas(before, after, samples),
+    }
+
+
+def client_factory(args) -> Callable:
+    """Return a function creating a new httpx.AsyncClient for the target."""
+    import httpx
+
+    timeout = httpx.Timeout(args.timeout)
+    if args.url:
+        return lambda: httpx.AsyncClient(base_url=args.url, timeout=timeout)
+
+    # En processus : pas de réseau ni de serveur, l'application reçoit directement les appels ASGI.
+    # Les routes def tournent quand même dans le threadpool d'anyio, comme sous uvicorn.
+    # Le démarrage (startup) n'est pas lancé : la base doit déjà exister.
+    from app.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    return lambda: httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout)
+
+
+async def run(args) -> list[dict]:
+    new_client = client_factory(args)
+    async with new_client() as client:
+        targets = await discover(client, args.hot_authors)
+        if args.warmup > 0:
+            print(f"warming up for {args.warmup}s...", file=sys.stderr)
+            warmup = argparse.Namespace(**{**vars(args), "duration": args.warmup})
+            await run_step(client, new_client, min(args.clients), warmup, targets)
+
+        steps = []
+        for clients in args.clients:
+            step = await run_step(client, new_client, clients, args, targets)
+            steps.append(step)
+            latency = step["latency_ms"]
+            print(
+                f"  {clients:>4} clients: {step['throughput_per_s']:8.1f} req/s"
+                f"  p50 {latency['p50']:7.2f} ms  p95 {latency['p95']:7.2f} ms  p99 {latency['p99']:7.2f} ms"
+                f"  errors {step['errors']}  conflicts {sum(step['conflicts'].values())}",
+                file=sys.stderr,
+            )
+    return steps
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="Base URL of a running server (default: the app, in this process)")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="name=weight,... (default: %(default)s)")
+    parser.add_argument(
+        "--clients", default="1,8,32", type=lambda value: [int(part) for part in value.split(",")],
+        help="Concurrent clients of each step, e.g. 1,8,32,64",
+    )
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per step")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of traffic before the first step")
+    parser.add_argument("--hot-authors", type=int, default=5, help="Authors updated by update-author (lock contention)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a request counts as an error")
+    parser.add_argument("--sample-interval", type=float, default=0.5, help="Seconds between two reads of the pools")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="loadtest-report.json")
+    args = parser.parse_args(argv)
+
+    steps = asyncio.run(run(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "target": args.url or "in-process",
+            "mix": args.mix,
+            "duration_s": args.duration,
+            "hot_authors": args.hot_authors,
+        },
+        "steps": steps,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"report written to {args.output}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from app.db import uses_replica
+from app.models import Tag
+from app.replicas import replica_may_lag
+from app.written_tables import on_tables_committed
+
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "300"))
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "1024"))
+
+
+@dataclass(frozen=True)
+class LookupRow:
+    id: int
+    name: str
+
+
+_MISSING = object()
+
+
+class LookupCache:
+    """Read-through cache (TTL + LRU) of a small id/name reference table.
+
+    Only plain LookupRow values are stored, never ORM objects: they are not bound to the
+    session that loaded them. A name that does not exist is cached too (as None).
+    """
+
+    def __init__(self, model, maxsize: int = LOOKUP_CACHE_SIZE, ttl: float = LOOKUP_CACHE_TTL) -> None:
+        self.model = model
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._cleared_at: float | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _put(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def by_name(self, session: Session, name: str) -> LookupRow | None:
+        value = self._get(name)
+        if value is not _MISSING:
+            return value
+        row = session.execute(select(self.model.id, self.model.name).where(self.model.name == name)).first()
+        value = LookupRow(id=row.id, name=row.name) if row else None
+        # Juste après une écriture, une réplique peut ne pas encore la montrer : le tag créé à
+        # l'instant serait mis en cache comme absent (None) pour tout le TTL. On ne garde pas
+        # une valeur lue sur une réplique pendant DB_REPLICA_STICKY_SECONDS après un vidage.
+        if uses_replica() and replica_may_lag(self._cleared_at):
+            return value
+        self._put(name, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._cleared_at = time.monotonic()
+
+
+tag_cache = LookupCache(Tag)
+
+
+# Invalidation : toute écriture ORM sur Tag vide le cache
+# (table minuscule, recharger coûte une requête). Les événements de mapper sont
+# déclenchés au flush, avant le commit : une autre requête pourrait remettre l'ancienne
+# valeur en cache entre les deux, on vide donc une seconde fois après le commit.
+# Ces événements ne voient que les écritures faites par l'ORM dans ce processus : pour les
+# autres workers ou pour un UPDATE en SQL direct, c'est le TTL qui borne la péremption.
+def _register_invalidation(model, cache: LookupCache) -> None:
+    def invalidate(mapper, connection, target) -> None:
+        cache.clear()
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("dirty_lookup_caches", set()).add(cache)
+
+    for event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, event_name, invalidate)
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_after_commit(session: Session) -> None:
+    for cache in session.info.pop("dirty_lookup_caches", ()):
+        cache.clear()
+
+
+_register_invalidation(Tag, tag_cache)
+
+
+# insert() exécuté directement (upsert de POST /orm/book-tags/bulk) ne déclenche pas les
+# événements de mapper : on s'appuie aussi sur les tables écrites par le commit
+def _clear_written(tables: set[str]) -> None:
+    if Tag.__tablename__ in tables:
+        tag_cache.clear()
+
+
+on_tables_committed(_clear_written)
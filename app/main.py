@@ -1,10 +1,24 @@
+import asyncio
+
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 
-from app.db import init_db
+from app.async_router import copy_router, to_async_router
+from app.book_query import tables_read
+from app.db import DB_MODE, STARTUP_MODE, async_engine, async_replicas, engine, init_db, replicas
 from app.orm_book_tag import router as orm_book_tag_router
 from app.orm_join import router as orm_join_router
 from app.orm_simple import router as orm_simple_router
+from app.pool_metrics import pool_metrics_snapshot
+from app.query_stats import QueryStatsMiddleware
 from app.raw_sql import router as raw_sql_router
+from app.replicas import ReplicaRoutingMiddleware
+from app.response_cache import ResponseCacheMiddleware, response_cache
+from app.search import router as search_router
+from app.stats import STATS_REFRESH_INTERVAL, refresh_stats_periodically
+from app.stats import router as stats_router
+from app.statement_cache import compiled_cache_snapshot
+from app.tracing import TracingMiddleware, trace_endpoint
 
 app = FastAPI(
     title="FastAPI - SQL vs ORM",
@@ -12,10 +26,58 @@ app = FastAPI(
     version="0.1.0",
 )
 
+# Catalogue lu très souvent, modifié rarement : la réponse JSON est gardée en mémoire
+# (avec un ETag) jusqu'au prochain commit qui écrit dans une des tables indiquées.
+# Ajouté avant QueryStatsMiddleware : une réponse servie depuis le cache affiche X-DB-Queries: 0
+CACHED_ROUTES = {
+    "/orm/books-with-authors": tables_read({"books", "authors"}),
+    "/orm/books-with-publisher": tables_read({"books", "publishers"}),
+    "/orm/books-with-tags": tables_read({"books", "book_tags", "tags"}),
+}
+app.add_middleware(ResponseCacheMiddleware, routes=CACHED_ROUTES)
+
+# Nombre de requêtes SQL et temps passé en base pour chaque requête HTTP
+# (en-têtes X-DB-Queries / X-DB-Time-ms), avec détection des lazy loads répétés (N+1)
+app.add_middleware(QueryStatsMiddleware)
+
+# GET → réplique en lecture (si DATABASE_REPLICA_URLS est défini), écritures → primaire
+app.add_middleware(ReplicaRoutingMiddleware)
+
+# Ajouté en dernier = exécuté en premier : le span racine couvre aussi les autres middlewares
+# (une réponse servie par le cache n'a pas de span "endpoint"). Voir TRACE_EXPORTER.
+app.add_middleware(TracingMiddleware)
+
 
 @app.on_event("startup")
-def on_startup() -> None:
-    init_db()
+async def on_startup() -> None:
+    if STARTUP_MODE == "init":
+        await run_in_threadpool(init_db)
+        return
+
+    # STARTUP_MODE=warm : pas de create_all ni de comptage, le schéma est géré à part
+    # (python -m app.migrate --seed-demo). On prépare seulement connexions et requêtes.
+    from app.warmup import warm_up, warm_up_async
+
+    if DB_MODE == "async":
+        for target in [async_engine, *async_replicas.engines]:
+            await warm_up_async(target)
+    else:
+        for target in [engine, *replicas.engines]:
+            await run_in_threadpool(warm_up, target)
+
+
+@app.on_event("startup")
+async def start_stats_refresh() -> None:
+    # Vues matérialisées des statistiques (PostgreSQL) rafraîchies en tâche de fond
+    if STATS_REFRESH_INTERVAL > 0 and engine.dialect.name == "postgresql":
+        app.state.stats_refresh = asyncio.create_task(refresh_stats_periodically(engine))
+
+
+@app.on_event("shutdown")
+async def stop_stats_refresh() -> None:
+    task = getattr(app.state, "stats_refresh", None)
+    if task is not None:
+        task.cancel()
 
 
 @app.get("/ping")
@@ -23,7 +85,24 @@ def ping() -> dict[str, str]:
     return {"status": "ok", "message": "API is running"}
 
 
-app.include_router(raw_sql_router)
-app.include_router(orm_simple_router)
-app.include_router(orm_join_router)
-app.include_router(orm_book_tag_router)
+@app.get("/metrics")
+def metrics() -> dict:
+    # État des pools de connexions : connexions utilisées/libres, overflow, timeouts
+    # et temps d'attente d'un checkout (percentiles sur les dernières attentes),
+    # succès / échecs du cache de compilation SQL de SQLAlchemy et du cache de réponses
+    return {
+        "pools": pool_metrics_snapshot(),
+        "compiled_cache": compiled_cache_snapshot(),
+        "response_cache": response_cache.snapshot(),
+    }
+
+
+routers = [raw_sql_router, orm_simple_router, orm_join_router, orm_book_tag_router, search_router, stats_router]
+
+# Mêmes chemins dans les deux modes : on peut comparer sync et async sur les mêmes endpoints.
+# trace_endpoint ne coûte qu'une lecture de ContextVar quand la requête n'est pas tracée.
+for router in routers:
+    router = copy_router(router, trace_endpoint)
+    if DB_MODE == "async":
+        router = to_async_router(router)
+    app.include_router(router)
@@ -0,0 +1,217 @@
+"""Versioned schema migrations.
+
+Usage :
+    python -m app.migrate [--database-url URL] [--seed-demo]
+
+create_all() only creates missing tables: it never adds an index or a column to a table that
+already exists. Each change of the schema after the first version is therefore written here
+as a numbered migration, applied once and recorded in the schema_migrations table.
+"""
+
+import argparse
+import sys
+from collections.abc import Callable
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, DateTime, Engine, Integer, MetaData, String, Table, inspect, insert, select, text
+from sqlalchemy.engine import Connection
+
+from app.models import Base, StatsRefresh, search_ddl, stats_ddl
+
+migrations_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    migrations_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String(200), nullable=False),
+    Column("applied_at", DateTime(timezone=True), nullable=False),
+)
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+    # False : exécutée hors transaction (ex. CREATE INDEX CONCURRENTLY sous PostgreSQL)
+    transactional: bool = True
+
+
+CONCURRENT_INDEX = "CREATE INDEX CONCURRENTLY IF NOT EXISTS"
+
+
+def _drop_invalid_index(conn: Connection, name: str) -> None:
+    # Un CREATE INDEX CONCURRENTLY interrompu (annulation, timeout, doublon d'un index unique)
+    # laisse l'index en place, marqué invalide : IF NOT EXISTS le trouverait et ne ferait rien,
+    # et le planificateur ne l'utiliserait jamais. On le supprime pour le reconstruire.
+    valid = conn.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"), {"name": name}
+    ).scalar()
+    if valid is False:
+        print(f"dropping invalid index {name} left by an interrupted build", file=sys.stderr)
+        conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+
+def _create_indexes(conn: Connection, statements: list[str], postgres_only: list[str] = ()) -> None:
+    postgres = conn.dialect.name == "postgresql"
+    for statement in [*statements, *(postgres_only if postgres else [])]:
+        if not postgres:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {statement}"))
+            continue
+        # CONCURRENTLY : l'index est construit sans bloquer les écritures sur la table
+        _drop_invalid_index(conn, statement.split()[0])
+        conn.execute(text(f"{CONCURRENT_INDEX} {statement}"))
+
+
+def _add_join_indexes(conn: Connection) -> None:
+    _create_indexes(
+        conn,
+        [
+            "ix_books_author_id ON books (author_id)",
+            "ix_books_publisher_id ON books (publisher_id)",
+            "ix_book_tags_tag_id_book_id ON book_tags (tag_id, book_id)",
+        ],
+        postgres_only=["ix_books_id_include_title ON books (id) INCLUDE (title)"],
+    )
+    if conn.dialect.name == "postgresql":
+        # Statistiques à jour pour que le planificateur choisisse les nouveaux index
+        conn.execute(text("ANALYZE books"))
+        conn.execute(text("ANALYZE book_tags"))
+
+
+def _add_search_columns(conn: Connection) -> None:
+    # Colonnes tsvector générées et index GIN de la recherche (voir app/models.py et app/search.py).
+    # Sous SQLite, /search utilise un index en mémoire : rien à créer.
+    # Ajouter une colonne générée STORED réécrit la table sous verrou exclusif :
+    # sur une grosse table, lancer python -m app.migrate en dehors des heures de pointe.
+    if conn.dialect.name != "postgresql":
+        return
+    for statement in search_ddl(concurrently=True):
+        if statement.startswith(CONCURRENT_INDEX):
+            _drop_invalid_index(conn, statement.removeprefix(CONCURRENT_INDEX).split()[0])
+        conn.execute(text(statement))
+    conn.execute(text("ANALYZE books"))
+    conn.execute(text("ANALYZE authors"))
+
+
+def _add_stats_views(conn: Connection) -> None:
+    # Vues de statistiques (voir app/models.py et app/stats.py)
+    StatsRefresh.__table__.create(conn, checkfirst=True)
+    for statement in stats_ddl(conn.dialect.name):
+        conn.execute(text(statement))
+
+
+def _add_author_version(conn: Connection) -> None:
+    # Verrouillage optimiste de PATCH /orm/authors/{id}. Avec une valeur par défaut constante,
+    # PostgreSQL (11+) ajoute la colonne sans réécrire la table
+    conn.execute(text("ALTER TABLE authors ADD COLUMN version INTEGER DEFAULT 1 NOT NULL"))
+
+
+# Liste ordonnée. Ne jamais modifier une migration déjà appliquée : en ajouter une nouvelle.
+MIGRATIONS: list[Migration] = [
+    Migration(1, "add indexes for join and filter paths", _add_join_indexes, transactional=False),
+    Migration(2, "add full-text and trigram search columns", _add_search_columns, transactional=False),
+    Migration(3, "add statistics views", _add_stats_views),
+    Migration(4, "add authors.version for optimistic locking", _add_author_version),
+]
+
+
+# Clé arbitraire, mais fixe : tous les processus qui migrent la même base prennent ce verrou
+MIGRATION_LOCK_KEY = 710_024_001
+
+
+@contextmanager
+def migration_lock(engine: Engine):
+    """Serialize schema work between processes (PostgreSQL advisory lock).
+
+    When several workers start together, only one creates the schema and seeds the data;
+    the others wait for the lock and then find nothing left to do.
+    """
+    if engine.dialect.name != "postgresql":
+        # SQLite verrouille déjà tout le fichier pendant une écriture
+        yield
+        return
+    with engine.connect() as conn:
+        # Verrou de session : il survit aux commits, on le libère explicitement
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            conn.commit()
+
+
+def migrate(engine: Engine) -> list[Migration]:
+    """Bring the database schema up to date. Returns the migrations that were applied."""
+    with engine.begin() as conn:
+        fresh = not inspect(conn).has_table("authors")
+        migrations_metadata.create_all(conn)
+        done = set(conn.scalars(select(schema_migrations.c.version)))
+
+        if fresh:
+            # Base vide : create_all() crée directement le schéma final (index compris),
+            # toutes les migrations sont marquées comme appliquées
+            Base.metadata.create_all(conn)
+            _record(conn, [m for m in MIGRATIONS if m.version not in done])
+            return []
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version in done:
+            continue
+        if migration.transactional:
+            with engine.begin() as conn:
+                migration.upgrade(conn)
+                _record(conn, [migration])
+        else:
+            with engine.connect() as conn:
+                migration.upgrade(conn.execution_options(isolation_level="AUTOCOMMIT"))
+            with engine.begin() as conn:
+                _record(conn, [migration])
+        applied.append(migration)
+    return applied
+
+
+def _record(conn: Connection, migrations: list[Migration]) -> None:
+    if migrations:
+        now = datetime.now(timezone.utc)
+        conn.execute(
+            insert(schema_migrations),
+            [{"version": m.version, "name": m.name, "applied_at": now} for m in migrations],
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations.")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL")
+    parser.add_argument("--seed-demo", action="store_true", help="Insert the demo dataset if the database is empty")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.database_url)
+    else:
+        from app.db import engine
+
+    with migration_lock(engine):
+        applied = migrate(engine)
+        for migration in applied:
+            print(f"applied {migration.version}: {migration.name}", file=sys.stderr)
+        if not applied:
+            print("schema is up to date", file=sys.stderr)
+
+        if args.seed_demo:
+            from sqlalchemy.orm import Session
+
+            from app.seed import seed_demo_if_empty
+
+            with Session(engine) as session:
+                if seed_demo_if_empty(session):
+                    print("demo data inserted", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
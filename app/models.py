@@ -1,6 +1,6 @@
-from datetime import date
+from datetime import date, datetime
 
-from sqlalchemy import ForeignKey, String
+from sqlalchemy import DateTime, ForeignKey, Index, String, event, text
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -24,9 +24,17 @@ class Author(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(100), unique=True)
+    # Verrouillage optimiste : incrémenté à chaque modification. Le client renvoie la version lue
+    # (If-Match) et l'UPDATE ne s'applique que si personne n'a modifié l'auteur entre-temps.
+    # server_default : les lignes insérées sans l'ORM (COPY, INSERT en masse) commencent aussi à 1
+    version: Mapped[int] = mapped_column(default=1, server_default=text("1"))
 
     books: Mapped[list["Book"]] = relationship("Book", back_populates="author")
 
+    # Les modifications faites par l'unité de travail (setattr + commit) vérifient et
+    # incrémentent aussi la version : UPDATE ... WHERE id = ? AND version = ?
+    __mapper_args__ = {"version_id_col": version}
+
 
 class Book(Base):
     __tablename__ = "books"
@@ -34,15 +42,24 @@ class Book(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(200))
     pages: Mapped[int] = mapped_column()
-    author_id: Mapped[int] = mapped_column(ForeignKey("authors.id"))
+    # PostgreSQL ne crée pas d'index sur les clés étrangères : sans index=True,
+    # chaque jointure ou filtre sur author_id / publisher_id parcourt toute la table
+    author_id: Mapped[int] = mapped_column(ForeignKey("authors.id"), index=True)
     # publisher_id existe en base de données mais il n'y a pas de relationship défini sur Book.
     # Pour accéder à l'éditeur d'un livre, il faut faire une jointure explicite dans la requête.
-    publisher_id: Mapped[int | None] = mapped_column(ForeignKey("publishers.id"))
+    publisher_id: Mapped[int | None] = mapped_column(ForeignKey("publishers.id"), index=True)
 
     author: Mapped[Author] = relationship("Author", back_populates="books")
 
     book_tags: Mapped[list["BookTag"]] = relationship("BookTag", back_populates="book")
 
+    # Index couvrant pour /raw/books (SELECT id, title ... ORDER BY id) : title est stocké dans
+    # l'index, PostgreSQL répond sans lire la table (index-only scan). INCLUDE n'existe que
+    # dans PostgreSQL, l'index n'est donc pas créé ailleurs.
+    __table_args__ = (
+        Index("ix_books_id_include_title", "id", postgresql_include=["title"]).ddl_if(dialect="postgresql"),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -64,3 +81,111 @@ class BookTag(Base):
 
     book: Mapped["Book"] = relationship("Book", back_populates="book_tags")
     tag: Mapped["Tag"] = relationship("Tag", back_populates="book_tags")
+
+    # La clé primaire (book_id, tag_id) sert les recherches par book_id seulement.
+    # Pour "les livres d'un tag" (WHERE tag_id = ?), il faut l'index inverse (tag_id, book_id).
+    __table_args__ = (Index("ix_book_tags_tag_id_book_id", "tag_id", "book_id"),)
+
+
+# Recherche (app/search.py), PostgreSQL seulement : ces colonnes et index ne sont pas déclarés
+# dans les modèles ci-dessus, sinon create_all() les créerait aussi sous SQLite.
+#   - app_unaccent : unaccent() déclarée IMMUTABLE, condition pour l'utiliser dans une colonne
+#     générée ou un index ("À l'ombre" est indexé comme "a l ombre")
+#   - search_vector : tsvector calculé par PostgreSQL à chaque INSERT / UPDATE, index GIN
+#   - index trigrammes (pg_trgm) : recherche approximative, tolère les fautes de frappe
+SEARCHED_COLUMNS = {"books": "title", "authors": "name"}
+
+
+def search_ddl(*, concurrently: bool = False) -> list[str]:
+    create_index = "CREATE INDEX CONCURRENTLY IF NOT EXISTS" if concurrently else "CREATE INDEX IF NOT EXISTS"
+    statements = [
+        "CREATE EXTENSION IF NOT EXISTS unaccent",
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE OR REPLACE FUNCTION app_unaccent(text) RETURNS text"
+        " LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT"
+        " AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+    ]
+    for table, column in SEARCHED_COLUMNS.items():
+        statements += [
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector"
+            f" GENERATED ALWAYS AS (to_tsvector('simple', app_unaccent({column}))) STORED",
+            f"{create_index} ix_{table}_search_vector ON {table} USING gin (search_vector)",
+            f"{create_index} ix_{table}_{column}_trgm ON {table}"
+            f" USING gin (app_unaccent(lower({column})) gin_trgm_ops)",
+        ]
+    return statements
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_search_columns(target, connection, **kw) -> None:
+    if connection.dialect.name == "postgresql":
+        for statement in search_ddl():
+            connection.execute(text(statement))
+
+
+# Statistiques (app/stats.py) : GROUP BY sur books / book_tags calculés à l'avance.
+# PostgreSQL : vues matérialisées, rafraîchies avec REFRESH ... CONCURRENTLY (les lectures
+# continuent pendant le calcul, grâce à l'index unique). Ailleurs (SQLite) : vues simples,
+# recalculées à chaque lecture, donc toujours à jour.
+STATS_VIEWS = {
+    "author_stats": (
+        "author_id",
+        "SELECT a.id AS author_id, a.name AS author_name, count(b.id) AS books,"
+        " coalesce(sum(b.pages), 0) AS total_pages"
+        " FROM authors a LEFT JOIN books b ON b.author_id = a.id GROUP BY a.id, a.name",
+    ),
+    "publisher_stats": (
+        "publisher_id",
+        "SELECT p.id AS publisher_id, p.name AS publisher_name, count(b.id) AS books,"
+        " coalesce(sum(b.pages), 0) AS total_pages"
+        " FROM publishers p LEFT JOIN books b ON b.publisher_id = p.id GROUP BY p.id, p.name",
+    ),
+    "tag_stats": (
+        "tag_id",
+        "SELECT t.id AS tag_id, t.name AS tag_name, count(b.id) AS books,"
+        " coalesce(sum(b.pages), 0) AS total_pages"
+        " FROM tags t LEFT JOIN book_tags bt ON bt.tag_id = t.id LEFT JOIN books b ON b.id = bt.book_id"
+        " GROUP BY t.id, t.name",
+    ),
+    "tagging_activity": (
+        "day",
+        "SELECT tagged_at AS day, count(*) AS taggings, count(DISTINCT book_id) AS books"
+        " FROM book_tags GROUP BY tagged_at",
+    ),
+}
+
+
+# Date du dernier rafraîchissement de chaque vue matérialisée, partagée par tous les workers
+class StatsRefresh(Base):
+    __tablename__ = "stats_refreshes"
+
+    view: Mapped[str] = mapped_column(String(50), primary_key=True)
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+
+
+def stats_ddl(dialect_name: str) -> list[str]:
+    statements = []
+    for view, (key, query) in STATS_VIEWS.items():
+        if dialect_name == "postgresql":
+            statements += [
+                f"CREATE MATERIALIZED VIEW IF NOT EXISTS {view} AS {query}",
+                # Index unique obligatoire pour REFRESH MATERIALIZED VIEW CONCURRENTLY
+                f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{view}_{key} ON {view} ({key})",
+            ]
+        else:
+            statements.append(f"CREATE VIEW IF NOT EXISTS {view} AS {query}")
+    return statements
+
+
+@event.listens_for(Base.metadata, "after_create")
+def _create_stats_views(target, connection, **kw) -> None:
+    for statement in stats_ddl(connection.dialect.name):
+        connection.execute(text(statement))
+
+
+# Les vues dépendent des tables : PostgreSQL refuse de supprimer une table encore utilisée
+@event.listens_for(Base.metadata, "before_drop")
+def _drop_stats_views(target, connection, **kw) -> None:
+    kind = "MATERIALIZED VIEW" if connection.dialect.name == "postgresql" else "VIEW"
+    for view in STATS_VIEWS:
+        connection.execute(text(f"DROP {kind} IF EXISTS {view}"))
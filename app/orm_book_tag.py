@@ -1,72 +1,303 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from enum import Enum
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import Text, bindparam, cast, func, literal_column, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.dialects.postgresql import aggregate_order_by
 from sqlalchemy.orm import Session, joinedload, selectinload
 
+from app.book_query import BookQuery, book_query_params, filter_books, order_books, set_query_cursor
+from app.bulk import bulk_request_body, bulk_rows, chunked, validate_rows
 from app.db import get_session
+from app.fast_json import RenderMode, fast_response, render_mode
+from app.lookup_cache import tag_cache
 from app.models import Book, BookTag, Tag
-from app.schemas import BookWithTags, TagOut
+from app.pagination import (
+    NEXT_CURSOR_HEADER,
+    KeysetParams,
+    keyset_page,
+    keyset_params,
+    keyset_values,
+    ndjson_response,
+    paginate,
+)
+from app.schemas import BookTagAssign, BookTagBulkResult, BookTagRowResult, BookWithTags, TagOut
 
 router = APIRouter(prefix="/orm", tags=["ORM book-tag"])
 
+# On filtre les livres via la table de jointure :
+#   .join(Book.book_tags)  → JOIN book_tags ON book_tags.book_id = books.id
+#   .where(BookTag.tag_id == :tag_id) → WHERE book_tags.tag_id = ?
+# Comme on connaît déjà l'id du tag (cache), plus besoin de joindre la table tags
+# (avant : .join(BookTag.tag).where(Tag.name == tag_name))
+# On charge aussi les tags de chaque livre pour pouvoir les retourner.
+# Construite une seule fois : tag_id, after et limit sont passés à l'exécution.
+BOOKS_BY_TAG = (
+    select(Book)
+    .join(Book.book_tags)
+    .where(BookTag.tag_id == bindparam("tag_id"))
+    .options(selectinload(Book.book_tags).joinedload(BookTag.tag))
+)
+BOOKS_BY_TAG_PAGE = keyset_page(BOOKS_BY_TAG, Book.id)
+
+# Tous les livres avec leurs tags (voir list_books_with_tags)
+BOOKS_WITH_TAGS = select(Book).options(selectinload(Book.book_tags).joinedload(BookTag.tag))
+BOOKS_WITH_TAGS_PAGE = keyset_page(BOOKS_WITH_TAGS, Book.id)
+
+
+def to_book_with_tags(book: Book) -> BookWithTags:
+    return BookWithTags(
+        id=book.id,
+        title=book.title,
+        tags=[
+            TagOut(name=bt.tag.name, tagged_at=bt.tagged_at)
+            for bt in book.book_tags
+        ],
+    )
+
+
+# Même contenu que to_book_with_tags, en dictionnaires simples pour le chemin rapide
+def book_with_tags_dict(book: Book) -> dict:
+    return {
+        "id": book.id,
+        "title": book.title,
+        "tags": [{"name": bt.tag.name, "tagged_at": bt.tagged_at} for bt in book.book_tags],
+    }
+
+
+def books_with_tags_response(
+    books, response: Response, page: KeysetParams, query: BookQuery, render: RenderMode
+):
+    if render is not RenderMode.pydantic:
+        fast = fast_response([book_with_tags_dict(book) for book in books], BookWithTags, render)
+        set_query_cursor(fast, books, query, page)
+        return fast
+
+    set_query_cursor(response, books, query, page)
+    return [to_book_with_tags(book) for book in books]
+
+
+def queried_books_with_tags(
+    session: Session,
+    stmt,
+    params: dict,
+    response: Response,
+    page: KeysetParams,
+    query: BookQuery,
+    render: RenderMode,
+):
+    """Books of stmt (select(Book) with its tags loaded) filtered and sorted as asked by query.
+
+    Built per request: the prebuilt *_PAGE statements only cover the default order by id.
+    """
+    stmt = order_books(filter_books(stmt, query), query, page, limit=not page.stream)
+    if page.stream:
+        return ndjson_response(stmt.params(**params), to_book_with_tags, scalars=True)
+    books = session.scalars(stmt, params).all()
+    return books_with_tags_response(books, response, page, query, render)
+
+
+class Aggregation(str, Enum):
+    # L'ORM charge Book, BookTag et Tag (2 requêtes) puis Python imbrique les tags
+    orm = "orm"
+    # PostgreSQL construit lui-même le document JSON imbriqué en une seule requête
+    sql = "sql"
+
+
+def books_with_tags_json_stmt(dialect_name: str, page: KeysetParams):
+    # Mêmes fonctions sous d'autres noms dans SQLite (utile pour tester sans Postgres)
+    postgres = dialect_name == "postgresql"
+    if postgres:
+        json_object, json_array_agg = func.json_build_object, func.json_agg
+    else:
+        json_object, json_array_agg = func.json_object, func.json_group_array
+
+    # Sous-requête corrélée : tableau JSON des tags de chaque livre
+    tags = (
+        select(json_array_agg(json_object("name", Tag.name, "tagged_at", BookTag.tagged_at)))
+        .select_from(BookTag)
+        .join(Tag, Tag.id == BookTag.tag_id)
+        .where(BookTag.book_id == Book.id)
+        .scalar_subquery()
+    )
+    empty_array = literal_column("'[]'::json") if postgres else literal_column("'[]'")
+    if postgres:
+        # json_agg sur zéro ligne renvoie NULL, on veut []
+        tags = func.coalesce(tags, empty_array)
+    else:
+        # Sans json(), SQLite insérerait le tableau comme une chaîne échappée
+        tags = func.json(tags)
+
+    docs = paginate(
+        select(
+            Book.id,
+            json_object("id", Book.id, "title", Book.title, "tags", tags).label("doc"),
+        ),
+        Book.id,
+        page,
+    ).subquery()
+
+    if postgres:
+        documents = func.json_agg(aggregate_order_by(docs.c.doc, docs.c.id))
+    else:
+        documents = json_array_agg(func.json(docs.c.doc))
+
+    # ::text → le driver ne décode pas le JSON : on renvoie les octets tels quels au client
+    return select(
+        cast(func.coalesce(documents, empty_array), Text).label("json"),
+        func.count(docs.c.id).label("count"),
+        func.max(docs.c.id).label("last_id"),
+    )
+
+
+def books_with_tags_json(session: Session, page: KeysetParams) -> tuple[bytes, int | None]:
+    """Build the whole books-with-tags JSON array in the database, in one statement.
+
+    Returns the JSON bytes and the next keyset cursor (None on the last page).
+    """
+    stmt = books_with_tags_json_stmt(session.get_bind().dialect.name, page)
+    row = session.execute(stmt).one()
+    next_after = row.last_id if row.count == page.limit else None
+    return row.json.encode(), next_after
+
 
 @router.get("/books-with-tags", response_model=list[BookWithTags])
 def list_books_with_tags(
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    render: RenderMode = Depends(render_mode),
+    query: BookQuery = Depends(book_query_params(BookWithTags, projection=False)),
+    aggregate: Aggregation = Query(Aggregation.orm, description="Build the nested JSON with the ORM or in SQL"),
     session: Session = Depends(get_session),
 ) -> list[BookWithTags]:
+    # ?author_id=1&tag=history&sort=title : mêmes filtres et tris que /orm/books (app/book_query.py)
+    if not query.is_default:
+        if aggregate is Aggregation.sql:
+            raise HTTPException(status_code=422, detail="aggregate=sql does not support filters or sort")
+        return queried_books_with_tags(session, BOOKS_WITH_TAGS, {}, response, page, query, render)
+
+    # json_agg / json_build_object : aucun objet ORM ni modèle Pydantic n'est créé.
+    # Un seul document JSON par page : pas de version NDJSON
+    if aggregate is Aggregation.sql and page.stream:
+        raise HTTPException(status_code=422, detail="aggregate=sql cannot be used with stream=true")
+    if aggregate is Aggregation.sql:
+        content, next_after = books_with_tags_json(session, page)
+        sql_response = Response(content, media_type="application/json")
+        if next_after is not None:
+            sql_response.headers[NEXT_CURSOR_HEADER] = str(next_after)
+        return sql_response
+
     # selectinload pour Book → book_tags  (collection, 1→N)  : génère un 2e SELECT avec IN (...)
     # joinedload  pour BookTag → tag      (objet unique, N→1) : ajoute un JOIN au 2e SELECT
     # Résultat : 2 requêtes seulement, pas de duplication de lignes
-    books = session.scalars(
-        select(Book)
-        .options(selectinload(Book.book_tags).joinedload(BookTag.tag))
-        .order_by(Book.id)
-    ).all()
-
-    return [
-        BookWithTags(
-            id=book.id,
-            title=book.title,
-            tags=[
-                TagOut(name=bt.tag.name, tagged_at=bt.tagged_at)
-                for bt in book.book_tags
-            ],
-        )
-        for book in books
-    ]
+    # (selectinload reste compatible avec yield_per : un SELECT ... IN par lot en streaming)
+    if page.stream:
+        return ndjson_response(paginate(BOOKS_WITH_TAGS, Book.id, page, limit=False), to_book_with_tags, scalars=True)
+
+    books = session.scalars(BOOKS_WITH_TAGS_PAGE, keyset_values(page)).all()
+    return books_with_tags_response(books, response, page, query, render)
 
 
 @router.get("/books-by-tag/{tag_name}", response_model=list[BookWithTags])
 def list_books_by_tag(
     tag_name: str,
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    query: BookQuery = Depends(book_query_params(BookWithTags, projection=False)),
+    render: RenderMode = Depends(render_mode),
     session: Session = Depends(get_session),
 ) -> list[BookWithTags]:
-    # On vérifie que le tag existe
-    tag = session.scalar(select(Tag).where(Tag.name == tag_name))
+    # On vérifie que le tag existe et on récupère son id.
+    # Les tags changent rarement : le cache évite une requête (voir app/lookup_cache.py)
+    tag = tag_cache.by_name(session, tag_name)
     if not tag:
         raise HTTPException(status_code=404, detail=f"Tag '{tag_name}' not found")
 
-    # On filtre les livres via la table de jointure :
-    #   .join(Book.book_tags)  → JOIN book_tags ON book_tags.book_id = books.id
-    #   .join(BookTag.tag)     → JOIN tags ON tags.id = book_tags.tag_id
-    #   .where(Tag.name == tag_name) → WHERE tags.name = ?
-    # On charge aussi les tags de chaque livre pour pouvoir les retourner
-    books = session.scalars(
-        select(Book)
-        .join(Book.book_tags)
-        .join(BookTag.tag)
-        .where(Tag.name == tag_name)
-        .options(selectinload(Book.book_tags).joinedload(BookTag.tag))
-        .order_by(Book.id)
-    ).all()
-
-    return [
-        BookWithTags(
-            id=book.id,
-            title=book.title,
-            tags=[
-                TagOut(name=bt.tag.name, tagged_at=bt.tagged_at)
-                for bt in book.book_tags
+    # Filtres et tris en plus du tag du chemin (?tag=... : le livre a aussi ces tags)
+    if not query.is_default:
+        return queried_books_with_tags(session, BOOKS_BY_TAG, {"tag_id": tag.id}, response, page, query, render)
+
+    # La requête est construite une seule fois (BOOKS_BY_TAG), l'id du tag est un paramètre
+    if page.stream:
+        stmt = paginate(BOOKS_BY_TAG, Book.id, page, limit=False).params(tag_id=tag.id)
+        return ndjson_response(stmt, to_book_with_tags, scalars=True)
+
+    books = session.scalars(BOOKS_BY_TAG_PAGE, {"tag_id": tag.id, **keyset_values(page)}).all()
+    return books_with_tags_response(books, response, page, query, render)
+
+
+def _dialect_insert(session: Session):
+    # INSERT ... ON CONFLICT n'est pas du SQL standard : chaque dialecte a son insert()
+    name = session.get_bind().dialect.name
+    if name == "postgresql":
+        return postgresql.insert
+    if name == "sqlite":
+        return sqlite.insert
+    raise HTTPException(status_code=501, detail=f"Upsert is not supported on {name}")
+
+
+@router.post(
+    "/book-tags/bulk",
+    response_model=BookTagBulkResult,
+    openapi_extra=bulk_request_body(BookTagAssign),
+)
+def upsert_book_tags_bulk(
+    rows: list[Any] = Depends(bulk_rows),
+    session: Session = Depends(get_session),
+) -> BookTagBulkResult:
+    """Tag books in bulk: {"book_id", "tag_name", "tagged_at"} objects or [book_id, tag_name, tagged_at]."""
+    results = [BookTagRowResult(index=index) for index in range(len(rows))]
+    valid = validate_rows(rows, BookTagAssign, results)
+    insert = _dialect_insert(session)
+    tags_created = 0
+
+    # Un commit par lot : la transaction et les verrous restent petits, quel que soit l'envoi.
+    # Un upsert peut être rejoué sans risque : en cas d'erreur, le client renvoie tout.
+    for chunk in chunked(valid):
+        book_ids = {payload.book_id for _, payload in chunk}
+        existing = set(session.scalars(select(Book.id).where(Book.id.in_(book_ids))))
+        for index, payload in chunk:
+            if payload.book_id not in existing:
+                results[index].error = "Book not found"
+        chunk = [(index, payload) for index, payload in chunk if payload.book_id in existing]
+        if not chunk:
+            continue
+
+        # Tags manquants créés en une requête ; ON CONFLICT DO NOTHING : si un autre client
+        # crée le même tag en même temps, pas d'erreur d'unicité
+        names = {payload.tag_name for _, payload in chunk}
+        created = session.scalars(
+            insert(Tag).values([{"name": name} for name in names])
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag.id)
+        ).all()
+        tags_created += len(created)
+        # Puis tous les noms résolus en une seule requête (au lieu d'un SELECT par ligne)
+        tag_ids = dict(session.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all())
+
+        # Une même paire (livre, tag) deux fois dans un INSERT ... ON CONFLICT DO UPDATE est refusée
+        # par PostgreSQL : on ne garde que la dernière, comme si les lignes étaient appliquées dans l'ordre
+        upserts = {}
+        for index, payload in chunk:
+            results[index].tag_id = tag_ids[payload.tag_name]
+            upserts[(payload.book_id, results[index].tag_id)] = payload.tagged_at
+
+        # excluded = la ligne proposée par l'INSERT : en cas de conflit on met à jour tagged_at
+        stmt = insert(BookTag)
+        session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[BookTag.book_id, BookTag.tag_id],
+                set_={"tagged_at": stmt.excluded.tagged_at},
+            ),
+            [
+                {"book_id": book_id, "tag_id": tag_id, "tagged_at": tagged_at}
+                for (book_id, tag_id), tagged_at in upserts.items()
             ],
         )
-        for book in books
-    ]
+        session.commit()
+
+    upserted = sum(1 for result in results if result.tag_id is not None)
+    return BookTagBulkResult(
+        upserted=upserted, failed=len(results) - upserted, tags_created=tags_created, results=results
+    )
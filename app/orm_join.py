@@ -1,35 +1,87 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy import select
 from sqlalchemy.orm import Session, joinedload
 
+from app.book_query import BookQuery, book_query_params, book_query_response
 from app.db import get_session
+from app.fast_json import RenderMode, fast_response, plain_dict, render_mode
 from app.models import Author, Book, Publisher
+from app.pagination import (
+    KeysetParams,
+    keyset_page,
+    keyset_params,
+    keyset_values,
+    ndjson_response,
+    paginate,
+    set_next_cursor,
+)
 from app.schemas import BookWithAuthor, BookWithAuthorObject, BookWithPublisher
 
 router = APIRouter(prefix="/orm", tags=["ORM jointure"])
 
+# Requêtes des routes les plus appelées, construites une seule fois au chargement du module.
+# after et limit sont des paramètres liés (keyset_page) : à chaque requête HTTP, SQLAlchemy
+# retrouve le SQL déjà compilé dans son cache et psycopg peut réutiliser le plan préparé.
+BOOKS_WITH_AUTHORS = (
+    select(
+        Book.id,
+        Book.title,
+        Book.pages,
+        Author.name.label("author_name"),
+    )
+    .join(Author)
+)
+BOOKS_WITH_AUTHORS_PAGE = keyset_page(BOOKS_WITH_AUTHORS, Book.id)
+
+# Publisher n'est pas accessible via book.publisher (pas de relationship défini).
+# On doit donc construire la jointure manuellement avec join() et la condition explicite.
+BOOKS_WITH_PUBLISHER = (
+    select(
+        Book.id,
+        Book.title,
+        Book.pages,
+        Publisher.name.label("publisher_name"),
+    )
+    .join(Publisher, Book.publisher_id == Publisher.id, isouter=True)
+)
+BOOKS_WITH_PUBLISHER_PAGE = keyset_page(BOOKS_WITH_PUBLISHER, Book.id)
+
+# Objets Book complets avec book.author chargé par joinedload (voir list_books_with_author_object)
+BOOKS_WITH_AUTHOR_OBJECT = select(Book).options(joinedload(Book.author))
+BOOKS_WITH_AUTHOR_OBJECT_PAGE = keyset_page(BOOKS_WITH_AUTHOR_OBJECT, Book.id)
+
 
 @router.get("/books-with-authors", response_model=list[BookWithAuthor])
 def list_books_with_authors(
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    render: RenderMode = Depends(render_mode),
+    query: BookQuery = Depends(book_query_params(BookWithAuthor)),
     session: Session = Depends(get_session),
 ) -> list[BookWithAuthor]:
-    stmt = (
-        select(
-            Book.id,
-            Book.title,
-            Book.pages,
-            Author.name.label("author_name"),
+    # Filtres, tri ou fields= demandés : une requête compilée à la demande (app/book_query.py)
+    if not query.is_default:
+        return book_query_response(session, query, page)
+
+    if page.stream:
+        return ndjson_response(
+            paginate(BOOKS_WITH_AUTHORS, Book.id, page, limit=False),
+            lambda row: BookWithAuthor(**row._mapping),
         )
-        .join(Author)
-        .order_by(Book.id)
-    )
 
     # On pourrait aussi utiliser mappings et ** pour éviter de répéter tous les champs de Book :
     # rows = session.execute(stmt).mappings().all()
     # return [BookWithAuthor(**row) for row in rows]
 
-    rows = session.execute(stmt).all()
-    return [
+    rows = session.execute(BOOKS_WITH_AUTHORS_PAGE, keyset_values(page)).all()
+
+    # Chemin rapide : pas de BookWithAuthor(...) par ligne ni de revalidation par response_model
+    if render is not RenderMode.pydantic:
+        fast = fast_response([plain_dict(BookWithAuthor, row) for row in rows], BookWithAuthor, render)
+        set_next_cursor(fast, rows, page)
+        return fast
+
+    books = [
         BookWithAuthor(
             id=row.id,
             title=row.title,
@@ -38,45 +90,70 @@ def list_books_with_authors(
         )
         for row in rows
     ]
+    set_next_cursor(response, books, page)
+    return books
 
 
 
 @router.get("/books-with-author-object", response_model=list[BookWithAuthorObject])
 def list_books_with_author_object(
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    render: RenderMode = Depends(render_mode),
     session: Session = Depends(get_session),
 ) -> list[BookWithAuthorObject]:
     # Contrairement à /books-with-authors qui extrait author_name comme simple string,
     # ici on charge des objets Book complets avec book.author navigable (objet Author).
     # joinedload → un seul SELECT avec JOIN, idéal pour une relation many-to-one.
-    books = session.scalars(
-        select(Book)
-        .options(joinedload(Book.author))
-        .order_by(Book.id)
-    ).all()
+    if page.stream:
+        return ndjson_response(
+            paginate(BOOKS_WITH_AUTHOR_OBJECT, Book.id, page, limit=False),
+            BookWithAuthorObject.model_validate,
+            scalars=True,
+        )
+
+    books = session.scalars(BOOKS_WITH_AUTHOR_OBJECT_PAGE, keyset_values(page)).all()
+
+    if render is not RenderMode.pydantic:
+        fast = fast_response(
+            [plain_dict(BookWithAuthorObject, book) for book in books], BookWithAuthorObject, render
+        )
+        set_next_cursor(fast, books, page)
+        return fast
+
+    set_next_cursor(response, books, page)
     # book.author est un objet Author — on peut accéder à book.author.id, book.author.name
     return books
 
 
 @router.get("/books-with-publisher", response_model=list[BookWithPublisher])
 def list_books_with_publisher(
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    render: RenderMode = Depends(render_mode),
+    query: BookQuery = Depends(book_query_params(BookWithPublisher)),
     session: Session = Depends(get_session),
 ) -> list[BookWithPublisher]:
-    # Publisher n'est pas accessible via book.publisher (pas de relationship défini).
-    # On doit donc construire la jointure manuellement avec join() et la condition explicite.
-    stmt = (
-        select(
-            Book.id,
-            Book.title,
-            Book.pages,
-            Publisher.name.label("publisher_name"),
+    # Filtres, tri ou fields= demandés : une requête compilée à la demande (app/book_query.py)
+    if not query.is_default:
+        return book_query_response(session, query, page)
+
+    # Jointure manuelle vers Publisher : voir BOOKS_WITH_PUBLISHER en haut du module
+    if page.stream:
+        return ndjson_response(
+            paginate(BOOKS_WITH_PUBLISHER, Book.id, page, limit=False),
+            lambda row: BookWithPublisher(**row._mapping),
         )
-        .join(Publisher, Book.publisher_id == Publisher.id, isouter=True)
-        .order_by(Book.id)
-    )
 
     # Idem, on pourrait utiliser mappings et **
-    rows = session.execute(stmt).all()
-    return [
+    rows = session.execute(BOOKS_WITH_PUBLISHER_PAGE, keyset_values(page)).all()
+
+    if render is not RenderMode.pydantic:
+        fast = fast_response([plain_dict(BookWithPublisher, row) for row in rows], BookWithPublisher, render)
+        set_next_cursor(fast, rows, page)
+        return fast
+
+    books = [
         BookWithPublisher(
             id=row.id,
             title=row.title,
@@ -85,3 +162,5 @@ def list_books_with_publisher(
         )
         for row in rows
     ]
+    set_next_cursor(response, books, page)
+    return books
@@ -1,18 +1,62 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select
+from typing import Any
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.book_query import BookQuery, book_query_params, book_query_response
+from app.bulk import bulk_request_body, bulk_rows, chunked, validate_rows
 from app.db import get_session
 from app.models import Author, Book
-from app.schemas import AuthorCreate, AuthorOut, AuthorUpdate, BookCreate, BookOut
+from app.pagination import (
+    KeysetParams,
+    keyset_page,
+    keyset_params,
+    keyset_values,
+    ndjson_response,
+    paginate,
+    set_next_cursor,
+)
+from app.read_models import LoadMode, load_mode, read_rows, schema_columns
+from app.schemas import (
+    AuthorCreate,
+    AuthorOut,
+    AuthorUpdate,
+    BookCreate,
+    BookOut,
+    BulkResult,
+    BulkRowResult,
+)
 
 router = APIRouter(prefix="/orm", tags=["ORM simple"])
 
+# Lectures seules : on ne charge que les colonnes des schémas de réponse, dans des objets
+# légers (AuthorOutRow, BookOutRow) au lieu d'instances ORM suivies par la session.
+# Voir app/read_models.py ; ?load=orm pour comparer avec select(Author) / select(Book).
+AUTHOR_ROWS = read_rows(AuthorOut, Author)
+AUTHOR_ROWS_PAGE = keyset_page(AUTHOR_ROWS, Author.id)
+BOOK_ROWS = read_rows(BookOut, Book)
+BOOK_ROWS_PAGE = keyset_page(BOOK_ROWS, Book.id)
+
 
 @router.get("/authors", response_model=list[AuthorOut])
-def list_authors(session: Session = Depends(get_session)) -> list[AuthorOut]:
-    stmt = select(Author).order_by(Author.id)
-    return session.scalars(stmt).all()
+def list_authors(
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    load: LoadMode = Depends(load_mode),
+    session: Session = Depends(get_session),
+) -> list[AuthorOut]:
+    if page.stream:
+        stmt = AUTHOR_ROWS if load is LoadMode.columns else select(Author)
+        return ndjson_response(paginate(stmt, Author.id, page, limit=False), AuthorOut.model_validate, scalars=True)
+
+    if load is LoadMode.columns:
+        authors = session.scalars(AUTHOR_ROWS_PAGE, keyset_values(page)).all()
+    else:
+        authors = session.scalars(paginate(select(Author), Author.id, page)).all()
+    set_next_cursor(response, authors, page)
+    return authors
 
 
 @router.post("/authors", response_model=AuthorOut, status_code=201)
@@ -27,33 +71,186 @@ def create_author(
     return author
 
 
+@router.post(
+    "/authors/bulk",
+    response_model=BulkResult,
+    status_code=201,
+    openapi_extra=bulk_request_body(AuthorCreate),
+)
+def create_authors_bulk(
+    rows: list[Any] = Depends(bulk_rows),
+    session: Session = Depends(get_session),
+) -> BulkResult:
+    results = [BulkRowResult(index=index) for index in range(len(rows))]
+    valid = validate_rows(rows, AuthorCreate, results)
+
+    for chunk in chunked(valid):
+        # Un seul SELECT par lot pour trouver les noms déjà pris (name est unique)
+        names = {payload.name for _, payload in chunk}
+        taken = set(session.scalars(select(Author.name).where(Author.name.in_(names))))
+
+        to_insert = []
+        for index, payload in chunk:
+            if payload.name in taken:
+                results[index].error = "Author name already exists"
+                continue
+            taken.add(payload.name)  # doublon à l'intérieur du même envoi
+            to_insert.append((index, payload))
+        if not to_insert:
+            continue
+
+        # insert() + liste de dictionnaires : SQLAlchemy regroupe les lignes en INSERT
+        # multi-valeurs (insertmanyvalues) au lieu d'un aller-retour par ligne.
+        # sort_by_parameter_order=True garantit que les id reviennent dans l'ordre envoyé.
+        ids = session.scalars(
+            insert(Author).returning(Author.id, sort_by_parameter_order=True),
+            [{"name": payload.name} for _, payload in to_insert],
+        ).all()
+        for (index, _), author_id in zip(to_insert, ids):
+            results[index].id = author_id
+
+    try:
+        session.commit()
+    except IntegrityError:
+        # Un autre client a inséré un même nom entre la vérification et l'insert
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Conflicting concurrent insert, nothing was saved")
+
+    inserted = sum(1 for result in results if result.id is not None)
+    return BulkResult(inserted=inserted, failed=len(results) - inserted, results=results)
+
+
+def unique_violation_on(exc: IntegrityError, column) -> bool:
+    """True if exc is the UNIQUE constraint of column (not a foreign key, NOT NULL or CHECK)."""
+    table, name = column.table.name, column.name
+    orig = exc.orig
+    # PostgreSQL (psycopg) : SQLSTATE 23505 et nom de la contrainte, "authors_name_key" par défaut
+    if getattr(orig, "sqlstate", None) == "23505":
+        return orig.diag.constraint_name == f"{table}_{name}_key"
+    # SQLite : seul le message identifie la contrainte
+    return str(orig) == f"UNIQUE constraint failed: {table}.{name}"
+
+
+def author_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def if_match_versions(if_match: str | None) -> list[int] | None:
+    """Versions listed in an If-Match header; None for *, the explicit "no condition".
+
+    Without the header: 428, the client must say which version it modifies (or send *).
+    """
+    if if_match is None:
+        raise HTTPException(
+            status_code=428,
+            detail='If-Match is required: send the ETag of GET /orm/authors/{id}, or * to overwrite',
+        )
+    if if_match.strip() == "*":
+        return None
+    versions = []
+    for value in if_match.split(","):
+        value = value.strip()
+        # If-Match utilise la comparaison forte : un ETag faible (W/"3") ne correspond jamais
+        if value.startswith("W/"):
+            continue
+        try:
+            versions.append(int(value.strip('"')))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid If-Match value: {value}")
+    return versions
+
+
+@router.get("/authors/{author_id}", response_model=AuthorOut)
+def get_author(
+    author_id: int,
+    response: Response,
+    session: Session = Depends(get_session),
+) -> AuthorOut:
+    author = session.scalars(AUTHOR_ROWS.where(Author.id == author_id)).one_or_none()
+    if author is None:
+        raise HTTPException(status_code=404, detail="Author not found")
+    # Le client renverra cet ETag dans If-Match pour modifier l'auteur
+    response.headers["ETag"] = author_etag(author.version)
+    return author
+
+
 @router.patch("/authors/{author_id}", response_model=AuthorOut)
 def update_author(
     author_id: int,
     payload: AuthorUpdate,
+    response: Response,
+    if_match: str | None = Header(None, description='ETag of the version read, e.g. "3" (required, * = any version)'),
     session: Session = Depends(get_session),
 ) -> AuthorOut:
-
-    # On récupère l'auteur à mettre à jour depuis la base de données
-    # get() est une méthode de Session qui permet de récupérer un objet par sa clé primaire (ici id)
-    author = session.get(Author, author_id)
-    if not author:
-        raise HTTPException(status_code=404, detail="Author not found")
+    versions = if_match_versions(if_match)
 
     # model_dump(exclude_unset=True) retourne uniquement les champs envoyés dans le body
-    # Si le client envoie {} (body vide), rien n'est modifié
-    for field, value in payload.model_dump(exclude_unset=True).items():
-        setattr(author, field, value)
+    # Si le client envoie {} (body vide), rien n'est modifié (la version non plus)
+    changes = payload.model_dump(exclude_unset=True)
 
-    session.commit()
-    session.refresh(author)
-    return author
+    # Avant : session.get() + setattr() + commit() + refresh() = au moins 3 allers-retours,
+    # et deux clients qui modifient le même auteur s'écrasent sans le savoir.
+    # Ici une seule instruction : UPDATE authors SET ..., version = version + 1
+    #   WHERE id = :id AND version IN (:if_match) RETURNING id, name, version
+    # La base vérifie la version et renvoie la ligne à jour : pas de refresh, et le verrou
+    # de ligne n'est tenu que pendant l'UPDATE et le commit.
+    stmt = (
+        update(Author)
+        .where(Author.id == author_id)
+        .values(**changes, version=Author.version + 1 if changes else Author.version)
+        .returning(*schema_columns(AuthorOut, Author))
+        # Rien à synchroniser : aucun objet Author n'est chargé dans la session
+        .execution_options(synchronize_session=False)
+    )
+    if versions is not None:
+        stmt = stmt.where(Author.version.in_(versions))
+
+    try:
+        row = session.execute(stmt).one_or_none()
+        session.commit()
+    except IntegrityError as exc:
+        session.rollback()
+        if unique_violation_on(exc, Author.name):
+            raise HTTPException(status_code=409, detail="Author name already exists")
+        raise
+
+    if row is None:
+        # Seulement en cas d'échec : une requête de plus pour distinguer auteur absent et version périmée
+        current = session.scalar(select(Author.version).where(Author.id == author_id))
+        if current is None:
+            raise HTTPException(status_code=404, detail="Author not found")
+        raise HTTPException(
+            status_code=412,
+            detail=f"Author was modified since it was read (current version {current})",
+            headers={"ETag": author_etag(current)},
+        )
+
+    response.headers["ETag"] = author_etag(row.version)
+    return AuthorOut(**row._mapping)
 
 
 @router.get("/books", response_model=list[BookOut])
-def list_books(session: Session = Depends(get_session)) -> list[BookOut]:
-    stmt = select(Book).order_by(Book.id)
-    return session.scalars(stmt).all()
+def list_books(
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    query: BookQuery = Depends(book_query_params(BookOut)),
+    load: LoadMode = Depends(load_mode),
+    session: Session = Depends(get_session),
+) -> list[BookOut]:
+    # ?author_id=1&min_pages=100&sort=-pages&fields=id,title : voir app/book_query.py
+    if not query.is_default:
+        return book_query_response(session, query, page)
+
+    if page.stream:
+        stmt = BOOK_ROWS if load is LoadMode.columns else select(Book)
+        return ndjson_response(paginate(stmt, Book.id, page, limit=False), BookOut.model_validate, scalars=True)
+
+    if load is LoadMode.columns:
+        books = session.scalars(BOOK_ROWS_PAGE, keyset_values(page)).all()
+    else:
+        books = session.scalars(paginate(select(Book), Book.id, page)).all()
+    set_next_cursor(response, books, page)
+    return books
 
 
 @router.post("/books", response_model=BookOut, status_code=201)
@@ -70,3 +267,48 @@ def create_book(
     session.commit()
     session.refresh(book)
     return book
+
+
+@router.post(
+    "/books/bulk",
+    response_model=BulkResult,
+    status_code=201,
+    openapi_extra=bulk_request_body(BookCreate),
+)
+def create_books_bulk(
+    rows: list[Any] = Depends(bulk_rows),
+    session: Session = Depends(get_session),
+) -> BulkResult:
+    results = [BulkRowResult(index=index) for index in range(len(rows))]
+    valid = validate_rows(rows, BookCreate, results)
+
+    for chunk in chunked(valid):
+        # Au lieu d'un session.get(Author, ...) par livre : un seul SELECT ... IN par lot
+        author_ids = {payload.author_id for _, payload in chunk}
+        existing = set(session.scalars(select(Author.id).where(Author.id.in_(author_ids))))
+
+        to_insert = []
+        for index, payload in chunk:
+            if payload.author_id not in existing:
+                results[index].error = "Author not found"
+                continue
+            to_insert.append((index, payload))
+        if not to_insert:
+            continue
+
+        ids = session.scalars(
+            insert(Book).returning(Book.id, sort_by_parameter_order=True),
+            [payload.model_dump() for _, payload in to_insert],
+        ).all()
+        for (index, _), book_id in zip(to_insert, ids):
+            results[index].id = book_id
+
+    try:
+        session.commit()
+    except IntegrityError:
+        # Auteur supprimé entre la vérification et l'insert
+        session.rollback()
+        raise HTTPException(status_code=409, detail="Conflicting concurrent write, nothing was saved")
+
+    inserted = sum(1 for result in results if result.id is not None)
+    return BulkResult(inserted=inserted, failed=len(results) - inserted, results=results)
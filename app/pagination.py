@@ -0,0 +1,95 @@
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+import orjson
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy import bindparam
+
+from app.db import read_session
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# Nombre de lignes récupérées à chaque aller-retour avec le curseur côté serveur
+STREAM_BATCH_SIZE = 1000
+
+NEXT_CURSOR_HEADER = "X-Next-After"
+
+
+@dataclass
+class KeysetParams:
+    limit: int
+    after: int | None
+    stream: bool
+
+
+def keyset_params(
+    limit: int | None = Query(None, ge=1, le=MAX_LIMIT, description=f"Max number of rows (default {DEFAULT_LIMIT})"),
+    after: int | None = Query(None, ge=0, description="Return rows with id > after"),
+    stream: bool = Query(False, description="Stream every row as NDJSON (no limit)"),
+) -> KeysetParams:
+    # stream=true renvoie toutes les lignes : un limit serait ignoré sans que le client le sache
+    if stream and limit is not None:
+        raise HTTPException(status_code=422, detail="limit cannot be used with stream=true")
+    return KeysetParams(limit=limit or DEFAULT_LIMIT, after=after, stream=stream)
+
+
+# Pagination par clé (keyset) : au lieu d'un OFFSET qui oblige la base à parcourir
+# toutes les lignes sautées, on repart du dernier id vu (WHERE id > :after).
+# Avec l'index de la clé primaire, la page N coûte autant que la page 1.
+def paginate(stmt, id_column, params: KeysetParams, *, limit: bool = True):
+    if params.after is not None:
+        stmt = stmt.where(id_column > params.after)
+    stmt = stmt.order_by(id_column)
+    if limit:
+        stmt = stmt.limit(params.limit)
+    return stmt
+
+
+# Variante pour les requêtes construites une seule fois au chargement du module :
+# after et limit sont des paramètres liés, valeurs passées à l'exécution (keyset_values).
+# La requête est toujours la même (after=0 pour la 1re page) : un seul SQL compilé,
+# que SQLAlchemy garde en cache et que psycopg peut préparer côté serveur.
+def keyset_page(stmt, id_column):
+    return stmt.where(id_column > bindparam("after")).order_by(id_column).limit(bindparam("limit"))
+
+
+def keyset_values(params: KeysetParams) -> dict[str, int]:
+    return {"after": params.after or 0, "limit": params.limit}
+
+
+def set_next_cursor(response: Response, items: list, params: KeysetParams, *, key=lambda item: item.id) -> None:
+    # Page pleine → il reste peut-être des lignes, le client repart de ce curseur
+    if len(items) == params.limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(key(items[-1]))
+
+
+def ndjson_response(
+    stmt,
+    to_item: Callable[[Any], BaseModel | dict],
+    *,
+    scalars: bool = False,
+) -> StreamingResponse:
+    """Stream the rows of stmt as NDJSON, one JSON document per line."""
+
+    # Le générateur ouvre sa propre session : celle de get_session peut être fermée
+    # avant que la réponse ne soit entièrement envoyée (sur une réplique, comme get_session).
+    # yield_per active un curseur côté serveur : la mémoire reste constante,
+    # quelle que soit la taille de la table.
+    def generate():
+        with read_session() as session:
+            result = session.execute(stmt.execution_options(yield_per=STREAM_BATCH_SIZE))
+            if scalars:
+                result = result.scalars()
+            for row in result:
+                item = to_item(row)
+                # Un dictionnaire (projection fields=) est encodé directement avec orjson
+                if isinstance(item, dict):
+                    yield orjson.dumps(item) + b"\n"
+                else:
+                    yield item.model_dump_json() + "\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
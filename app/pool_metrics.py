@@ -0,0 +1,153 @@
+import bisect
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, Pool, QueuePool
+
+from app.tracing import span
+
+# Nombre d'attentes de checkout conservées pour calculer les percentiles
+LATENCY_WINDOW = 1024
+
+# Bornes (ms) de l'histogramme des attentes. Contrairement à la fenêtre des percentiles,
+# ses compteurs sont cumulés depuis le démarrage : la différence de deux lectures de /metrics
+# donne les attentes d'un intervalle (une étape de python -m app.loadtest par exemple).
+WAIT_BUCKETS_MS = (0.1, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class PoolMetrics:
+    """Counters and checkout latencies of one connection pool."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.pool: Pool | None = None
+        self._lock = threading.Lock()
+        self._waits: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.max_wait = 0.0
+        # Un compteur par borne de WAIT_BUCKETS_MS, plus un pour les attentes au-delà
+        self.wait_counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total = 0.0
+
+    def increment(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._waits.append(seconds)
+            self.max_wait = max(self.max_wait, seconds)
+            self.wait_counts[bisect.bisect_left(WAIT_BUCKETS_MS, seconds * 1000)] += 1
+            self.wait_total += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            waits = sorted(self._waits)
+            wait_counts = list(self.wait_counts)
+            wait_total = self.wait_total
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))] * 1000
+
+        pool = self.pool
+        return {
+            "size": pool.size() if isinstance(pool, QueuePool) else None,
+            "in_use": pool.checkedout() if isinstance(pool, QueuePool) else None,
+            "idle": pool.checkedin() if isinstance(pool, QueuePool) else None,
+            "overflow": max(pool.overflow(), 0) if isinstance(pool, QueuePool) else None,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+            "timeouts": self.timeouts,
+            "checkout_wait_ms": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": self.max_wait * 1000,
+            },
+            "checkout_wait_histogram": {
+                "bounds_ms": list(WAIT_BUCKETS_MS),
+                "counts": wait_counts,
+                "total_ms": wait_total * 1000,
+            },
+        }
+
+
+POOL_METRICS: dict[str, PoolMetrics] = {}
+
+
+# Les événements de pool sont déclenchés *après* l'obtention d'une connexion :
+# pour mesurer l'attente (pool plein) il faut chronométrer _do_get(), l'endroit où
+# QueuePool attend qu'une connexion se libère ou lève TimeoutError après pool_timeout.
+# Même endroit pour le span "db.pool.checkout" d'une requête tracée (app/tracing.py).
+class TimedPoolMixin:
+    metrics: PoolMetrics | None = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            with span("db.pool.checkout", **{"db.pool": self.metrics.name if self.metrics else None}):
+                connection = super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics:
+                self.metrics.increment("timeouts")
+            raise
+        if self.metrics:
+            self.metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() recrée le pool : on garde les mêmes compteurs
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics:
+            self.metrics.pool = pool
+        return pool
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def instrument_pool(pool: Pool, name: str) -> PoolMetrics:
+    metrics = PoolMetrics(name)
+    metrics.pool = pool
+    if isinstance(pool, TimedPoolMixin):
+        pool.metrics = metrics
+
+    def on_connect(dbapi_connection, connection_record):
+        metrics.increment("connects")
+
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.increment("checkouts")
+
+    def on_checkin(dbapi_connection, connection_record):
+        metrics.increment("checkins")
+
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.increment("invalidations")
+
+    event.listen(pool, "connect", on_connect)
+    event.listen(pool, "checkout", on_checkout)
+    event.listen(pool, "checkin", on_checkin)
+    event.listen(pool, "invalidate", on_invalidate)
+
+    POOL_METRICS[name] = metrics
+    return metrics
+
+
+def pool_metrics_snapshot() -> dict:
+    return {name: metrics.snapshot() for name, metrics in POOL_METRICS.items()}
@@ -0,0 +1,134 @@
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.pool import Pool
+
+logger = logging.getLogger("app.query_stats")
+
+# DB_STRICT_NPLUSONE=true : une route qui déclenche plusieurs fois le même lazy load
+# lève NPlusOneError (utile en développement pour repérer un joinedload/selectinload oublié)
+STRICT_NPLUSONE = os.getenv("DB_STRICT_NPLUSONE", "false").lower() in ("1", "true", "yes", "on")
+NPLUSONE_THRESHOLD = int(os.getenv("DB_NPLUSONE_THRESHOLD", "2"))
+
+
+class NPlusOneError(RuntimeError):
+    pass
+
+
+@dataclass
+class QueryStats:
+    queries: int = 0
+    db_time: float = 0.0
+    lazy_loads: Counter = field(default_factory=Counter)
+
+    @property
+    def repeated_lazy_loads(self) -> dict[str, int]:
+        return {stmt: count for stmt, count in self.lazy_loads.items() if count >= NPLUSONE_THRESHOLD}
+
+
+# Une ContextVar par requête HTTP. L'objet QueryStats est créé par le middleware puis
+# modifié sur place : le contexte est copié vers le thread qui exécute une route def,
+# mais c'est le même objet, donc les compteurs remontent jusqu'au middleware.
+_current_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None or not conn.info.get("query_start"):
+        return
+    stats.queries += 1
+    stats.db_time += time.perf_counter() - conn.info["query_start"].pop()
+
+
+# Requête en erreur (contrainte violée, timeout...) : after_cursor_execute n'est pas appelé.
+# On dépile ici, sinon le départ resterait sur la connexion et fausserait la requête suivante.
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is None or not conn.info.get("query_start"):
+        return
+    start = conn.info["query_start"].pop()
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+# conn.info survit au retour de la connexion dans le pool (comme trace_spans, app/tracing.py) :
+# une pile non vidée passerait au prochain client de cette connexion.
+@event.listens_for(Pool, "checkin")
+def _clear_query_start(dbapi_connection, connection_record):
+    if connection_record is not None:
+        connection_record.info.pop("query_start", None)
+
+
+# lazy_loaded_from n'est renseigné que pour un chargement paresseux (accès à book.author
+# sans option de chargement). Le même SQL répété N fois = le problème N+1.
+@event.listens_for(Session, "do_orm_execute")
+def _do_orm_execute(orm_execute_state: ORMExecuteState):
+    stats = _current_stats.get()
+    if stats is None or not orm_execute_state.is_select or orm_execute_state.lazy_loaded_from is None:
+        return
+    statement = str(orm_execute_state.statement)
+    stats.lazy_loads[statement] += 1
+    if STRICT_NPLUSONE and stats.lazy_loads[statement] >= NPLUSONE_THRESHOLD:
+        raise NPlusOneError(f"Lazy load repeated {stats.lazy_loads[statement]} times (N+1): {statement}")
+
+
+class QueryStatsMiddleware:
+    """Count SQL statements and DB time per request.
+
+    Adds the X-DB-Queries and X-DB-Time-ms response headers and logs one JSON line per request.
+    Queries run while a streaming body is sent come after the headers and are only logged.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        status_code = 500
+
+        async def send_with_headers(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-queries", str(stats.queries).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.db_time * 1000:.2f}".encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current_stats.reset(token)
+            log = logger.warning if stats.repeated_lazy_loads else logger.info
+            log(json.dumps({
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status_code,
+                "db_queries": stats.queries,
+                "db_time_ms": round(stats.db_time * 1000, 2),
+                "repeated_lazy_loads": stats.repeated_lazy_loads,
+            }))
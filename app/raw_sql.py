@@ -1,22 +1,35 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Response
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 
 from app.db import get_session
+from app.pagination import KeysetParams, keyset_params, ndjson_response, set_next_cursor
 from app.schemas import BookSummary
 
 router = APIRouter(prefix="/raw", tags=["SQL brut"])
 
 
 @router.get("/books", response_model=list[BookSummary])
-def list_books_raw(session: Session = Depends(get_session)) -> list[BookSummary]:
+def list_books_raw(
+    response: Response,
+    page: KeysetParams = Depends(keyset_params),
+    session: Session = Depends(get_session),
+) -> list[BookSummary]:
     """Query SQL brute avec text() et mapping manuel."""
-    stmt = text("SELECT id, title FROM books ORDER BY id")
+    # Les valeurs passent par des paramètres liés (:after, :limit), jamais par du formatage de chaîne
+    if page.stream:
+        stmt = text("SELECT id, title FROM books WHERE id > :after ORDER BY id")
+        stmt = stmt.bindparams(after=page.after or 0)
+        return ndjson_response(stmt, lambda row: BookSummary(**row._mapping))
+
+    stmt = text("SELECT id, title FROM books WHERE id > :after ORDER BY id LIMIT :limit")
 
     # mappings() permet de récupérer les résultats sous forme de dictionnaires 
     # au lieu de tuples, ce qui facilite la création des objets BookSummary
-    rows = session.execute(stmt).mappings().all()
-    return [BookSummary(**row) for row in rows]
+    rows = session.execute(stmt, {"after": page.after or 0, "limit": page.limit}).mappings().all()
+    books = [BookSummary(**row) for row in rows]
+    set_next_cursor(response, books, page)
+    return books
 
     # En python ** permet de décompresser un dictionnaire en arguments nommés.
 
@@ -0,0 +1,64 @@
+import dataclasses
+import functools
+from enum import Enum
+
+from fastapi import Query
+from pydantic import BaseModel
+from sqlalchemy import Select, inspect, select
+from sqlalchemy.orm import Bundle
+
+
+class LoadMode(str, Enum):
+    # Colonnes du schéma seulement, dans des objets légers (voir read_rows)
+    columns = "columns"
+    # Objets ORM complets : toutes les colonnes, identity map, suivi des modifications
+    orm = "orm"
+
+
+def load_mode(
+    load: LoadMode = Query(LoadMode.columns, description="Load only the schema's columns or full ORM objects"),
+) -> LoadMode:
+    return load
+
+
+class _RowBundle(Bundle):
+    # Un Bundle regroupe des colonnes ; create_row_processor décide de l'objet construit par ligne
+    def __init__(self, name: str, row_class: type, *columns) -> None:
+        super().__init__(name, *columns)
+        self.row_class = row_class
+
+    def create_row_processor(self, query, procs, labels):
+        row_class = self.row_class
+
+        def proc(row):
+            return row_class(*[getter(row) for getter in procs])
+
+        return proc
+
+
+@functools.cache
+def row_class(schema: type[BaseModel], model: type) -> type:
+    """A __slots__ dataclass with the fields of schema, e.g. BookOutRow(id, title, pages, author_id)."""
+    columns = inspect(model).columns
+    for name, field in schema.model_fields.items():
+        # Pas de relation ni de champ calculé : chaque champ doit être une colonne de la table
+        if name not in columns:
+            raise ValueError(f"{schema.__name__}.{name} is not a column of {model.__name__}")
+    return dataclasses.make_dataclass(f"{schema.__name__}Row", list(schema.model_fields), slots=True)
+
+
+def read_rows(schema: type[BaseModel], model: type) -> Select:
+    """SELECT only the columns of model used by schema; each result is a row_class(schema, model).
+
+    session.scalars(read_rows(BookOut, Book)) returns BookOutRow objects: one small object per
+    row, no ORM instance, nothing added to the session's identity map, no change tracking.
+    For read-only routes only: modifying a row object does not write anything.
+    """
+    cls = row_class(schema, model)
+    return select(_RowBundle(cls.__name__, cls, *schema_columns(schema, model)))
+
+
+def schema_columns(schema: type[BaseModel], model: type) -> list:
+    """Columns of model behind the fields of schema, in the schema's order (e.g. for RETURNING)."""
+    row_class(schema, model)  # vérifie que chaque champ est une colonne
+    return [getattr(model, name) for name in schema.model_fields]
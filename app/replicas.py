@@ -0,0 +1,117 @@
+import itertools
+import os
+import threading
+import time
+from contextvars import ContextVar
+from http.cookies import SimpleCookie
+
+from sqlalchemy.pool import QueuePool
+
+# "round_robin" : chaque réplique à tour de rôle
+# "least_connections" : la réplique qui a le moins de connexions en cours d'utilisation
+REPLICA_STRATEGY = os.getenv("DB_REPLICA_STRATEGY", "round_robin")
+
+# Après une écriture, le client lit sur le primaire pendant ce délai (secondes) : une réplique
+# peut avoir un peu de retard et ne pas encore montrer ce qu'il vient d'écrire
+REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", "5"))
+
+READ_PRIMARY_COOKIE = "read_primary_until"
+# Le client peut aussi demander explicitement une lecture sur le primaire
+READ_PRIMARY_HEADER = b"x-read-primary"
+
+# Décidé par le middleware pour chaque requête HTTP, lu par get_session et ndjson_response
+_read_from_replica: ContextVar[bool] = ContextVar("read_from_replica", default=False)
+# GET envoyé au primaire par le cookie ou X-Read-Primary : le client veut relire ce qu'il vient d'écrire
+_pinned_to_primary: ContextVar[bool] = ContextVar("pinned_to_primary", default=False)
+
+
+def reads_from_replica() -> bool:
+    return _read_from_replica.get()
+
+
+def pinned_to_primary() -> bool:
+    return _pinned_to_primary.get()
+
+
+def replica_may_lag(since: float | None) -> bool:
+    """True if a write seen at `since` (time.monotonic()) may still be missing on a replica.
+
+    Caches filled from a replica session use it: a value read just after an invalidation
+    can be the old one, and would then stay in the cache for its whole TTL.
+    """
+    return since is not None and time.monotonic() - since < REPLICA_STICKY_SECONDS
+
+
+class ReplicaSet:
+    """Read replicas of the primary database and the choice of one for each session."""
+
+    def __init__(self, engines: list, strategy: str = REPLICA_STRATEGY) -> None:
+        if strategy not in ("round_robin", "least_connections"):
+            raise ValueError(f"Unknown replica strategy: {strategy}")
+        self.engines = engines
+        self.strategy = strategy
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def __bool__(self) -> bool:
+        return bool(self.engines)
+
+    def pick(self):
+        if self.strategy == "least_connections":
+            return min(self.engines, key=_in_use)
+        with self._lock:
+            return self.engines[next(self._next) % len(self.engines)]
+
+
+def _in_use(engine) -> int:
+    # Moteur async : le pool est celui du moteur sync sous-jacent
+    pool = getattr(engine, "sync_engine", engine).pool
+    return pool.checkedout() if isinstance(pool, QueuePool) else 0
+
+
+def _wants_primary(scope) -> bool:
+    headers = dict(scope["headers"])
+    if headers.get(READ_PRIMARY_HEADER, b"").lower() in (b"1", b"true", b"yes", b"on"):
+        return True
+    cookie = SimpleCookie(headers.get(b"cookie", b"").decode("latin-1"))
+    morsel = cookie.get(READ_PRIMARY_COOKIE)
+    try:
+        return morsel is not None and float(morsel.value) > time.time()
+    except ValueError:
+        return False
+
+
+class ReplicaRoutingMiddleware:
+    """Send GET / HEAD requests to the read replicas, everything else to the primary.
+
+    A successful write sets a short-lived cookie: the same client then reads from the primary
+    for DB_REPLICA_STICKY_SECONDS (read-your-writes). X-Read-Primary: true forces the primary.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] in ("GET", "HEAD"):
+            primary = _wants_primary(scope)
+            token = _read_from_replica.set(not primary)
+            pinned_token = _pinned_to_primary.set(primary)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _pinned_to_primary.reset(pinned_token)
+                _read_from_replica.reset(token)
+            return
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = time.time() + REPLICA_STICKY_SECONDS
+                cookie = f"{READ_PRIMARY_COOKIE}={until:.3f}; Max-Age={int(REPLICA_STICKY_SECONDS) + 1}; Path=/; HttpOnly"
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -0,0 +1,263 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+from typing import Protocol
+from urllib.parse import parse_qsl, urlencode
+
+from app.db import has_replicas, uses_replica
+from app.replicas import pinned_to_primary, replica_may_lag
+from app.written_tables import on_tables_committed
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "256"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+# "false" : toutes les requêtes vont jusqu'à la route (mesures sans cache, débogage)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    headers: tuple[tuple[bytes, bytes], ...]
+
+
+class CacheBackend(Protocol):
+    """Storage of the response cache: an in-process LRU by default, swappable (tests, shared store)."""
+
+    def get(self, key: str) -> CachedResponse | None: ...
+
+    def set(self, key: str, value: CachedResponse, tables: frozenset[str]) -> None: ...
+
+    def invalidate(self, tables: Iterable[str]) -> None: ...
+
+    def clear(self) -> None: ...
+
+
+class MemoryBackend:
+    """LRU + TTL, with an index table name → keys so a write only drops the pages that read it."""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._keys_by_table: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, tables = entry
+            if expires_at < time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: CachedResponse, tables: frozenset[str]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value, tables)
+            self._entries.move_to_end(key)
+            for table in tables:
+                self._keys_by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        with self._lock:
+            for table in tables:
+                for key in self._keys_by_table.pop(table, set()):
+                    self._drop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    # Appelée avec le verrou déjà pris
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[2]:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+
+
+class ResponseCache:
+    def __init__(self, backend: CacheBackend | None = None, enabled: bool = RESPONSE_CACHE_ENABLED) -> None:
+        self.backend: CacheBackend = backend or MemoryBackend()
+        # Modifiable à chaud (le benchmark mesure chaque route avec et sans cache)
+        self.enabled = enabled
+        # Une "génération" par table, incrémentée à chaque invalidation : une réponse calculée
+        # pendant qu'une écriture était validée n'est pas mise en cache (elle peut être périmée)
+        self._generations: dict[str, int] = {}
+        # Dernière invalidation de chaque table (time.monotonic()), pour les lectures sur réplique
+        self._invalidated_at: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generation(self, tables: frozenset[str]) -> tuple[int, ...]:
+        with self._lock:
+            return tuple(self._generations.get(table, 0) for table in sorted(tables))
+
+    def invalidate(self, tables: Iterable[str]) -> None:
+        tables = set(tables)
+        now = time.monotonic()
+        with self._lock:
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                self._invalidated_at[table] = now
+        self.backend.invalidate(tables)
+
+    def last_invalidated(self, tables: frozenset[str]) -> float | None:
+        with self._lock:
+            return max((self._invalidated_at[table] for table in tables if table in self._invalidated_at), default=None)
+
+    def record(self, hit: bool) -> None:
+        # Sous le verrou : plusieurs requêtes peuvent compter en même temps (threads, workers ASGI)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict[str, int | float]:
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {"hit": hits, "miss": misses, "hit_ratio": hits / total if total else 0.0}
+
+
+response_cache = ResponseCache()
+
+
+def strong_etag(body: bytes) -> str:
+    # ETag fort : deux réponses ont le même ETag seulement si leurs octets sont identiques
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match utilise la comparaison faible : on ignore un éventuel préfixe W/
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in (value.removeprefix("W/") for value in candidates)
+
+
+def cache_key(path: str, params: list[tuple[str, str]]) -> str:
+    # Paramètres triés : ?limit=10&after=5 et ?after=5&limit=10 partagent la même entrée
+    return f"{path}?{urlencode(sorted(params))}"
+
+
+def _is_stream(params: list[tuple[str, str]]) -> bool:
+    # Mêmes valeurs « vraies » que le booléen de keyset_params
+    return any(name == "stream" and value.lower() in ("1", "true", "yes", "on") for name, value in params)
+
+
+TablesRead = Iterable[str] | Callable[[list[tuple[str, str]]], Iterable[str]]
+
+
+class ResponseCacheMiddleware:
+    """Cache the JSON bytes of read-mostly GET routes and answer If-None-Match with 304.
+
+    routes maps a path to the tables its response is built from (or to a function of the
+    query parameters returning them). A commit that writes one
+    of these tables drops the cached pages of that route only. Streaming requests
+    (stream=true) are never cached.
+
+    With read replicas: a request pinned to the primary (read-your-writes) neither reads nor
+    fills the cache, and a page read from a replica is not stored during
+    DB_REPLICA_STICKY_SECONDS after a write to its tables (the replica may not have it yet).
+    """
+
+    def __init__(self, app, routes: dict[str, TablesRead]) -> None:
+        self.app = app
+        self.routes = routes
+        self.cache = response_cache
+
+    async def __call__(self, scope, receive, send):
+        tables_read = self.routes.get(scope["path"]) if scope["type"] == "http" else None
+        if tables_read is None or scope["method"] != "GET" or not self.cache.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        params = parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True)
+        # Le client vient d'écrire : une page en cache (lue sur une réplique) peut ne pas le montrer.
+        # Sans réplique, tout est lu sur le primaire : le cache reste utilisable.
+        if _is_stream(params) or (pinned_to_primary() and has_replicas()):
+            await self.app(scope, receive, send)
+            return
+
+        # Les tables lues peuvent dépendre des paramètres (filtre sur les tags, app/book_query.py)
+        tables = frozenset(tables_read(params) if callable(tables_read) else tables_read)
+
+        key = cache_key(scope["path"], params)
+        if_none_match = next(
+            (value.decode("latin-1") for name, value in scope["headers"] if name == b"if-none-match"), None
+        )
+
+        cached = self.cache.backend.get(key)
+        if cached is not None:
+            self.cache.record(hit=True)
+            await self._send(send, cached, if_none_match, b"HIT")
+            return
+        self.cache.record(hit=False)
+
+        # On garde la réponse en mémoire au lieu de l'envoyer : l'ETag est calculé sur le corps
+        # complet et doit partir dans les en-têtes, avant le corps
+        generation = self.cache.generation(tables)
+        start = None
+        chunks = []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(chunks)
+        if start["status"] != 200:
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        # content-length est recalculé à l'envoi (une réponse 304 n'a pas de corps)
+        headers = tuple(
+            (name, value) for name, value in start.get("headers", []) if name not in (b"content-length", b"etag")
+        )
+        entry = CachedResponse(body=body, etag=strong_etag(body), headers=headers)
+        stale_replica = uses_replica() and replica_may_lag(self.cache.last_invalidated(tables))
+        if self.cache.generation(tables) == generation and not stale_replica:
+            self.cache.backend.set(key, entry, tables)
+        await self._send(send, entry, if_none_match, b"MISS")
+
+    @staticmethod
+    async def _send(send, entry: CachedResponse, if_none_match: str | None, cache_status: bytes) -> None:
+        not_modified = if_none_match is not None and etag_matches(if_none_match, entry.etag)
+        headers = [
+            *entry.headers,
+            (b"etag", entry.etag.encode()),
+            # no-cache : le client peut garder la réponse mais doit la revalider (If-None-Match)
+            (b"cache-control", b"no-cache"),
+            (b"x-cache", cache_status),
+        ]
+        body = b"" if not_modified else entry.body
+        if not not_modified:
+            headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 304 if not_modified else 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+# Invalidation : après chaque commit, on vide les entrées des routes qui lisent une table écrite
+# (voir app/written_tables.py). Comme pour app/lookup_cache.py, seules les écritures de ce
+# processus sont vues : RESPONSE_CACHE_TTL borne la péremption pour les autres workers.
+on_tables_committed(response_cache.invalidate)
@@ -1,6 +1,9 @@
-from datetime import date
+from datetime import date, datetime
+from typing import Generic, Literal, TypeVar
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+T = TypeVar("T")
 
 
 class AuthorCreate(BaseModel):
@@ -16,9 +19,19 @@ class AuthorCreate(BaseModel):
 class AuthorUpdate(BaseModel):
     name: str | None = Field(None, min_length=2, max_length=100)
 
+    # Champ absent = inchangé ; {"name": null} n'est pas une valeur possible (colonne NOT NULL)
+    @field_validator("name", mode="before")
+    @classmethod
+    def name_not_null(cls, value):
+        if value is None:
+            raise ValueError("name cannot be null")
+        return value
+
 
 class AuthorOut(AuthorCreate):
     id: int
+    # Version de la ligne, à renvoyer dans If-Match pour modifier l'auteur (aussi dans l'en-tête ETag)
+    version: int
 
     model_config = {
         "from_attributes": True,
@@ -92,3 +105,98 @@ class BookWithTags(BaseModel):
     tags: list[TagOut]
 
     model_config = {"from_attributes": True}
+
+
+# Résultat d'un import en masse : une entrée par ligne envoyée, dans le même ordre
+class BulkRowResult(BaseModel):
+    index: int
+    id: int | None = None
+    error: str | None = None
+
+
+class BulkResult(BaseModel):
+    inserted: int
+    failed: int
+    results: list[BulkRowResult]
+
+
+class BookTagAssign(BaseModel):
+    book_id: int = Field(..., gt=0, description="Existing book id")
+    tag_name: str = Field(..., min_length=1, max_length=50, description="Created if it does not exist")
+    tagged_at: date = Field(default_factory=date.today)
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {"book_id": 1, "tag_name": "history", "tagged_at": "2024-05-01"}
+        }
+    }
+
+    # Accepte aussi la forme compacte [book_id, tag_name, tagged_at]
+    @model_validator(mode="before")
+    @classmethod
+    def from_tuple(cls, data):
+        if isinstance(data, list | tuple):
+            return dict(zip(("book_id", "tag_name", "tagged_at"), data))
+        return data
+
+
+# Pas d'id de ligne insérée ici (la paire livre-tag est la clé) : tag_id = tag associé au livre
+class BookTagRowResult(BaseModel):
+    index: int
+    tag_id: int | None = None
+    error: str | None = None
+
+
+class BookTagBulkResult(BaseModel):
+    upserted: int
+    failed: int
+    tags_created: int
+    results: list[BookTagRowResult]
+
+
+# Résultat de /search : un livre (label = titre) ou un auteur (label = nom)
+class SearchHit(BaseModel):
+    kind: Literal["book", "author"]
+    id: int
+    label: str
+    score: float
+
+
+class AuthorStats(BaseModel):
+    author_id: int
+    author_name: str
+    books: int
+    total_pages: int
+
+
+class PublisherStats(BaseModel):
+    publisher_id: int
+    publisher_name: str
+    books: int
+    total_pages: int
+
+
+class TagStats(BaseModel):
+    tag_id: int
+    tag_name: str
+    books: int
+    total_pages: int
+
+
+class TaggingActivity(BaseModel):
+    day: date
+    taggings: int
+    books: int
+
+
+# Âge des statistiques : refreshed_at est None si la vue n'a jamais été rafraîchie
+class StatsFreshness(BaseModel):
+    materialized: bool
+    refreshed_at: datetime | None
+    stale_seconds: float | None
+    pending_writes: bool
+
+
+class StatsResponse(BaseModel, Generic[T]):
+    freshness: StatsFreshness
+    items: list[T]
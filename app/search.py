@@ -0,0 +1,189 @@
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from enum import Enum
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, literal, literal_column, or_, select
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Session
+
+from app.db import get_session, uses_replica
+from app.models import Author, Book
+from app.replicas import replica_may_lag
+from app.schemas import SearchHit
+from app.written_tables import on_tables_committed
+
+router = APIRouter(tags=["Recherche"])
+
+SEARCH_FALLBACK_TTL = float(os.getenv("SEARCH_FALLBACK_TTL", "60"))
+# Seuil de similarité trigramme (même valeur par défaut que pg_trgm)
+SIMILARITY_THRESHOLD = 0.3
+
+_WORD = re.compile(r"\w+")
+
+
+class SearchKind(str, Enum):
+    all = "all"
+    book = "book"
+    author = "author"
+
+
+# Type de résultat → (clé primaire, colonne cherchée, table)
+_TARGETS = {
+    SearchKind.book: (Book.id, Book.title, "books"),
+    SearchKind.author: (Author.id, Author.name, "authors"),
+}
+
+
+def _targets(kind: SearchKind):
+    return [(target, *_TARGETS[target]) for target in _TARGETS if kind in (SearchKind.all, target)]
+
+
+# --- PostgreSQL : tsvector + pg_trgm (colonnes et index créés par app/models.py / migration 2) ---
+
+def _postgres_search(session: Session, q: str, kind: SearchKind, limit: int) -> list[SearchHit]:
+    words = _WORD.findall(q)
+    if not words:
+        return []
+    # Recherche en cours de frappe : chaque mot est un préfixe ("fle" trouve "fleurs").
+    # \w+ ne garde que lettres et chiffres : aucun opérateur de tsquery ne passe.
+    tsquery = func.to_tsquery("simple", func.app_unaccent(" & ".join(f"{word}:*" for word in words)))
+    q_norm = func.app_unaccent(func.lower(q))
+
+    hits = []
+    for target, id_column, label_column, table in _targets(kind):
+        vector = literal_column(f"{table}.search_vector", type_=TSVECTOR)
+        # Même expression que l'index trigramme : sinon PostgreSQL ne peut pas l'utiliser
+        label_norm = func.app_unaccent(func.lower(label_column))
+        score = func.ts_rank(vector, tsquery) + func.word_similarity(q_norm, label_norm)
+        stmt = (
+            select(
+                literal(target.value).label("kind"),
+                id_column.label("id"),
+                label_column.label("label"),
+                score.label("score"),
+            )
+            # @@ : index GIN du tsvector ; <% : index GIN trigramme (mot proche, fautes de frappe)
+            .where(or_(vector.op("@@")(tsquery), q_norm.op("<%")(label_norm)))
+            .order_by(score.desc(), id_column)
+            .limit(limit)
+        )
+        hits += [SearchHit(**row._mapping) for row in session.execute(stmt)]
+    return sorted(hits, key=lambda hit: -hit.score)[:limit]
+
+
+# --- Autres bases (SQLite des tests) : index en mémoire, en Python pur ---
+
+def normalize(value: str) -> str:
+    # "À l'ombre" → "a l'ombre" : on décompose les lettres accentuées et on retire les accents
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def trigrams(value: str) -> set[str]:
+    # Découpage de pg_trgm : chaque mot est entouré de deux espaces devant et un derrière
+    grams = set()
+    for word in _WORD.findall(value):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a: set[str], b: set[str]) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+@dataclass(frozen=True)
+class IndexedLabel:
+    kind: SearchKind
+    id: int
+    label: str
+    words: tuple[str, ...]
+    word_grams: tuple[frozenset[str], ...]
+
+
+class MemorySearchIndex:
+    """Search index kept in memory when the database has no full-text search (SQLite).
+
+    Rebuilt on the next search after a commit writing books / authors in this process, or after
+    SEARCH_FALLBACK_TTL seconds (writes from other processes).
+    """
+
+    def __init__(self, ttl: float = SEARCH_FALLBACK_TTL) -> None:
+        self.ttl = ttl
+        self._entries: list[IndexedLabel] | None = None
+        self._built_at = 0.0
+        self._invalidated_at: float | None = None
+        self._lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries = None
+            self._invalidated_at = time.monotonic()
+
+    def _load(self, session: Session) -> list[IndexedLabel]:
+        with self._lock:
+            if self._entries is not None and time.monotonic() - self._built_at < self.ttl:
+                return self._entries
+        entries = []
+        for target, id_column, label_column, _ in _targets(SearchKind.all):
+            for row_id, label in session.execute(select(id_column, label_column)):
+                normalized = normalize(label)
+                words = tuple(_WORD.findall(normalized))
+                word_grams = tuple(frozenset(trigrams(word)) for word in words)
+                entries.append(IndexedLabel(target, row_id, label, words, word_grams))
+        # Construit sur une réplique juste après une écriture : peut-être sans elle, on ne le garde pas
+        if uses_replica() and replica_may_lag(self._invalidated_at):
+            return entries
+        with self._lock:
+            self._entries, self._built_at = entries, time.monotonic()
+        return entries
+
+    def search(self, session: Session, q: str, kind: SearchKind, limit: int) -> list[SearchHit]:
+        words = _WORD.findall(normalize(q))
+        if not words:
+            return []
+        grams = [trigrams(word) for word in words]
+        hits = []
+        for entry in self._load(session):
+            if kind is not SearchKind.all and entry.kind is not kind:
+                continue
+            # Part des mots cherchés qui commencent un mot du libellé (comme "mot:*" en tsquery)
+            prefix = sum(any(word.startswith(w) for word in entry.words) for w in words) / len(words)
+            # Proche de word_similarity de pg_trgm : chaque mot cherché est comparé au mot
+            # le plus ressemblant du libellé ("prust" trouve "Proust")
+            fuzzy = sum(max((similarity(g, w) for w in entry.word_grams), default=0.0) for g in grams) / len(grams)
+            if prefix == 1 or fuzzy >= SIMILARITY_THRESHOLD:
+                hits.append(SearchHit(kind=entry.kind.value, id=entry.id, label=entry.label, score=prefix + fuzzy))
+        hits.sort(key=lambda hit: (-hit.score, hit.kind, hit.id))
+        return hits[:limit]
+
+
+memory_index = MemorySearchIndex()
+
+
+# Après le commit (app/written_tables.py) : couvre l'unité de travail comme les INSERT / UPDATE
+# exécutés directement (imports en masse), qui ne déclenchent pas les événements des mappers
+def _invalidate_memory_index(tables: set[str]) -> None:
+    if tables & {"books", "authors"}:
+        memory_index.invalidate()
+
+
+on_tables_committed(_invalidate_memory_index)
+
+
+@router.get("/search", response_model=list[SearchHit])
+def search(
+    q: str = Query(..., min_length=1, max_length=100, description="Words typed so far"),
+    kind: SearchKind = Query(SearchKind.all, description="Search books, authors or both"),
+    limit: int = Query(20, ge=1, le=100),
+    session: Session = Depends(get_session),
+) -> list[SearchHit]:
+    """Ranked search over book titles and author names (prefix + accent and typo tolerant)."""
+    if session.get_bind().dialect.name == "postgresql":
+        return _postgres_search(session, q, kind, limit)
+    return memory_index.search(session, q, kind, limit)
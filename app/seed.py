@@ -0,0 +1,318 @@
+"""Demo dataset and scalable synthetic data generator.
+
+Usage :
+    python -m app.seed --authors 10000 --books-per-author 1-20 --reset
+
+The synthetic data only depends on the configuration and on --seed: two runs with the same
+arguments produce exactly the same rows. PostgreSQL is loaded with COPY, other databases
+with batched multi-row INSERTs.
+"""
+
+import argparse
+import random
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlalchemy import Engine, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app.migrate import migrate, schema_migrations
+from app.models import Author, Base, Book, BookTag, Publisher, Tag
+
+
+def seed_demo_if_empty(session: Session) -> bool:
+    """Insert the demo dataset unless there is already an author. Returns True if inserted."""
+    if session.scalar(select(func.count(Author.id))):
+        return False
+    seed_demo(session)
+    return True
+
+
+def seed_demo(session: Session) -> None:
+    """Insert the small hand-written dataset used in the course."""
+    publishers = [
+        Publisher(name="Gallimard"),          # 0
+        Publisher(name="Addison-Wesley"),      # 1
+        Publisher(name="Allen & Unwin"),       # 2
+        Publisher(name="Cambridge UP"),        # 3
+    ]
+    session.add_all(publishers)
+    session.flush()
+
+    authors = [
+        # Informatique
+        Author(name="Ada Lovelace"),        # 0
+        Author(name="Grace Hopper"),         # 1
+        Author(name="Alan Turing"),          # 2
+        Author(name="Donald Knuth"),         # 3
+        Author(name="Linus Torvalds"),       # 4
+        # Littérature classique
+        Author(name="Marcel Proust"),        # 5
+        Author(name="J.R.R. Tolkien"),       # 6
+        Author(name="Victor Hugo"),          # 7
+        Author(name="Albert Camus"),         # 8
+    ]
+    session.add_all(authors)
+    session.flush()
+
+    books = [
+        # Informatique
+        Book(title="Notes on the Analytical Engine", pages=120, author_id=authors[0].id, publisher_id=publishers[3].id),
+        Book(title="Compilers and Cobol", pages=220, author_id=authors[1].id, publisher_id=publishers[1].id),
+        Book(title="Computing Machinery and Intelligence", pages=90, author_id=authors[2].id, publisher_id=publishers[3].id),
+        Book(title="The Art of Computer Programming Vol. 1", pages=672, author_id=authors[3].id, publisher_id=publishers[1].id),
+        Book(title="The Art of Computer Programming Vol. 2", pages=784, author_id=authors[3].id, publisher_id=publishers[1].id),
+        Book(title="Just for Fun", pages=280, author_id=authors[4].id),
+        # Proust — À la recherche du temps perdu
+        Book(title="Du côté de chez Swann", pages=531, author_id=authors[5].id, publisher_id=publishers[0].id),
+        Book(title="À l'ombre des jeunes filles en fleurs", pages=619, author_id=authors[5].id, publisher_id=publishers[0].id),
+        Book(title="Le Temps retrouvé", pages=524, author_id=authors[5].id, publisher_id=publishers[0].id),
+        # Tolkien
+        Book(title="The Fellowship of the Ring", pages=423, author_id=authors[6].id, publisher_id=publishers[2].id),
+        Book(title="The Two Towers", pages=352, author_id=authors[6].id, publisher_id=publishers[2].id),
+        Book(title="The Return of the King", pages=416, author_id=authors[6].id, publisher_id=publishers[2].id),
+        # Autres classiques
+        Book(title="Les Misérables", pages=1900, author_id=authors[7].id, publisher_id=publishers[0].id),
+        Book(title="L'Étranger", pages=186, author_id=authors[8].id, publisher_id=publishers[0].id),
+    ]
+    session.add_all(books)
+    session.flush()
+
+    tags = [
+        Tag(name="algorithms"),         # 0
+        Tag(name="history"),            # 1
+        Tag(name="ai"),                 # 2
+        Tag(name="compilers"),          # 3
+        Tag(name="operating-systems"),  # 4
+        Tag(name="mathematics"),        # 5
+        Tag(name="classic"),            # 6
+        Tag(name="fantasy"),            # 7
+        Tag(name="fiction"),            # 8
+        Tag(name="french-literature"),  # 9
+    ]
+    session.add_all(tags)
+    session.flush()
+
+    book_tags = [
+        # Informatique
+        BookTag(book_id=books[0].id, tag_id=tags[1].id, tagged_at=date(2024, 1, 10)),
+        BookTag(book_id=books[0].id, tag_id=tags[5].id, tagged_at=date(2024, 1, 10)),
+        BookTag(book_id=books[1].id, tag_id=tags[3].id, tagged_at=date(2024, 2, 15)),
+        BookTag(book_id=books[2].id, tag_id=tags[2].id, tagged_at=date(2024, 3, 5)),
+        BookTag(book_id=books[2].id, tag_id=tags[1].id, tagged_at=date(2024, 3, 5)),
+        BookTag(book_id=books[3].id, tag_id=tags[0].id, tagged_at=date(2024, 4, 20)),
+        BookTag(book_id=books[3].id, tag_id=tags[5].id, tagged_at=date(2024, 4, 20)),
+        BookTag(book_id=books[4].id, tag_id=tags[0].id, tagged_at=date(2024, 4, 21)),
+        BookTag(book_id=books[5].id, tag_id=tags[4].id, tagged_at=date(2024, 5, 1)),
+        BookTag(book_id=books[5].id, tag_id=tags[1].id, tagged_at=date(2024, 5, 1)),
+        # Proust
+        BookTag(book_id=books[6].id, tag_id=tags[6].id, tagged_at=date(2024, 6, 1)),
+        BookTag(book_id=books[6].id, tag_id=tags[9].id, tagged_at=date(2024, 6, 1)),
+        BookTag(book_id=books[6].id, tag_id=tags[8].id, tagged_at=date(2024, 6, 1)),
+        BookTag(book_id=books[7].id, tag_id=tags[6].id, tagged_at=date(2024, 6, 2)),
+        BookTag(book_id=books[7].id, tag_id=tags[9].id, tagged_at=date(2024, 6, 2)),
+        BookTag(book_id=books[8].id, tag_id=tags[6].id, tagged_at=date(2024, 6, 3)),
+        BookTag(book_id=books[8].id, tag_id=tags[9].id, tagged_at=date(2024, 6, 3)),
+        # Tolkien
+        BookTag(book_id=books[9].id,  tag_id=tags[7].id, tagged_at=date(2024, 7, 10)),
+        BookTag(book_id=books[9].id,  tag_id=tags[8].id, tagged_at=date(2024, 7, 10)),
+        BookTag(book_id=books[10].id, tag_id=tags[7].id, tagged_at=date(2024, 7, 11)),
+        BookTag(book_id=books[10].id, tag_id=tags[8].id, tagged_at=date(2024, 7, 11)),
+        BookTag(book_id=books[11].id, tag_id=tags[7].id, tagged_at=date(2024, 7, 12)),
+        BookTag(book_id=books[11].id, tag_id=tags[8].id, tagged_at=date(2024, 7, 12)),
+        # Autres classiques
+        BookTag(book_id=books[12].id, tag_id=tags[6].id, tagged_at=date(2024, 8, 1)),
+        BookTag(book_id=books[12].id, tag_id=tags[9].id, tagged_at=date(2024, 8, 1)),
+        BookTag(book_id=books[13].id, tag_id=tags[6].id, tagged_at=date(2024, 8, 5)),
+        BookTag(book_id=books[13].id, tag_id=tags[9].id, tagged_at=date(2024, 8, 5)),
+        BookTag(book_id=books[13].id, tag_id=tags[8].id, tagged_at=date(2024, 8, 5)),
+    ]
+    session.add_all(book_tags)
+    session.commit()
+
+
+# Mots utilisés pour fabriquer des noms et des titres lisibles (avec des accents,
+# comme dans les données de démonstration)
+FIRST_NAMES = ["Ada", "Alan", "Grace", "Donald", "Marcel", "Victor", "Albert", "Émile", "Hélène", "Zoé", "Léa", "Noël"]
+LAST_NAMES = ["Lovelace", "Turing", "Hopper", "Knuth", "Proust", "Hugo", "Camus", "Zola", "Brontë", "Dumas", "Ferré"]
+TITLE_WORDS = [
+    "ombre", "temps", "machine", "jardin", "été", "mémoire", "château", "algorithme", "rivière",
+    "étranger", "lumière", "forêt", "cœur", "nuit", "compilateur", "océan", "fenêtre", "réseau",
+]
+
+
+@dataclass
+class SeedConfig:
+    authors: int = 1000
+    # Nombre de livres par auteur, tiré uniformément dans [min, max]
+    books_per_author: tuple[int, int] = (1, 20)
+    publishers: int = 50
+    # Part des livres sans éditeur (publisher_id NULL)
+    null_publisher_ratio: float = 0.1
+    tags: int = 100
+    tags_per_book: tuple[int, int] = (0, 5)
+    # tagged_at tiré uniformément entre tagged_from et tagged_from + tagged_days
+    tagged_from: date = date(2020, 1, 1)
+    tagged_days: int = 5 * 365
+    seed: int = 42
+    batch_size: int = 10_000
+
+    @classmethod
+    def for_books(cls, books: int, tags_per_book: int = 3, **overrides) -> "SeedConfig":
+        """About `books` books: 10 per author on average, exactly tags_per_book tags each."""
+        return cls(
+            authors=max(1, books // 10),
+            books_per_author=(10, 10) if books >= 10 else (books, books),
+            tags_per_book=(tags_per_book, tags_per_book),
+            **overrides,
+        )
+
+
+def _batches(rows: Iterable[tuple], size: int) -> Iterator[list[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load(conn, table, columns: list[str], rows: Iterable[tuple], batch_size: int) -> int:
+    count = 0
+    if conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg":
+        # COPY envoie les lignes en flux, sans requête ni paramètre par ligne :
+        # le moyen le plus rapide de charger PostgreSQL. On passe par la connexion psycopg
+        # sous-jacente, dans la même transaction que le reste du remplissage.
+        cursor = conn.connection.driver_connection.cursor()
+        with cursor.copy(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN") as copy:
+            for row in rows:
+                copy.write_row(row)
+                count += 1
+        return count
+
+    # Ailleurs : INSERT avec une liste de paramètres (executemany), par lots
+    for batch in _batches(rows, batch_size):
+        conn.execute(insert(table), [dict(zip(columns, row)) for row in batch])
+        count += len(batch)
+    return count
+
+
+def seed_synthetic(engine: Engine, config: SeedConfig, *, reset: bool = False) -> dict[str, int]:
+    """Generate and bulk load a dataset described by config. Returns the row count per table."""
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+        schema_migrations.drop(bind=engine, checkfirst=True)
+    migrate(engine)
+
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT 1 FROM authors LIMIT 1")).first():
+            raise ValueError("The database already contains data, use reset=True (--reset) to replace it")
+
+    rng = random.Random(config.seed)
+    tags_min, tags_max = config.tags_per_book
+    if tags_max > config.tags:
+        raise ValueError(f"tags_per_book max ({tags_max}) is larger than the number of tags ({config.tags})")
+
+    # Les ids sont fixés ici (1..N) : les livres et book_tags peuvent référencer auteurs et
+    # livres sans relire la base.
+    def publishers():
+        for i in range(1, config.publishers + 1):
+            yield i, f"Éditions {rng.choice(LAST_NAMES)} {i}"
+
+    def authors():
+        for i in range(1, config.authors + 1):
+            yield i, f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+
+    book_count = 0
+
+    def books():
+        nonlocal book_count
+        for author_id in range(1, config.authors + 1):
+            for _ in range(rng.randint(*config.books_per_author)):
+                book_count += 1
+                publisher_id = (
+                    None
+                    if not config.publishers or rng.random() < config.null_publisher_ratio
+                    else rng.randint(1, config.publishers)
+                )
+                title = " ".join(rng.choices(TITLE_WORDS, k=rng.randint(2, 5))).capitalize()
+                yield book_count, f"{title} {book_count}", rng.randint(20, 2000), author_id, publisher_id
+
+    def book_tags():
+        for book_id in range(1, book_count + 1):
+            for tag_id in rng.sample(range(1, config.tags + 1), rng.randint(tags_min, tags_max)):
+                tagged_at = config.tagged_from + timedelta(days=rng.randint(0, config.tagged_days))
+                yield book_id, tag_id, tagged_at
+
+    counts = {}
+    with engine.begin() as conn:
+        counts["publishers"] = _load(conn, Publisher.__table__, ["id", "name"], publishers(), config.batch_size)
+        counts["authors"] = _load(conn, Author.__table__, ["id", "name"], authors(), config.batch_size)
+        counts["tags"] = _load(
+            conn, Tag.__table__, ["id", "name"], ((i, f"tag-{i}") for i in range(1, config.tags + 1)), config.batch_size
+        )
+        counts["books"] = _load(
+            conn, Book.__table__, ["id", "title", "pages", "author_id", "publisher_id"], books(), config.batch_size
+        )
+        counts["book_tags"] = _load(
+            conn, BookTag.__table__, ["book_id", "tag_id", "tagged_at"], book_tags(), config.batch_size
+        )
+
+        if conn.dialect.name == "postgresql":
+            # Ids insérés explicitement : on recale les séquences, sinon le prochain
+            # INSERT de l'API recevrait id = 1 et violerait la clé primaire
+            for table in ("publishers", "authors", "tags", "books"):
+                conn.execute(
+                    text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}")
+                )
+    return counts
+
+
+def _int_range(value: str) -> tuple[int, int]:
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def main(argv: list[str] | None = None) -> None:
+    defaults = SeedConfig()
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic data.")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL")
+    parser.add_argument("--authors", type=int, default=defaults.authors)
+    parser.add_argument("--books-per-author", type=_int_range, default=defaults.books_per_author, help="min-max")
+    parser.add_argument("--publishers", type=int, default=defaults.publishers)
+    parser.add_argument("--null-publisher-ratio", type=float, default=defaults.null_publisher_ratio)
+    parser.add_argument("--tags", type=int, default=defaults.tags)
+    parser.add_argument("--tags-per-book", type=_int_range, default=defaults.tags_per_book, help="min-max")
+    parser.add_argument("--tagged-from", type=date.fromisoformat, default=defaults.tagged_from)
+    parser.add_argument("--tagged-days", type=int, default=defaults.tagged_days)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--batch-size", type=int, default=defaults.batch_size)
+    parser.add_argument("--reset", action="store_true", help="Drop and recreate all tables first")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.database_url)
+    else:
+        from app.db import engine
+
+    config = SeedConfig(**{
+        name: getattr(args, name) for name in SeedConfig.__dataclass_fields__
+    })
+    start = time.perf_counter()
+    try:
+        counts = seed_synthetic(engine, config, reset=args.reset)
+    except ValueError as exc:
+        parser.error(str(exc))
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"{counts} — {total} rows in {elapsed:.1f}s ({total / elapsed:,.0f} rows/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
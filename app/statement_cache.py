@@ -0,0 +1,36 @@
+import threading
+from collections import Counter
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# SQLAlchemy garde un cache des requêtes déjà compilées en SQL (taille : query_cache_size).
+# Chaque exécution indique si la compilation a été évitée :
+#   CACHE_HIT         : SQL réutilisé, aucune compilation Python
+#   CACHE_MISS        : requête compilée puis mise en cache
+#   CACHING_DISABLED  : cache désactivé (query_cache_size=0)
+#   NO_CACHE_KEY      : requête impossible à mettre en cache (ou exec_driver_sql)
+_counts: Counter = Counter()
+_lock = threading.Lock()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_cache_status(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    status = context.cache_hit
+    with _lock:
+        _counts[getattr(status, "name", str(status))] += 1
+
+
+def compiled_cache_snapshot() -> dict[str, int | float]:
+    with _lock:
+        counts = dict(_counts)
+    hits, misses = counts.get("CACHE_HIT", 0), counts.get("CACHE_MISS", 0)
+    return {
+        "hit": hits,
+        "miss": misses,
+        "disabled": counts.get("CACHING_DISABLED", 0),
+        "no_cache_key": counts.get("NO_CACHE_KEY", 0),
+        "hit_ratio": hits / (hits + misses) if hits + misses else 0.0,
+    }
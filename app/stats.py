@@ -0,0 +1,231 @@
+"""Statistics endpoints backed by materialized views.
+
+Usage (refresh once, e.g. from cron when STATS_REFRESH_INTERVAL=0) :
+    python -m app.stats [--database-url URL]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import threading
+from datetime import date, datetime, timezone
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlalchemy import Date, Engine, Integer, String, column, select, table, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from app.db import get_session
+from app.models import STATS_VIEWS, StatsRefresh
+from app.pagination import DEFAULT_LIMIT, MAX_LIMIT, KeysetParams, paginate, set_next_cursor
+from app.schemas import AuthorStats, PublisherStats, StatsFreshness, StatsResponse, TaggingActivity, TagStats
+from app.written_tables import on_tables_committed
+
+logger = logging.getLogger("app.stats")
+
+# Toutes les STATS_REFRESH_INTERVAL secondes, chaque worker rafraîchit les vues s'il a vu passer
+# une écriture, ou si elles ont plus de STATS_MAX_AGE secondes (écritures des autres workers).
+# STATS_REFRESH_INTERVAL=0 : pas de tâche de fond (rafraîchir avec python -m app.stats).
+STATS_REFRESH_INTERVAL = float(os.getenv("STATS_REFRESH_INTERVAL", "30"))
+STATS_MAX_AGE = float(os.getenv("STATS_MAX_AGE", "600"))
+
+# Un seul worker rafraîchit à la fois, les autres passent leur tour
+STATS_LOCK_KEY = 710_024_002
+
+# Tables lues par les vues de app/models.py (STATS_VIEWS)
+STATS_SOURCE_TABLES = {"authors", "publishers", "books", "tags", "book_tags"}
+
+router = APIRouter(prefix="/stats", tags=["Statistiques"])
+
+# Les vues ne sont pas des modèles ORM : table() / column() suffisent pour écrire les SELECT
+author_stats = table(
+    "author_stats",
+    column("author_id", Integer),
+    column("author_name", String),
+    column("books", Integer),
+    column("total_pages", Integer),
+)
+publisher_stats = table(
+    "publisher_stats",
+    column("publisher_id", Integer),
+    column("publisher_name", String),
+    column("books", Integer),
+    column("total_pages", Integer),
+)
+tag_stats = table(
+    "tag_stats",
+    column("tag_id", Integer),
+    column("tag_name", String),
+    column("books", Integer),
+    column("total_pages", Integer),
+)
+tagging_activity = table(
+    "tagging_activity",
+    column("day", Date),
+    column("taggings", Integer),
+    column("books", Integer),
+)
+
+# Levé après un commit qui touche une table source, baissé au début d'un rafraîchissement
+_pending_writes = threading.Event()
+
+
+def _mark_pending(tables: set[str]) -> None:
+    if tables & STATS_SOURCE_TABLES:
+        _pending_writes.set()
+
+
+on_tables_committed(_mark_pending)
+
+
+def refresh_stats(engine: Engine) -> list[str]:
+    """Refresh every materialized view (PostgreSQL). Returns the refreshed views.
+
+    Returns [] on other databases (plain views are always up to date) or when another
+    process is already refreshing.
+    """
+    if engine.dialect.name != "postgresql":
+        _pending_writes.clear()
+        return []
+
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        if not conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": STATS_LOCK_KEY}):
+            return []
+        try:
+            # Baissé avant le calcul : une écriture validée pendant le REFRESH le relèvera
+            _pending_writes.clear()
+            for view in STATS_VIEWS:
+                # Les données sont au moins aussi récentes que le début du REFRESH
+                started_at = datetime.now(timezone.utc)
+                # CONCURRENTLY : les lectures ne sont pas bloquées pendant le calcul
+                conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}"))
+                conn.execute(
+                    pg_insert(StatsRefresh)
+                    .values(view=view, refreshed_at=started_at)
+                    .on_conflict_do_update(index_elements=["view"], set_={"refreshed_at": started_at})
+                )
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": STATS_LOCK_KEY})
+    return list(STATS_VIEWS)
+
+
+def refresh_stats_if_needed(engine: Engine) -> list[str]:
+    if engine.dialect.name != "postgresql":
+        return []
+    with Session(engine) as session:
+        refreshed = dict(session.execute(select(StatsRefresh.view, StatsRefresh.refreshed_at)).all())
+    now = datetime.now(timezone.utc)
+    ages = [refreshed.get(view) for view in STATS_VIEWS]
+    too_old = None in ages or any((now - at).total_seconds() > STATS_MAX_AGE for at in ages)
+    if _pending_writes.is_set() or too_old:
+        return refresh_stats(engine)
+    return []
+
+
+async def refresh_stats_periodically(engine: Engine) -> None:
+    while True:
+        await asyncio.sleep(STATS_REFRESH_INTERVAL)
+        try:
+            refreshed = await run_in_threadpool(refresh_stats_if_needed, engine)
+        except Exception:
+            # Une erreur passagère (base redémarrée...) ne doit pas arrêter la boucle
+            logger.exception("statistics refresh failed")
+            continue
+        if refreshed:
+            logger.info("statistics refreshed: %s", ", ".join(refreshed))
+
+
+def freshness(session: Session, view: str) -> StatsFreshness:
+    if session.get_bind().dialect.name != "postgresql":
+        # Vue simple : calculée à la lecture
+        return StatsFreshness(materialized=False, refreshed_at=None, stale_seconds=0.0, pending_writes=False)
+    refreshed_at = session.scalar(select(StatsRefresh.refreshed_at).where(StatsRefresh.view == view))
+    return StatsFreshness(
+        materialized=True,
+        refreshed_at=refreshed_at,
+        stale_seconds=(datetime.now(timezone.utc) - refreshed_at).total_seconds() if refreshed_at else None,
+        pending_writes=_pending_writes.is_set(),
+    )
+
+
+def stats_page(
+    limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT, description="Max number of rows"),
+    after: int | None = Query(None, ge=0, description="Return rows with id > after"),
+) -> KeysetParams:
+    return KeysetParams(limit=limit, after=after, stream=False)
+
+
+def _stats_list(session: Session, response: Response, view, key: str, schema, page: KeysetParams) -> StatsResponse:
+    rows = session.execute(paginate(select(view), view.c[key], page)).all()
+    set_next_cursor(response, rows, page, key=lambda row: getattr(row, key))
+    return StatsResponse(
+        freshness=freshness(session, view.name),
+        items=[schema(**row._mapping) for row in rows],
+    )
+
+
+@router.get("/authors", response_model=StatsResponse[AuthorStats])
+def author_statistics(
+    response: Response,
+    page: KeysetParams = Depends(stats_page),
+    session: Session = Depends(get_session),
+) -> StatsResponse[AuthorStats]:
+    return _stats_list(session, response, author_stats, "author_id", AuthorStats, page)
+
+
+@router.get("/publishers", response_model=StatsResponse[PublisherStats])
+def publisher_statistics(
+    response: Response,
+    page: KeysetParams = Depends(stats_page),
+    session: Session = Depends(get_session),
+) -> StatsResponse[PublisherStats]:
+    return _stats_list(session, response, publisher_stats, "publisher_id", PublisherStats, page)
+
+
+@router.get("/tags", response_model=StatsResponse[TagStats])
+def tag_statistics(
+    response: Response,
+    page: KeysetParams = Depends(stats_page),
+    session: Session = Depends(get_session),
+) -> StatsResponse[TagStats]:
+    return _stats_list(session, response, tag_stats, "tag_id", TagStats, page)
+
+
+@router.get("/tagging-activity", response_model=StatsResponse[TaggingActivity])
+def tagging_activity_statistics(
+    since: date | None = Query(None, description="First day (included)"),
+    until: date | None = Query(None, description="Last day (included)"),
+    session: Session = Depends(get_session),
+) -> StatsResponse[TaggingActivity]:
+    stmt = select(tagging_activity).order_by(tagging_activity.c.day)
+    if since is not None:
+        stmt = stmt.where(tagging_activity.c.day >= since)
+    if until is not None:
+        stmt = stmt.where(tagging_activity.c.day <= until)
+    return StatsResponse(
+        freshness=freshness(session, tagging_activity.name),
+        items=[TaggingActivity(**row._mapping) for row in session.execute(stmt)],
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Refresh the statistics materialized views.")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        from sqlalchemy import create_engine
+        engine = create_engine(args.database_url)
+    else:
+        from app.db import engine
+
+    refreshed = refresh_stats(engine)
+    print(f"refreshed: {', '.join(refreshed)}" if refreshed else "nothing refreshed", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
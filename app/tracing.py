@@ -0,0 +1,364 @@
+import functools
+import inspect
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.pool import Pool
+
+# TRACE_EXPORTER : "" (désactivé), "memory" (tests) ou "file" (une ligne JSON par span dans TRACE_FILE)
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# Part des requêtes tracées : une requête non tracée ne crée aucun span (coût ~ une lecture de ContextVar)
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# Un import en masse ou un flux NDJSON peut exécuter des milliers de requêtes : au-delà, on compte seulement
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "1000"))
+# Longueur maximale du SQL gardé dans l'attribut db.statement
+TRACE_STATEMENT_LENGTH = 500
+
+TRACE_ID_HEADER = b"x-trace-id"
+
+
+@dataclass(slots=True)
+class Trace:
+    trace_id: str
+    spans: list["Span"] = field(default_factory=list)
+    dropped: int = 0
+
+
+@dataclass(slots=True)
+class Span:
+    trace: Trace
+    name: str
+    span_id: str
+    parent_id: str | None
+    start_ns: int
+    end_ns: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: str | None = None
+
+    def end(self, end_ns: int | None = None) -> None:
+        self.end_ns = end_ns or time.time_ns()
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1_000_000
+
+    def to_dict(self) -> dict:
+        # Mêmes noms de champs que le format OTLP/JSON d'OpenTelemetry
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error else {"code": "OK"},
+        }
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: list[Span]) -> None:
+        """Receive every span of one finished trace."""
+
+
+class InMemoryExporter:
+    """Keep the last finished traces in memory (tests, debugging)."""
+
+    def __init__(self, max_traces: int = 1000) -> None:
+        self.traces: deque[list[Span]] = deque(maxlen=max_traces)
+
+    def export(self, spans: list[Span]) -> None:
+        self.traces.append(spans)
+
+    @property
+    def spans(self) -> list[Span]:
+        return [span for trace in self.traces for span in trace]
+
+    def clear(self) -> None:
+        self.traces.clear()
+
+
+class JsonLinesExporter:
+    """Append one JSON line per span to a file (to load in a notebook or ship with a log agent)."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        lines = "".join(json.dumps(span.to_dict()) + "\n" for span in spans)
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+def _exporter_from_env() -> SpanExporter | None:
+    if TRACE_EXPORTER == "memory":
+        return InMemoryExporter()
+    if TRACE_EXPORTER == "file":
+        return JsonLinesExporter(TRACE_FILE)
+    if TRACE_EXPORTER:
+        raise ValueError(f"Unknown trace exporter: {TRACE_EXPORTER}")
+    return None
+
+
+class Tracer:
+    def __init__(self, exporter: SpanExporter | None, sample_rate: float) -> None:
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def configure(self, exporter: SpanExporter | None = None, sample_rate: float | None = None) -> None:
+        # Pour les tests : tracer.configure(InMemoryExporter(), sample_rate=1.0)
+        self.exporter = exporter
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        # Même avec sample_rate = 0, un appelant qui envoie traceparent (drapeau 01) est suivi
+        return self.exporter is not None
+
+
+tracer = Tracer(_exporter_from_env(), TRACE_SAMPLE_RATE)
+
+# Span en cours pour la requête HTTP, None si elle n'est pas échantillonnée.
+# Comme pour QueryStats, le contexte est copié vers le thread d'une route def :
+# les spans enfants créés dans ce thread s'ajoutent au même objet Trace.
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+
+def start_span(name: str, parent: Span | None = None, **attributes) -> Span | None:
+    """Start a child of parent (default: the current span), without making it current.
+
+    Returns None when the request is not sampled. The caller must call span.end().
+    """
+    parent = parent or _current_span.get()
+    if parent is None:
+        return None
+    trace = parent.trace
+    child = Span(trace, name, _new_id(64), parent.span_id, time.time_ns(), attributes=attributes)
+    if len(trace.spans) < TRACE_MAX_SPANS:
+        trace.spans.append(child)
+    else:
+        trace.dropped += 1
+    return child
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Time the block as a child of the current span; does nothing outside a sampled request."""
+    child = start_span(name, **attributes)
+    if child is None:
+        yield None
+        return
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as exc:
+        child.error = repr(exc)
+        raise
+    finally:
+        _current_span.reset(token)
+        child.end()
+
+
+# --- Routes : un span "endpoint" autour du code de chaque route ---
+
+def trace_endpoint(endpoint):
+    """Wrap endpoint in an "endpoint" span (same signature, for FastAPI's dependency injection)."""
+    attributes = {"code.function": endpoint.__name__}
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            with span("endpoint", **attributes):
+                return await endpoint(*args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        with span("endpoint", **attributes):
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+
+# --- SQL : un span "db.query" par aller-retour avec la base ---
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_span.get() is None:
+        return
+    query_span = start_span(
+        "db.query",
+        **{"db.system": conn.dialect.name, "db.statement": statement[:TRACE_STATEMENT_LENGTH]},
+    )
+    if executemany:
+        query_span.attributes["db.executemany"] = len(parameters)
+    conn.info.setdefault("trace_spans", []).append(query_span)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Sans regarder le span courant : un span empilé doit être retiré même si l'exécution
+    # se termine dans un autre contexte que celui où elle a commencé
+    if conn.info.get("trace_spans"):
+        conn.info["trace_spans"].pop().end()
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("trace_spans"):
+        query_span = conn.info["trace_spans"].pop()
+        query_span.error = repr(exception_context.original_exception)
+        query_span.end()
+
+
+# conn.info est celui de la connexion du pool : il survit au retour dans le pool.
+# Un span resté dans la pile (exécution interrompue sans handle_error) serait sinon
+# terminé à la place de celui d'une requête SQL du prochain client de cette connexion.
+@event.listens_for(Pool, "checkin")
+def _clear_trace_spans(dbapi_connection, connection_record):
+    if connection_record is not None:
+        connection_record.info.pop("trace_spans", None)
+
+
+# --- ORM : "orm.execute" = SQL + construction des objets (hydratation) ---
+
+# Sans intervention, session.scalars(stmt) rend la main avant de lire les lignes :
+# l'hydratation aurait lieu plus tard, dans .all(), hors de tout span.
+# Pour une requête échantillonnée, on lit toutes les lignes dans le span (freeze()),
+# puis on rend un Result équivalent. Les listeners do_orm_execute suivants
+# (app/query_stats.py, app/written_tables.py) sont appelés par invoke_statement().
+# Pas pour yield_per / stream_results : lire tout le flux d'avance annulerait le streaming.
+@event.listens_for(Session, "do_orm_execute")
+def _trace_orm_execute(orm_execute_state: ORMExecuteState):
+    if _current_span.get() is None or not orm_execute_state.is_select:
+        return None
+    options = orm_execute_state.execution_options
+    if options.get("yield_per") or options.get("stream_results"):
+        return None
+    attributes = {"orm.entity": _entity_name(orm_execute_state)}
+    if orm_execute_state.lazy_loaded_from is not None:
+        attributes["orm.lazy_load"] = True
+    with span("orm.execute", **attributes) as orm_span:
+        frozen = orm_execute_state.invoke_statement().freeze()
+        orm_span.attributes["orm.rows"] = len(frozen.data)
+    return frozen()
+
+
+def _entity_name(orm_execute_state: ORMExecuteState) -> str | None:
+    mapper = orm_execute_state.bind_mapper
+    return mapper.class_.__name__ if mapper is not None else None
+
+
+# --- Requête HTTP : span racine, échantillonnage, export ---
+
+def _parse_traceparent(value: bytes) -> tuple[str, str, bool] | None:
+    # W3C Trace Context : "00-<trace_id 32 hex>-<parent_id 16 hex>-<flags>", bit 01 = échantillonné
+    parts = value.decode("latin-1").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class TracingMiddleware:
+    """Root span of every sampled HTTP request, exported when the response is sent.
+
+    A traceparent header from the caller decides sampling and links the trace to the caller's.
+    Sampled responses carry X-Trace-Id. Spans added here around the route's own spans:
+    response.serialize (from the end of the endpoint to the response headers: response_model
+    validation and JSON encoding) and response.stream (body sent after the headers, NDJSON).
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    def _sample(self, scope) -> tuple[str, str | None] | None:
+        parent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parent = _parse_traceparent(value)
+                break
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+            return (trace_id, parent_id) if sampled else None
+        if random.random() < tracer.sample_rate:
+            return _new_id(128), None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        sampled = self._sample(scope)
+        if sampled is None:
+            await self.app(scope, receive, send)
+            return
+
+        trace_id, parent_id = sampled
+        trace = Trace(trace_id)
+        root = Span(
+            trace, "http.request", _new_id(64), parent_id, time.time_ns(),
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+        trace.spans.append(root)
+        stream_span = None
+
+        async def send_traced(message):
+            nonlocal stream_span
+            if message["type"] == "http.response.start":
+                now = time.time_ns()
+                root.attributes["http.status_code"] = message["status"]
+                endpoint = next((s for s in reversed(trace.spans) if s.name == "endpoint"), None)
+                if endpoint is not None and endpoint.end_ns is not None:
+                    serialize = start_span("response.serialize", parent=root)
+                    serialize.start_ns = endpoint.end_ns
+                    serialize.end(now)
+                headers = [*message.get("headers", []), (TRACE_ID_HEADER, trace_id.encode())]
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                # Corps envoyé en plusieurs morceaux (StreamingResponse) : span du premier au dernier
+                if message.get("more_body", False):
+                    if stream_span is None:
+                        stream_span = start_span("response.stream", parent=root)
+                elif stream_span is not None:
+                    stream_span.end()
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_traced)
+        except BaseException as exc:
+            root.error = repr(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                root.attributes["http.route"] = getattr(route, "path", None)
+            if trace.dropped:
+                root.attributes["trace.dropped_spans"] = trace.dropped
+            root.end()
+            if tracer.exporter is not None:
+                tracer.exporter.export(trace.spans)
@@ -0,0 +1,64 @@
+from sqlalchemy import Engine, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import Session, configure_mappers
+from sqlalchemy.pool import QueuePool
+
+from app.models import Tag
+from app.pagination import KeysetParams, keyset_values
+
+
+def warm_statements(session: Session) -> None:
+    """Run the prebuilt statements of the hot list routes once (one row each).
+
+    The first execution of a statement pays for its compilation to SQL (and, for the ORM,
+    for building the loading plan). Doing it here fills SQLAlchemy's compiled cache before
+    the first client request. These are the module-level statements the routes execute
+    when no filter / sort / fields parameter is given: a route that changes its statement
+    changes what is warmed.
+    """
+    from app.orm_book_tag import BOOKS_BY_TAG_PAGE, BOOKS_WITH_TAGS_PAGE, books_with_tags_json
+    from app.orm_join import BOOKS_WITH_AUTHOR_OBJECT_PAGE, BOOKS_WITH_AUTHORS_PAGE, BOOKS_WITH_PUBLISHER_PAGE
+    from app.orm_simple import AUTHOR_ROWS_PAGE, BOOK_ROWS_PAGE
+
+    page = KeysetParams(limit=1, after=None, stream=False)
+    values = keyset_values(page)
+    for stmt in (AUTHOR_ROWS_PAGE, BOOK_ROWS_PAGE, BOOKS_WITH_AUTHOR_OBJECT_PAGE, BOOKS_WITH_TAGS_PAGE):
+        session.scalars(stmt, values).all()
+    for stmt in (BOOKS_WITH_AUTHORS_PAGE, BOOKS_WITH_PUBLISHER_PAGE):
+        session.execute(stmt, values).all()
+    # Avec un tag qui existe, le SELECT ... IN des tags (selectinload) est aussi compilé
+    tag_id = session.scalar(select(Tag.id).order_by(Tag.id).limit(1)) or 0
+    session.scalars(BOOKS_BY_TAG_PAGE, {"tag_id": tag_id, **values}).all()
+    # aggregate=sql : le document JSON est construit par la base
+    books_with_tags_json(session, page)
+
+
+def _pool_size(engine: Engine) -> int:
+    pool = engine.pool
+    return pool.size() if isinstance(pool, QueuePool) else 1
+
+
+def warm_up(engine: Engine) -> None:
+    # Configuration des mappers (relations, jointures) : sinon faite à la première requête ORM
+    configure_mappers()
+
+    # Ouvre pool_size connexions en même temps : le pool est plein avant le premier client
+    connections = [engine.connect() for _ in range(_pool_size(engine))]
+    for conn in connections:
+        conn.execute(text("SELECT 1"))
+        conn.close()
+
+    with Session(engine) as session:
+        warm_statements(session)
+
+
+async def warm_up_async(engine: AsyncEngine) -> None:
+    configure_mappers()
+
+    connections = [await engine.connect() for _ in range(_pool_size(engine.sync_engine))]
+    for conn in connections:
+        await conn.execute(text("SELECT 1"))
+        await conn.close()
+
+    async with AsyncSession(engine) as session:
+        await session.run_sync(warm_statements)
@@ -0,0 +1,44 @@
+from collections.abc import Callable, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import ORMExecuteState, Session
+
+# Fonctions appelées après chaque commit avec l'ensemble des tables écrites par la transaction
+_listeners: list[Callable[[set[str]], None]] = []
+
+
+def on_tables_committed(listener: Callable[[set[str]], None]) -> None:
+    """Call listener(tables) after every commit that wrote to at least one table."""
+    _listeners.append(listener)
+
+
+# On note les tables écrites par la session, puis on prévient les abonnés après le commit
+# (avant, une autre requête pourrait encore relire les anciennes lignes)
+def _mark_written(session: Session, tables: Iterable[str]) -> None:
+    session.info.setdefault("written_tables", set()).update(tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _tables_flushed(session: Session, flush_context) -> None:
+    # Unité de travail : session.add(), modification d'attribut, session.delete()
+    _mark_written(session, (obj.__table__.name for obj in (*session.new, *session.dirty, *session.deleted)))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _tables_executed(orm_execute_state: ORMExecuteState) -> None:
+    # insert() / update() / delete() exécutés directement (routes d'import en masse)
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _mark_written(orm_execute_state.session, [orm_execute_state.statement.table.name])
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_after_commit(session: Session) -> None:
+    tables = session.info.pop("written_tables", None)
+    if tables:
+        for listener in _listeners:
+            listener(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session: Session) -> None:
+    session.info.pop("written_tables", None)
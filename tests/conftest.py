@@ -0,0 +1,49 @@
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# Les moteurs de app.db sont créés à l'import : la configuration doit être posée avant.
+_DIRECTORY = tempfile.mkdtemp(prefix="orm-demo-tests-")
+PRIMARY_PATH = os.path.join(_DIRECTORY, "primary.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{PRIMARY_PATH}"
+# DB_MODE=async python -m pytest : mêmes routes en async def + AsyncSession (voir test_async_mode.py)
+os.environ.setdefault("DB_MODE", "sync")
+os.environ["ASYNC_DATABASE_URL"] = f"sqlite+aiosqlite:///{PRIMARY_PATH}"
+os.environ["STARTUP_MODE"] = "init"
+os.environ["TRACE_EXPORTER"] = ""
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.response_cache import response_cache  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    # Base partagée par tous les tests, mais pas les pages gardées en cache
+    response_cache.backend.clear()
+    # Le démarrage (init_db) crée le schéma et les données de démo
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def unique():
+    """Unique suffix for names (authors.name and tags.name are unique, the database is shared)."""
+    return lambda prefix: f"{prefix} {uuid.uuid4().hex[:8]}"
+
+
+@pytest.fixture
+def new_client():
+    """Other HTTP clients (own cookies) on the same application."""
+    clients = []
+
+    def make() -> TestClient:
+        clients.append(TestClient(app))
+        return clients[-1]
+
+    yield make
+    for other in clients:
+        other.close()
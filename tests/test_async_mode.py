@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from app import db
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Les routes async sont créées à l'import de app.main selon DB_MODE : il faut un autre processus
+ASYNC_MODULES = [
+    "tests/test_async_mode.py",
+    "tests/test_pagination.py",
+    "tests/test_bulk.py",
+    "tests/test_authors_patch.py",
+]
+
+
+@pytest.mark.skipif(db.DB_MODE == "async", reason="already running with DB_MODE=async")
+def test_list_bulk_and_patch_routes_in_async_mode():
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", *ASYNC_MODULES],
+        cwd=ROOT,
+        env={**os.environ, "DB_MODE": "async"},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+def test_routes_use_the_engine_of_db_mode(client):
+    # En async, les routes passent par le pool "async" (AsyncSession), jamais par "sync"
+    before = client.get("/metrics").json()["pools"]
+    client.get("/orm/books", params={"limit": 1})
+    after = client.get("/metrics").json()["pools"]
+    assert {name: after[name]["checkouts"] - before[name]["checkouts"] for name in after} == (
+        {"sync": 0, "async": 1} if db.DB_MODE == "async" else {"sync": 1}
+    )
@@ -0,0 +1,63 @@
+import pytest
+
+
+@pytest.fixture
+def author(client, unique):
+    return client.post("/orm/authors", json={"name": unique("Patched")}).json()
+
+
+def test_patch_returns_new_version(client, author, unique):
+    read = client.get(f"/orm/authors/{author['id']}")
+    assert read.headers["ETag"] == f'"{author["version"]}"'
+
+    name = unique("Renamed")
+    response = client.patch(f"/orm/authors/{author['id']}", json={"name": name}, headers={"If-Match": read.headers["ETag"]})
+
+    assert response.status_code == 200
+    assert response.json() == {"id": author["id"], "name": name, "version": author["version"] + 1}
+    assert response.headers["ETag"] == f'"{author["version"] + 1}"'
+    assert client.get(f"/orm/authors/{author['id']}").json()["name"] == name
+
+
+def test_empty_patch_keeps_version(client, author):
+    response = client.patch(f"/orm/authors/{author['id']}", json={}, headers={"If-Match": "*"})
+    assert response.status_code == 200
+    assert response.json()["version"] == author["version"]
+
+
+def test_patch_missing_author(client):
+    assert client.patch("/orm/authors/999999", json={"name": "Nobody here"}, headers={"If-Match": "*"}).status_code == 404
+    assert client.patch("/orm/authors/999999", json={"name": "Nobody here"}, headers={"If-Match": '"1"'}).status_code == 404
+
+
+def test_patch_taken_name(client, author, unique):
+    other = client.post("/orm/authors", json={"name": unique("Other")}).json()
+    response = client.patch(f"/orm/authors/{author['id']}", json={"name": other["name"]}, headers={"If-Match": "*"})
+    assert response.status_code == 409
+    assert response.json()["detail"] == "Author name already exists"
+
+
+def test_patch_stale_version(client, author, unique):
+    etag = f'"{author["version"]}"'
+    assert client.patch(f"/orm/authors/{author['id']}", json={"name": unique("First")}, headers={"If-Match": etag}).status_code == 200
+
+    # Deuxième modification avec la version lue avant la première : refusée
+    response = client.patch(f"/orm/authors/{author['id']}", json={"name": unique("Second")}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert response.headers["ETag"] == f'"{author["version"] + 1}"'
+
+
+def test_patch_null_name(client, author):
+    response = client.patch(f"/orm/authors/{author['id']}", json={"name": None}, headers={"If-Match": "*"})
+    assert response.status_code == 422
+    assert client.get(f"/orm/authors/{author['id']}").json()["name"] == author["name"]
+
+
+def test_patch_invalid_if_match(client, author):
+    assert client.patch(f"/orm/authors/{author['id']}", json={}, headers={"If-Match": '"abc"'}).status_code == 400
+
+
+def test_patch_requires_if_match(client, author, unique):
+    response = client.patch(f"/orm/authors/{author['id']}", json={"name": unique("Blind")})
+    assert response.status_code == 428
+    assert client.get(f"/orm/authors/{author['id']}").json() == author
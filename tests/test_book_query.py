@@ -0,0 +1,112 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def library(client, unique):
+    """Two new authors, their books, and two new tags given on different dates."""
+    authors = [client.post("/orm/authors", json={"name": unique("Filtered")}).json() for _ in range(2)]
+    books = [
+        {"title": "Alpha", "pages": 100, "author_id": authors[0]["id"]},
+        {"title": "Beta", "pages": 250, "author_id": authors[0]["id"]},
+        {"title": "Gamma", "pages": 400, "author_id": authors[1]["id"]},
+    ]
+    ids = [row["id"] for row in client.post("/orm/books/bulk", json=books).json()["results"]]
+    books = {book["title"]: {**book, "id": book_id} for book, book_id in zip(books, ids)}
+
+    red, blue = unique("red"), unique("blue")
+    tagged = [
+        [books["Alpha"]["id"], red, "2024-01-10"],
+        [books["Alpha"]["id"], blue, "2024-03-10"],
+        [books["Beta"]["id"], red, "2024-02-10"],
+        [books["Gamma"]["id"], blue, "2024-02-20"],
+    ]
+    assert client.post("/orm/book-tags/bulk", json=tagged).status_code == 200
+    return authors, books, red, blue
+
+
+def titles(response) -> list[str]:
+    assert response.status_code == 200, response.text
+    return [book["title"] for book in response.json()]
+
+
+def test_author_and_pages_filters(client, library):
+    authors, _, _, _ = library
+    ids = [author["id"] for author in authors]
+    assert titles(client.get("/orm/books", params={"author_id": ids})) == ["Alpha", "Beta", "Gamma"]
+    assert titles(client.get("/orm/books", params={"author_id": ids[0], "min_pages": 200})) == ["Beta"]
+    params = {"author_id": ids, "max_pages": 250, "sort": "-pages"}
+    assert titles(client.get("/orm/books", params=params)) == ["Beta", "Alpha"]
+
+
+def test_publisher_filter(client):
+    every = client.get("/orm/books-with-publisher", params={"fields": "id,publisher_name", "limit": 1000}).json()
+    name = next(book["publisher_name"] for book in every if book["publisher_name"] is not None)
+    expected = [book["id"] for book in every if book["publisher_name"] == name]
+
+    # L'id de l'éditeur n'est pas dans la réponse : on le retrouve dans /stats/publishers
+    publishers = client.get("/stats/publishers", params={"limit": 1000}).json()["items"]
+    publisher_id = next(row["publisher_id"] for row in publishers if row["publisher_name"] == name)
+
+    params = {"publisher_id": publisher_id, "fields": "id", "limit": 1000}
+    response = client.get("/orm/books-with-publisher", params=params)
+    assert [book["id"] for book in response.json()] == expected
+
+
+def test_tags_any_or_all(client, library):
+    _, _, red, blue = library
+    assert titles(client.get("/orm/books", params={"tag": [red, blue]})) == ["Alpha", "Beta", "Gamma"]
+    assert titles(client.get("/orm/books", params={"tag": [red, blue], "tag_match": "all"})) == ["Alpha"]
+
+
+def test_tagged_at_window(client, library):
+    _, _, red, blue = library
+    params = {"tag": [red, blue], "tagged_after": "2024-02-01", "tagged_before": "2024-02-28"}
+    assert titles(client.get("/orm/books", params=params)) == ["Beta", "Gamma"]
+    # La fenêtre s'applique à chaque tag : Alpha a blue, mais le 10 mars
+    assert titles(client.get("/orm/books", params={"tag": blue, "tagged_before": "2024-02-28"})) == ["Gamma"]
+
+
+def test_fields_projection(client, library):
+    authors, books, _, _ = library
+    params = {"author_id": authors[1]["id"], "fields": "title,author_name"}
+    response = client.get("/orm/books-with-authors", params=params)
+    assert response.json() == [{"title": "Gamma", "author_name": authors[1]["name"]}]
+    assert client.get("/orm/books", params={"fields": "title,author_name"}).status_code == 422
+
+
+def test_stream_with_filters(client, library):
+    _, books, red, _ = library
+    response = client.get("/orm/books", params={"tag": red, "stream": "true", "fields": "id,pages"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == [{"id": books[title]["id"], "pages": books[title]["pages"]} for title in ("Alpha", "Beta")]
+
+
+def test_filters_on_tag_routes(client, library):
+    authors, books, red, blue = library
+    params = {"author_id": authors[0]["id"], "tag": red, "sort": "-title"}
+    assert titles(client.get("/orm/books-with-tags", params=params)) == ["Beta", "Alpha"]
+    # Tag du chemin + tag en paramètre : le livre doit avoir les deux
+    assert titles(client.get(f"/orm/books-by-tag/{blue}", params={"tag": red})) == ["Alpha"]
+    assert titles(client.get(f"/orm/books-by-tag/{blue}", params={"min_pages": 300})) == ["Gamma"]
+
+    streamed = client.get(f"/orm/books-by-tag/{red}", params={"max_pages": 200, "stream": "true"})
+    (line,) = streamed.text.splitlines()
+    assert json.loads(line)["id"] == books["Alpha"]["id"]
+
+
+def test_sort_cursor_on_tag_route(client, library):
+    _, _, red, blue = library
+    params = {"tag": [red, blue], "sort": "-title", "limit": 2}
+    first = client.get("/orm/books-with-tags", params=params)
+    assert titles(first) == ["Gamma", "Beta"]
+    rest = client.get("/orm/books-with-tags", params={**params, "cursor": first.headers["X-Next-Cursor"]})
+    assert titles(rest) == ["Alpha"]
+
+
+def test_sql_aggregate_rejects_filters(client, library):
+    authors, _, _, _ = library
+    params = {"aggregate": "sql", "author_id": authors[0]["id"]}
+    assert client.get("/orm/books-with-tags", params=params).status_code == 422
@@ -0,0 +1,73 @@
+def test_authors_bulk_reports_each_row(client, unique):
+    taken = client.post("/orm/authors", json={"name": unique("Taken")}).json()["name"]
+    fresh = unique("Fresh")
+    rows = [{"name": fresh}, {"name": taken}, {"name": "x"}, {"name": fresh}, {"nom": "missing field"}]
+
+    response = client.post("/orm/authors/bulk", json=rows)
+
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["inserted"], body["failed"]) == (1, 4)
+    results = body["results"]
+    assert results[0]["id"] is not None and results[0]["error"] is None
+    assert results[1]["error"] == "Author name already exists"
+    assert results[2]["error"].startswith("name:")
+    assert results[3]["error"] == "Author name already exists"
+    assert results[4]["id"] is None
+    assert client.get(f"/orm/authors/{results[0]['id']}").json()["name"] == fresh
+
+
+def test_books_bulk_ndjson_keeps_valid_lines(client, unique):
+    author_id = client.post("/orm/authors", json={"name": unique("Bulk author")}).json()["id"]
+    body = "\n".join([
+        f'{{"title": "Kept", "pages": 10, "author_id": {author_id}}}',
+        "{not json",
+        '{"title": "Orphan", "pages": 10, "author_id": 999999}',
+        "",
+        f'{{"title": "Kept too", "pages": 20, "author_id": {author_id}}}',
+    ])
+
+    response = client.post("/orm/books/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+
+    assert response.status_code == 201
+    body = response.json()
+    assert (body["inserted"], body["failed"]) == (2, 2)
+    errors = [result["error"] for result in body["results"]]
+    assert errors[0] is None and errors[3] is None
+    assert errors[1].startswith("Invalid JSON")
+    assert errors[2] == "Author not found"
+
+
+def test_book_tags_bulk_upserts(client, unique):
+    author_id = client.post("/orm/authors", json={"name": unique("Tagged author")}).json()["id"]
+    book_id = client.post("/orm/books", json={"title": "Tagged", "pages": 10, "author_id": author_id}).json()["id"]
+    tag = unique("tag").replace(" ", "-")
+
+    first = client.post("/orm/book-tags/bulk", json=[
+        {"book_id": book_id, "tag_name": tag, "tagged_at": "2024-01-01"},
+        [999999, tag, "2024-01-01"],
+    ])
+    assert first.status_code == 200
+    assert (first.json()["upserted"], first.json()["failed"], first.json()["tags_created"]) == (1, 1, 1)
+    tagged, missing = first.json()["results"]
+    assert tagged["tag_id"] is not None and "id" not in tagged
+    assert (missing["tag_id"], missing["error"]) == (None, "Book not found")
+
+    # Même paire (livre, tag) : tagged_at est mis à jour, rien n'est dupliqué
+    second = client.post("/orm/book-tags/bulk", json=[[book_id, tag, "2024-06-30"]])
+    assert (second.json()["upserted"], second.json()["tags_created"]) == (1, 0)
+    assert second.json()["results"][0]["tag_id"] == tagged["tag_id"]
+
+    books = client.get(f"/orm/books-by-tag/{tag}").json()
+    assert [book["id"] for book in books] == [book_id]
+    assert books[0]["tags"] == [{"name": tag, "tagged_at": "2024-06-30"}]
+
+
+def test_invalid_bodies_are_rejected_whole(client):
+    invalid = "Body must be a JSON array or NDJSON"
+    for content_type in ("application/json", "application/x-ndjson"):
+        response = client.post("/orm/authors/bulk", content=b'[{"name": "\xff\xfe"}]', headers={"content-type": content_type})
+        assert response.status_code == 400
+        assert response.json()["detail"] == invalid
+    assert client.post("/orm/authors/bulk", json={"name": "Not a list"}).json()["detail"] == invalid
+    assert client.post("/orm/authors/bulk", content=b"[{", headers={"content-type": "application/json"}).status_code == 400
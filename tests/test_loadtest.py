@@ -0,0 +1,21 @@
+from app.loadtest import pool_deltas
+
+
+def pool(checkouts: int, counts: list[int], total_ms: float, in_use: int = 0, idle: int = 5) -> dict:
+    return {
+        "size": 5, "overflow": 0, "in_use": in_use, "idle": idle,
+        "checkouts": checkouts, "connects": 5, "invalidations": 0, "timeouts": 0,
+        "checkout_wait_histogram": {"bounds_ms": [1, 10, 100], "counts": counts, "total_ms": total_ms},
+    }
+
+
+def test_pool_deltas_keep_only_the_step():
+    # Avant l'étape : 1000 attentes longues ; pendant : 10 attentes, dont une de plus de 10 ms
+    before = {"sync": pool(1000, [0, 0, 1000, 0], 50_000.0)}
+    after = {"sync": pool(1010, [9, 0, 1001, 0], 50_050.0)}
+    samples = [{"sync": pool(1005, [], 0, in_use=4, idle=1)}, {"sync": pool(1008, [], 0, in_use=2, idle=3)}]
+
+    step = pool_deltas(before, after, samples)["sync"]
+    assert step["checkouts"] == 10
+    assert step["checkout_wait_ms"] == {"count": 10, "mean": 5.0, "p50": 1, "p95": 100, "p99": 100}
+    assert (step["in_use"], step["idle"]) == ({"max": 4, "mean": 3.0}, {"min": 1})
@@ -0,0 +1,98 @@
+import base64
+import json
+
+import pytest
+
+
+@pytest.fixture
+def author_books(client, unique):
+    author = client.post("/orm/authors", json={"name": unique("Paginated")}).json()
+    # Des pages en double : le tri doit départager par title puis id
+    pages = [300, 120, 300, 80, 120, 300, 450]
+    books = [
+        {"title": f"Book {letter}", "pages": count, "author_id": author["id"]}
+        for letter, count in zip("GFEDCBA", pages)
+    ]
+    response = client.post("/orm/books/bulk", json=books)
+    assert response.status_code == 201
+    ids = [row["id"] for row in response.json()["results"]]
+    return author, [{**book, "id": book_id} for book, book_id in zip(books, ids)]
+
+
+def encode(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def test_keyset_pages_follow_x_next_after(client, author_books):
+    streamed = client.get("/orm/books", params={"stream": "true"})
+    expected = [json.loads(line)["id"] for line in streamed.text.splitlines()]
+
+    seen, params = [], {"limit": 3}
+    while True:
+        response = client.get("/orm/books", params=params)
+        page = response.json()
+        assert len(page) <= 3
+        seen.extend(book["id"] for book in page)
+        if "X-Next-After" not in response.headers:
+            break
+        params = {"limit": 3, "after": response.headers["X-Next-After"]}
+
+    assert seen == expected
+    assert seen == sorted(set(seen))
+
+
+def test_list_without_limit_returns_one_page(client, author_books):
+    author, _ = author_books
+    books = [{"title": f"Filler {i}", "pages": 10, "author_id": author["id"]} for i in range(101)]
+    assert client.post("/orm/books/bulk", json=books).status_code == 201
+
+    response = client.get("/orm/books")
+    assert len(response.json()) == 100
+    assert "X-Next-After" in response.headers
+    assert client.get("/orm/books", params={"limit": 1001}).status_code == 422
+
+
+def test_sort_cursor_walks_every_row_once(client, author_books):
+    author, books = author_books
+    expected = [book["id"] for book in sorted(books, key=lambda book: (-book["pages"], book["title"], book["id"]))]
+
+    seen, params = [], {"author_id": author["id"], "sort": "-pages,title", "limit": 2}
+    while True:
+        response = client.get("/orm/books", params=params)
+        assert "X-Next-After" not in response.headers
+        seen.extend(book["id"] for book in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        params = {**params, "cursor": cursor}
+
+    assert seen == expected
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not base64 !",
+        encode({"pages": 300}),
+        encode([300]),
+        encode(["300", "Book A", 1]),
+        encode([300, 7, 1]),
+        encode([True, "Book A", 1]),
+        encode([None, "Book A", 1]),
+    ],
+)
+def test_invalid_cursor_is_rejected(client, cursor):
+    response = client.get("/orm/books", params={"sort": "-pages,title", "cursor": cursor})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize(
+    "path, params",
+    [
+        ("/orm/books", {"stream": "true", "limit": 10}),
+        ("/orm/books-with-tags", {"stream": "true", "limit": 10}),
+        ("/orm/books-with-tags", {"stream": "true", "aggregate": "sql"}),
+    ],
+)
+def test_stream_rejects_page_parameters(client, path, params):
+    assert client.get(path, params=params).status_code == 422
@@ -0,0 +1,20 @@
+from app import db
+
+
+def test_request_moves_pool_counters(client):
+    # Pool des routes : "sync" ou "async" selon DB_MODE
+    engine = db.async_engine.sync_engine if db.DB_MODE == "async" else db.engine
+    before = client.get("/metrics").json()["pools"][db.DB_MODE]
+    # Pool vidé : la requête suivante ouvre une nouvelle connexion
+    engine.dispose()
+    client.get("/orm/books", params={"limit": 5})
+    after = client.get("/metrics").json()["pools"][db.DB_MODE]
+
+    # La lecture de /metrics elle-même n'utilise pas de connexion
+    assert after["checkouts"] - before["checkouts"] == 1
+    assert after["checkins"] - before["checkins"] == 1
+    assert after["connects"] - before["connects"] == 1
+    assert (after["in_use"], after["idle"]) == (0, 1)
+    assert after["checkout_wait_ms"]["max"] >= 0
+    histogram = [after["checkout_wait_histogram"]["counts"], before["checkout_wait_histogram"]["counts"]]
+    assert sum(histogram[0]) - sum(histogram[1]) == 1
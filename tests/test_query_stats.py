@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app import db, query_stats
+from app.models import Book
+from app.query_stats import NPlusOneError, QueryStats
+
+
+@pytest.fixture
+def stats():
+    """Count queries outside of an HTTP request, as QueryStatsMiddleware does for one."""
+    stats = QueryStats()
+    token = query_stats._current_stats.set(stats)
+    yield stats
+    query_stats._current_stats.reset(token)
+
+
+def test_db_queries_header(client):
+    assert client.get("/orm/books", params={"limit": 5}).headers["X-DB-Queries"] == "1"
+    # selectinload : un SELECT pour les livres, un SELECT ... IN pour leurs tags
+    assert client.get("/orm/books-with-tags", params={"limit": 5}).headers["X-DB-Queries"] == "2"
+
+
+def test_failed_statement_is_counted_and_unstacked(stats):
+    with db.engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.exec_driver_sql("SELECT * FROM no_such_table")
+        assert conn.info["query_start"] == []
+        conn.exec_driver_sql("SELECT 1")
+        assert conn.info["query_start"] == []
+    assert stats.queries == 2
+
+
+def test_checkin_clears_query_start(stats):
+    with db.engine.connect() as conn:
+        # Exécution interrompue sans after_cursor_execute ni handle_error
+        conn.info.setdefault("query_start", []).append(0.0)
+    with db.engine.connect() as conn:
+        assert "query_start" not in conn.info
+
+
+def test_repeated_lazy_load_raises_in_strict_mode(client, unique, stats, monkeypatch):
+    monkeypatch.setattr(query_stats, "STRICT_NPLUSONE", True)
+    ids = []
+    for _ in range(2):
+        author = client.post("/orm/authors", json={"name": unique("Lazy")}).json()
+        book = client.post("/orm/books", json={"title": "Lazy", "pages": 10, "author_id": author["id"]}).json()
+        ids.append(book["id"])
+
+    with db.SessionLocal() as session:
+        books = session.scalars(select(Book).where(Book.id.in_(ids))).all()
+        books[0].author
+        # Même SELECT une deuxième fois (autre auteur) : N+1
+        with pytest.raises(NPlusOneError):
+            books[1].author
+    assert sum(stats.lazy_loads.values()) == 2
@@ -0,0 +1,26 @@
+import pytest
+from pydantic import BaseModel
+
+from app.models import Book
+from app.read_models import read_rows
+
+
+@pytest.mark.parametrize("path", ["/orm/authors", "/orm/books"])
+def test_orm_load_returns_the_same_json(client, path):
+    params = {"limit": 50, "after": 2}
+    columns = client.get(path, params=params)
+    orm = client.get(path, params={**params, "load": "orm"})
+    assert orm.content == columns.content
+    assert orm.headers.get("X-Next-After") == columns.headers.get("X-Next-After")
+
+    streamed = [client.get(path, params={"stream": "true", "load": load}).text for load in ("columns", "orm")]
+    assert streamed[0] == streamed[1]
+
+
+def test_schema_with_a_non_column_field_is_rejected():
+    class BookWithAuthorName(BaseModel):
+        id: int
+        author_name: str
+
+    with pytest.raises(ValueError, match="author_name is not a column of Book"):
+        read_rows(BookWithAuthorName, Book)
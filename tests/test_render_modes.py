@@ -0,0 +1,20 @@
+import pytest
+
+ROUTES = [
+    "/orm/books-with-authors",
+    "/orm/books-with-author-object",
+    "/orm/books-with-publisher",
+    "/orm/books-with-tags",
+    "/orm/books-by-tag/classic",
+]
+
+
+@pytest.mark.parametrize("path", ROUTES)
+@pytest.mark.parametrize("render", ["adapter", "trusted"])
+def test_fast_paths_return_the_same_bytes(client, path, render):
+    # Démo : titres accentués, éditeur NULL, dates de tags, objets imbriqués
+    default = client.get(path, params={"limit": 20})
+    fast = client.get(path, params={"limit": 20, "render": render})
+    assert fast.status_code == default.status_code == 200
+    assert fast.content == default.content
+    assert fast.headers.get("X-Next-After") == default.headers.get("X-Next-After")
@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import db
+from app.replicas import READ_PRIMARY_COOKIE, ReplicaSet
+from app.written_tables import on_tables_committed
+from tests.conftest import PRIMARY_PATH
+
+
+class Replication:
+    """Copy the primary SQLite file to the replica after every commit, unless paused."""
+
+    def __init__(self, replica_path: str) -> None:
+        self.replica_path = replica_path
+        self.paused = False
+
+    def sync(self) -> None:
+        source = sqlite3.connect(PRIMARY_PATH)
+        target = sqlite3.connect(self.replica_path)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+
+
+_active: list[Replication] = []
+
+
+def _replicate(tables: set[str]) -> None:
+    for replication in _active:
+        if not replication.paused:
+            replication.sync()
+
+
+on_tables_committed(_replicate)
+
+
+@pytest.fixture
+def replication(client, monkeypatch, tmp_path):
+    """A SQLite replica of the primary, kept up to date after each commit until paused."""
+    replication = Replication(str(tmp_path / "replica.db"))
+    replication.sync()
+    # read_session() et get_async_session() lisent app.db.replicas / async_replicas à chaque requête
+    if db.DB_MODE == "async":
+        engine = create_async_engine(f"sqlite+aiosqlite:///{replication.replica_path}")
+        monkeypatch.setattr(db, "async_replicas", ReplicaSet([engine]))
+    else:
+        engine = create_engine(f"sqlite:///{replication.replica_path}")
+        monkeypatch.setattr(db, "replicas", ReplicaSet([engine]))
+    _active.append(replication)
+    yield replication
+    _active.remove(replication)
+    if db.DB_MODE == "async":
+        engine.sync_engine.dispose()
+    else:
+        engine.dispose()
+
+
+def test_writer_reads_its_own_write(client, new_client, unique, replication):
+    author = client.post("/orm/authors", json={"name": unique("Lagging")}).json()
+    reader = new_client()
+    params = {"author_id": author["id"]}
+    assert reader.get("/orm/books-with-authors", params=params).json() == []
+
+    replication.paused = True
+    response = client.post("/orm/books", json={"title": "Unreplicated", "pages": 10, "author_id": author["id"]})
+    assert READ_PRIMARY_COOKIE in response.cookies
+
+    # L'auteur de l'écriture lit sur le primaire, sans passer par le cache
+    own = client.get("/orm/books-with-authors", params=params)
+    assert [book["title"] for book in own.json()] == ["Unreplicated"]
+    assert "X-Cache" not in own.headers
+
+    # Les autres lisent la réplique en retard, mais la page n'est pas gardée en cache
+    other = reader.get("/orm/books-with-authors", params=params)
+    assert other.json() == []
+    assert other.headers["X-Cache"] == "MISS"
+    assert reader.get("/orm/books-with-authors", params=params).headers["X-Cache"] == "MISS"
+
+    # Réplique rattrapée : tout le monde voit le livre
+    replication.sync()
+    assert [book["title"] for book in reader.get("/orm/books-with-authors", params=params).json()] == ["Unreplicated"]
+
+
+def test_read_primary_header(client, new_client, unique, replication):
+    replication.paused = True
+    author = client.post("/orm/authors", json={"name": unique("Header")}).json()
+
+    reader = new_client()
+    assert reader.get(f"/orm/authors/{author['id']}").status_code == 404
+    response = reader.get(f"/orm/authors/{author['id']}", headers={"X-Read-Primary": "true"})
+    assert response.json()["name"] == author["name"]
+
+
+def test_without_replica_the_writer_keeps_the_cache(client, unique):
+    author = client.post("/orm/authors", json={"name": unique("Primary only")}).json()
+    params = {"author_id": author["id"]}
+    client.get("/orm/books-with-authors", params=params)
+    assert client.get("/orm/books-with-authors", params=params).headers["X-Cache"] == "HIT"
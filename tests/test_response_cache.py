@@ -0,0 +1,44 @@
+def test_cached_page_and_not_modified(client):
+    first = client.get("/orm/books-with-authors", params={"limit": 5})
+    assert first.headers["X-Cache"] == "MISS"
+    etag = first.headers["ETag"]
+
+    second = client.get("/orm/books-with-authors", params={"limit": 5})
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.headers["X-DB-Queries"] == "0"
+    assert (second.content, second.headers["ETag"]) == (first.content, etag)
+
+    not_modified = client.get("/orm/books-with-authors", params={"limit": 5}, headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["ETag"] == etag
+
+
+def test_write_invalidates_routes_reading_the_table(client, unique):
+    author = client.post("/orm/authors", json={"name": unique("Cached")}).json()
+    params = {"author_id": author["id"]}
+    empty = client.get("/orm/books-with-authors", params=params)
+    assert empty.json() == []
+    assert client.get("/orm/books-with-authors", params=params).headers["X-Cache"] == "HIT"
+
+    # books-with-tags ne lit pas authors : créer un auteur ne l'invalide pas
+    tags = client.get("/orm/books-with-tags", params={"limit": 5})
+    client.post("/orm/authors", json={"name": unique("Unrelated")})
+    cached = client.get("/orm/books-with-tags", params={"limit": 5})
+    assert (cached.headers["X-Cache"], cached.headers["ETag"]) == ("HIT", tags.headers["ETag"])
+
+    client.post("/orm/books", json={"title": "Fresh", "pages": 10, "author_id": author["id"]})
+
+    after = client.get("/orm/books-with-authors", params=params, headers={"If-None-Match": empty.headers["ETag"]})
+    assert after.status_code == 200
+    assert after.headers["X-Cache"] == "MISS"
+    assert [book["title"] for book in after.json()] == ["Fresh"]
+    assert client.get("/orm/books-with-tags", params={"limit": 5}).headers["X-Cache"] == "MISS"
+
+
+def test_hits_and_misses_in_metrics(client):
+    before = client.get("/metrics").json()["response_cache"]
+    for _ in range(3):
+        client.get("/orm/books-with-publisher", params={"limit": 3})
+    after = client.get("/metrics").json()["response_cache"]
+    assert (after["hit"] - before["hit"], after["miss"] - before["miss"]) == (2, 1)
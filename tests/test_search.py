@@ -0,0 +1,24 @@
+def labels(response) -> list[str]:
+    assert response.status_code == 200
+    return [hit["label"] for hit in response.json()]
+
+
+def test_prefix_and_accents(client):
+    # Recherche en cours de frappe, sans accents ni majuscules
+    assert "À l'ombre des jeunes filles en fleurs" in labels(client.get("/search", params={"q": "a l'omb"}))
+    assert labels(client.get("/search", params={"q": "marcel pro", "kind": "author"})) == ["Marcel Proust"]
+
+
+def test_typo_tolerance(client):
+    hits = client.get("/search", params={"q": "prust", "kind": "author"}).json()
+    assert hits[0]["label"] == "Marcel Proust"
+    assert hits[0]["kind"] == "author"
+    assert labels(client.get("/search", params={"q": "zzzzqx"})) == []
+
+
+def test_new_book_is_found_after_commit(client, unique):
+    author = client.post("/orm/authors", json={"name": unique("Searcher")}).json()
+    title = unique("Quasarlight")
+    assert labels(client.get("/search", params={"q": title.split()[1], "kind": "book"})) == []
+    client.post("/orm/books/bulk", json=[{"title": title, "pages": 10, "author_id": author["id"]}])
+    assert labels(client.get("/search", params={"q": title, "kind": "book"})) == [title]
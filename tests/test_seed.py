@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine, select
+
+from app.models import Author, Book, BookTag, Publisher, Tag
+from app.seed import SeedConfig, main, seed_synthetic
+
+CONFIG = SeedConfig(authors=30, books_per_author=(0, 6), publishers=5, tags=12, tags_per_book=(0, 4), seed=7)
+
+
+def dump(engine) -> dict[str, list[tuple]]:
+    tables = [model.__table__ for model in (Publisher, Author, Tag, Book, BookTag)]
+    with engine.connect() as conn:
+        return {
+            table.name: [tuple(row) for row in conn.execute(select(table).order_by(*table.primary_key))]
+            for table in tables
+        }
+
+
+@pytest.fixture
+def new_engine(tmp_path):
+    engines = []
+
+    def make(name: str):
+        engines.append(create_engine(f"sqlite:///{tmp_path / name}"))
+        return engines[-1]
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+def test_same_seed_same_rows(new_engine):
+    first, second = new_engine("first.db"), new_engine("second.db")
+    counts = seed_synthetic(first, CONFIG)
+    assert seed_synthetic(second, CONFIG) == counts
+    assert dump(first) == dump(second)
+    assert {table: len(rows) for table, rows in dump(first).items()} == counts
+
+    other = new_engine("other.db")
+    seed_synthetic(other, SeedConfig(**{**vars(CONFIG), "seed": 8}))
+    assert dump(other) != dump(first)
+
+
+def test_refuses_a_database_with_data(new_engine, tmp_path):
+    engine = new_engine("seeded.db")
+    seed_synthetic(engine, CONFIG)
+    before = dump(engine)
+
+    with pytest.raises(ValueError, match="--reset"):
+        seed_synthetic(engine, CONFIG)
+    assert dump(engine) == before
+    with pytest.raises(SystemExit):
+        main(["--database-url", f"sqlite:///{tmp_path / 'seeded.db'}", "--authors", "3"])
+
+    # --reset : tables recréées, mêmes lignes qu'une base neuve
+    seed_synthetic(engine, CONFIG, reset=True)
+    assert dump(engine) == before
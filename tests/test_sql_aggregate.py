@@ -0,0 +1,32 @@
+def walk(client, params: dict) -> list[tuple[list, str | None]]:
+    """Every page of books-with-tags with their X-Next-After header."""
+    pages, params = [], {**params, "limit": 4}
+    while True:
+        response = client.get("/orm/books-with-tags", params=params)
+        assert response.status_code == 200
+        pages.append((response.json(), response.headers.get("X-Next-After")))
+        if "X-Next-After" not in response.headers:
+            return pages
+        params = {**params, "after": response.headers["X-Next-After"]}
+
+
+def test_sql_aggregate_matches_orm_pages(client, unique):
+    # Un livre sans tag : tableau vide, pas null
+    author = client.post("/orm/authors", json={"name": unique("Untagged")}).json()
+    book = client.post("/orm/books", json={"title": "No tags yet", "pages": 10, "author_id": author["id"]}).json()
+
+    orm = walk(client, {})
+    sql = walk(client, {"aggregate": "sql"})
+    assert sql == orm
+    assert {"id": book["id"], "title": "No tags yet", "tags": []} in [item for page, _ in orm for item in page]
+
+
+def test_sql_aggregate_page_after_cursor(client):
+    first = client.get("/orm/books-with-tags", params={"aggregate": "sql", "limit": 3})
+    after = first.headers["X-Next-After"]
+    assert int(after) == first.json()[-1]["id"]
+
+    sql = client.get("/orm/books-with-tags", params={"aggregate": "sql", "limit": 3, "after": after})
+    orm = client.get("/orm/books-with-tags", params={"limit": 3, "after": after})
+    assert sql.json() == orm.json()
+    assert sql.headers["content-type"] == "application/json"
@@ -0,0 +1,27 @@
+from fastapi.testclient import TestClient
+
+import app.main
+from app import db
+from app.main import app as application
+from app.pool_metrics import POOL_METRICS
+
+
+def test_warm_startup_skips_migrations(client, monkeypatch):
+    # La fixture client a déjà démarré en mode init : le schéma existe
+    def forbidden(*args, **kwargs):
+        raise AssertionError("warm startup must not touch the schema")
+
+    monkeypatch.setattr(app.main, "STARTUP_MODE", "warm")
+    monkeypatch.setattr(app.main, "init_db", forbidden)
+    monkeypatch.setattr("app.migrate.migrate", forbidden)
+    monkeypatch.setattr("app.seed.seed_demo_if_empty", forbidden)
+
+    engine = db.async_engine.sync_engine if db.DB_MODE == "async" else db.engine
+    engine.dispose()
+    metrics = POOL_METRICS[db.DB_MODE]
+    connects = metrics.connects
+
+    with TestClient(application) as warm:
+        # Le pool est rempli avant la première requête
+        assert metrics.connects - connects == engine.pool.size()
+        assert warm.get("/orm/books-with-tags", params={"limit": 2}).status_code == 200
@@ -0,0 +1,11 @@
+def test_repeated_route_hits_the_compiled_cache(client):
+    client.get("/orm/books", params={"limit": 3})
+    before = client.get("/metrics").json()["compiled_cache"]
+    # Même requête préparée (BOOK_ROWS_PAGE), autres valeurs de after / limit : pas de recompilation
+    for after in (1, 2, 3):
+        client.get("/orm/books", params={"limit": 2, "after": after})
+    after = client.get("/metrics").json()["compiled_cache"]
+
+    assert after["hit"] - before["hit"] == 3
+    assert after["miss"] == before["miss"]
+    assert 0 < after["hit_ratio"] <= 1
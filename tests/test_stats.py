@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app import db, stats
+
+
+@pytest.fixture
+def author_books(client, unique):
+    author = client.post("/orm/authors", json={"name": unique("Counted")}).json()
+    books = [{"title": f"Counted {pages}", "pages": pages, "author_id": author["id"]} for pages in (100, 250)]
+    ids = [row["id"] for row in client.post("/orm/books/bulk", json=books).json()["results"]]
+    return author, ids
+
+
+def test_author_and_tag_statistics(client, unique, author_books):
+    author, ids = author_books
+    response = client.get("/stats/authors", params={"after": author["id"] - 1, "limit": 1}).json()
+    expected = {"author_id": author["id"], "author_name": author["name"], "books": 2, "total_pages": 350}
+    assert response["items"] == [expected]
+
+    tag = unique("counted")
+    client.post("/orm/book-tags/bulk", json=[[book_id, tag, "1999-12-31"] for book_id in ids])
+    tags = client.get("/stats/tags", params={"limit": 1000}).json()["items"]
+    (row,) = [row for row in tags if row["tag_name"] == tag]
+    assert (row["books"], row["total_pages"]) == (2, 350)
+
+    day = {"since": "1999-12-31", "until": "1999-12-31"}
+    activity = client.get("/stats/tagging-activity", params=day).json()
+    assert activity["items"] == [{"day": "1999-12-31", "taggings": 2, "books": 2}]
+
+
+def test_plain_views_are_always_fresh(client, author_books):
+    # SQLite : vues simples, calculées à chaque lecture
+    freshness = client.get("/stats/authors").json()["freshness"]
+    assert freshness == {"materialized": False, "refreshed_at": None, "stale_seconds": 0.0, "pending_writes": False}
+
+
+class MaterializedSession:
+    """Just enough of a PostgreSQL session for stats.freshness()."""
+
+    def __init__(self, refreshed_at: datetime | None) -> None:
+        self.refreshed_at = refreshed_at
+
+    def get_bind(self):
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    def scalar(self, stmt):
+        return self.refreshed_at
+
+
+def test_materialized_freshness_after_a_write(client, unique):
+    stats.refresh_stats(db.engine)
+    refreshed_at = datetime.now(timezone.utc) - timedelta(seconds=120)
+    before = stats.freshness(MaterializedSession(refreshed_at), "author_stats")
+    assert before.pending_writes is False
+    assert 120 <= before.stale_seconds < 130
+
+    client.post("/orm/authors", json={"name": unique("Pending")})
+    assert stats.freshness(MaterializedSession(refreshed_at), "author_stats").pending_writes is True
+    # Le rafraîchissement baisse le drapeau
+    stats.refresh_stats(db.engine)
+    assert stats.freshness(MaterializedSession(refreshed_at), "author_stats").pending_writes is False
+    assert stats.freshness(MaterializedSession(None), "author_stats").stale_seconds is None
@@ -0,0 +1,60 @@
+import pytest
+
+from app.tracing import InMemoryExporter, tracer
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+
+@pytest.fixture
+def exporter():
+    exporter = InMemoryExporter()
+    previous = tracer.exporter, tracer.sample_rate
+    tracer.configure(exporter, sample_rate=1.0)
+    yield exporter
+    tracer.configure(*previous)
+
+
+def ancestors(span, spans) -> list[str]:
+    by_id = {other.span_id: other for other in spans}
+    names = []
+    while span.parent_id in by_id:
+        span = by_id[span.parent_id]
+        names.append(span.name)
+    return names
+
+
+def test_spans_nest_from_request_to_sql(client, exporter):
+    response = client.get("/orm/books", params={"limit": 5})
+    (spans,) = exporter.traces
+    root = spans[0]
+    assert (root.name, root.parent_id) == ("http.request", None)
+    assert response.headers["X-Trace-Id"] == root.trace.trace_id
+    assert root.attributes["http.route"] == "/orm/books"
+
+    queries = [span for span in spans if span.name == "db.query"]
+    assert len(queries) == 1
+    assert queries[0].attributes["db.statement"].startswith("SELECT")
+    assert ancestors(queries[0], spans) == ["orm.execute", "endpoint", "http.request"]
+    assert "response.serialize" in [span.name for span in spans]
+    assert all(span.end_ns is not None for span in spans)
+
+
+def test_sample_rate_zero_traces_nothing(client, exporter):
+    tracer.sample_rate = 0.0
+    response = client.get("/orm/books", params={"limit": 5})
+    assert "X-Trace-Id" not in response.headers
+    assert list(exporter.traces) == []
+
+
+def test_traceparent_decides_sampling(client, exporter):
+    tracer.sample_rate = 0.0
+    response = client.get("/orm/books", params={"limit": 5}, headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"})
+    assert response.headers["X-Trace-Id"] == TRACE_ID
+    (spans,) = exporter.traces
+    assert spans[0].parent_id == "00f067aa0ba902b7"
+
+    # Appelant non échantillonné (flags 00) : pas de trace, même avec sample_rate = 1
+    tracer.sample_rate = 1.0
+    response = client.get("/orm/books", params={"limit": 5}, headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-00"})
+    assert "X-Trace-Id" not in response.headers
+    assert len(exporter.traces) == 1